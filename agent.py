@@ -1,12 +1,46 @@
 import re
-import json
 import uuid
-from typing import Optional, Dict, Any
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
 from langchain_ollama import ChatOllama
 from langchain.prompts import ChatPromptTemplate
-from tools import execute_tool, ToolResult
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from tools import aexecute_tool, execute_tool, is_known_action, is_read_only_call, ToolResult, ToolResultCache
+from tool_parser import select_tool_calls
+from cassette import Cassette, CassetteChatModel
+from telemetry import Span, Telemetry
 from rag import DocumentProcessor
 
+class AgentSession:
+    """
+    Estado de uma conversa, fora do Agent: vários usuários podem compartilhar
+    o mesmo Agent (LLM + índice) cada um com a sua sessão.
+    """
+
+    def __init__(self, session_id: Optional[str] = None):
+        self.session_id = session_id or str(uuid.uuid4())
+        self.conversation_history = []
+        self.lock = threading.Lock()  # Um turno por vez na mesma sessão
+        self.tool_cache: Optional[ToolResultCache] = None  # Criado pelo Agent(tool_cache=True)
+        self.trace: Optional[Span] = None  # Spans do turno em andamento (ou do último)
+        self.reset_turn()
+
+    def reset_turn(self):
+        """Limpa o rastreamento do turno (loops, sucessos, tempos)"""
+        self.execution_history = []  # Histórico de execuções (tool + resultado)
+        self.last_tool_call = None  # Última tool chamada
+        self.consecutive_successes = 0  # Contador de sucessos consecutivos
+        self.llm_timings = []  # TTFT/tokens por iteração do último turno
+        self.retrieval_ms = 0.0  # Tempo de busca no índice no último turno
+
+# Sessão ligada à chamada em andamento (por thread / por task asyncio)
+_current_session: ContextVar[Optional[AgentSession]] = ContextVar("agent_session", default=None)
+
 class Agent:
     """Agent agentic com RAG e tools"""
 
@@ -14,22 +48,67 @@ class Agent:
         self,
         model_name: str = "mistral",
         ollama_base_url: str = "http://localhost:11434",
-        docs_path: str = "./docs"
+        docs_path: str = "./docs",
+        refresh_context_on_tool: bool = False,
+        keep_alive: str = "30m",
+        stream: bool = False,
+        tool_workers: int = 4,
+        doc_processor: Optional[DocumentProcessor] = None,
+        tool_cache: bool = False,
+        tool_cache_size: int = 128,
+        tool_cache_ttl: Optional[float] = 300.0,
+        cassette: Optional[Cassette] = None,
+        telemetry: Optional[Telemetry] = None
     ):
         self.model_name = model_name
         self.llm = ChatOllama(
             model=model_name,
             base_url=ollama_base_url,
-            temperature=0.7
+            temperature=0.7,
+            keep_alive=keep_alive  # Mantém o modelo (e o KV cache do prefixo) carregado entre chamadas
         )
-        self.doc_processor = DocumentProcessor(docs_path=docs_path)
-        self.conversation_history = []
+        self.cassette = cassette
+        if cassette is not None:
+            # Record/replay: reproduz conversas sem o modelo (determinístico, sem latência)
+            self.llm = CassetteChatModel(self.llm, cassette)
+        # Vários Agents (um por conversa) podem compartilhar o mesmo índice
+        self.doc_processor = doc_processor or DocumentProcessor(docs_path=docs_path, cassette=cassette)
         self.max_iterations = 10  # Limite de iterações para evitar loops infinitos
-
-        # Rastreamento de estado para detectar loops e conclusões
-        self.execution_history = []  # Histórico de execuções (tool + resultado)
-        self.last_tool_call = None  # Última tool chamada
-        self.consecutive_successes = 0  # Contador de sucessos consecutivos
+        self.retrieval_k = 3  # Documentos recuperados por turno
+        # Se True, após cada tool busca também documentos relacionados ao resultado
+        self.refresh_context_on_tool = refresh_context_on_tool
+
+        # Estado da conversa (histórico, loops, tempos) fica em um AgentSession:
+        # chat(..., session=...) atende outra conversa com o mesmo Agent
+        self._default_session = AgentSession()
+        # Streaming: imprime tokens ao vivo e corta a geração quando o <tool> fecha
+        self.stream = stream
+        # Pool para as chamadas somente leitura de uma mesma resposta (GETs, leituras)
+        self.tool_workers = tool_workers
+        self._tool_executor = ThreadPoolExecutor(max_workers=tool_workers, thread_name_prefix="tool")
+        # Cache de resultados (opcional, um por sessão): GETs e leituras de arquivo
+        # repetidos são validados por ETag/Last-Modified ou mtime/tamanho e reaproveitados
+        self.tool_cache = tool_cache
+        self.tool_cache_size = tool_cache_size
+        self.tool_cache_ttl = tool_cache_ttl
+        # Spans por turno (retrieval, prompt, LLM, parse, tools) e métricas
+        # agregadas; Telemetry(jsonl_path=...) grava cada turno em JSON lines
+        self.telemetry = telemetry or Telemetry()
+
+        # Prefixo estático montado uma vez: idêntico em todas as chamadas
+        self._system_message = SystemMessage(content=self._build_system_prompt())
+
+    @property
+    def session(self) -> "AgentSession":
+        """Sessão da chamada atual (a passada para chat/achat ou a padrão)"""
+        return _current_session.get() or self._default_session
+
+    # Atalhos de leitura para o estado da sessão atual
+    conversation_history = property(lambda self: self.session.conversation_history)
+    execution_history = property(lambda self: self.session.execution_history)
+    last_tool_call = property(lambda self: self.session.last_tool_call)
+    consecutive_successes = property(lambda self: self.session.consecutive_successes)
+    llm_timings = property(lambda self: self.session.llm_timings)
 
     def _format_tools_description(self) -> str:
         """Retorna descrição formatada das tools disponíveis"""
@@ -46,6 +125,7 @@ EXEMPLOS:
 GET: <tool>{"tool": "api", "action": "call_api", "url": "https://api.github.com/users/octocat", "method": "GET"}</tool>
 POST: <tool>{"tool": "api", "action": "call_api", "url": "https://api.exemplo.com/users", "method": "POST", "data": {"nome": "João", "email": "joao@example.com"}}</tool>
 Headers: <tool>{"tool": "api", "action": "call_api", "url": "http://...", "method": "POST", "headers": {"Authorization": "Bearer token", "X-Custom": "value"}, "data": {...}}</tool>
+Métodos: GET, HEAD, POST, PUT, PATCH, DELETE (HEAD retorna status e headers)
 
 ---
 
@@ -55,6 +135,11 @@ Use quando precisar: ler, escrever ou criar arquivos
 FORMATO:
 Ler: <tool>{"tool": "file", "action": "read_file", "filepath": "./arquivo.txt"}</tool>
 Escrever: <tool>{"tool": "file", "action": "write_file", "filepath": "./output.txt", "content": "conteúdo aqui"}</tool>
+Arquivos grandes (logs), sem carregar o arquivo inteiro:
+Trecho em bytes: <tool>{"tool": "file", "action": "read_range", "filepath": "./app.log", "offset": 0, "length": 4096}</tool>
+Linhas: <tool>{"tool": "file", "action": "read_lines", "filepath": "./app.log", "start": 100, "count": 50}</tool>
+Últimas linhas: <tool>{"tool": "file", "action": "tail", "filepath": "./app.log", "lines": 50}</tool>
+Buscar (regex): <tool>{"tool": "file", "action": "grep", "filepath": "./app.log", "pattern": "ERROR|Timeout", "max_matches": 20}</tool>
 
 ---
 
@@ -84,62 +169,14 @@ FORMATO:
 
 """
 
-    def _parse_tool_call(self, text: str) -> Optional[Dict[str, Any]]:
-        """Parse de chamadas de tool no formato <tool>{...}</tool>"""
-        # Tenta primeiro o padrão padrão
-        pattern = r'<tool>(.*?)</tool>'
-        match = re.search(pattern, text, re.DOTALL)
-
-        if match:
-            json_str = match.group(1).strip()
-
-            # Tenta fazer parse do JSON
-            result = self._try_parse_json(json_str)
-            if result:
-                return result
-
-        # Se não encontrou, tenta extrair JSON entre chaves
-        # Padrão alternativo: procura por { ... } mesmo sem <tool> tags
-        json_pattern = r'\{.*?"tool".*?"action".*?\}'
-        json_match = re.search(json_pattern, text, re.DOTALL)
-
-        if json_match:
-            json_str = json_match.group(0)
-            result = self._try_parse_json(json_str)
-            if result:
-                return result
-
-        return None
-
-    def _try_parse_json(self, json_str: str) -> Optional[Dict[str, Any]]:
-        """Tenta fazer parse de JSON com várias estratégias"""
-        # Estratégia 1: Tentar parse direto
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError:
-            pass
-
-        # Estratégia 2: Converter single quotes para double quotes
-        try:
-            # Replace single quotes que envolvem valores
-            fixed_json = re.sub(r"'([^']*)'", r'"\1"', json_str)
-            return json.loads(fixed_json)
-        except json.JSONDecodeError:
-            pass
+    def _parse_tool_calls(self, text: str) -> List[Dict[str, Any]]:
+        """Todas as chamadas de tool da resposta (scanner linear de tool_parser)"""
+        return select_tool_calls(text)
 
-        # Estratégia 3: Remover comentários e espaços problemáticos
-        try:
-            # Remove trailing commas
-            fixed_json = re.sub(r',(\s*[}\]])', r'\1', json_str)
-            # Replace single quotes
-            fixed_json = re.sub(r"'([^']*)'", r'"\1"', fixed_json)
-            return json.loads(fixed_json)
-        except json.JSONDecodeError:
-            pass
-
-        print(f"⚠️  Falha ao fazer parse de JSON após 3 tentativas")
-        print(f"   JSON string: {json_str[:100]}...")
-        return None
+    def _parse_tool_call(self, text: str) -> Optional[Dict[str, Any]]:
+        """Parse da primeira chamada de tool no formato <tool>{...}</tool>"""
+        calls = self._parse_tool_calls(text)
+        return calls[0] if calls else None
 
     def _execute_tool_from_call(self, tool_call: Dict[str, Any]) -> ToolResult:
         """Executa uma tool a partir de um dicionário"""
@@ -151,18 +188,166 @@ FORMATO:
 
         return execute_tool(tool_name, action, **kwargs)
 
-    def _build_prompt(self, user_query: str) -> str:
-        """Constrói prompt com contexto RAG e tools"""
-        # Detectar intenção
-        intent = self._detect_tool_intent(user_query)
-        enhanced_query = self._enhance_query_with_intent(user_query, intent)
+    def _session_tool_cache(self) -> Optional[ToolResultCache]:
+        """Cache de resultados da sessão atual (None se desligado)"""
+        if not self.tool_cache:
+            return None
+        session = self.session
+        if session.tool_cache is None:
+            session.tool_cache = ToolResultCache(max_entries=self.tool_cache_size, ttl=self.tool_cache_ttl)
+        return session.tool_cache
+
+    def _run_tool_call(self, tool_call: Dict[str, Any], cache: Optional[ToolResultCache] = None) -> Dict[str, Any]:
+        """Executa uma chamada medindo o tempo (pelo cache da sessão, se houver)"""
+        started = time.perf_counter()
+        cache_status = None
+        if cache is None:
+            result = self._execute_tool_from_call(tool_call)
+        else:
+            kwargs = {k: v for k, v in tool_call.items() if k not in ["tool", "action"]}
+            result, cache_status = cache.execute(tool_call.get("tool"), tool_call.get("action"), **kwargs)
+        return {
+            "tool_call": tool_call,
+            "tool_id": f"{tool_call.get('tool')}.{tool_call.get('action')}",
+            "result": result,
+            "started": started,
+            "duration_ms": (time.perf_counter() - started) * 1000,
+            "cache": cache_status,
+        }
+
+    def _execute_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Executa as chamadas de uma resposta na ordem em que vieram. Sequências
+        de chamadas somente leitura (GETs, leituras de arquivo, ...) rodam juntas
+        no pool de threads; cada escrita roda sozinha e funciona como barreira,
+        então uma leitura emitida depois de um write_file vê o arquivo escrito.
+        """
+        outcomes = []
+        group = []
+        # Obtido aqui: a sessão (ContextVar) não é vista pelas threads do pool
+        cache = self._session_tool_cache()
+
+        def flush():
+            if len(group) > 1:
+                tool_ids = ", ".join(f"{c.get('tool')}.{c.get('action')}" for c in group)
+                print(f"🔧 Executando {len(group)} tools em paralelo: {tool_ids}")
+                started = time.perf_counter()
+                batch = list(self._tool_executor.map(lambda call: self._run_tool_call(call, cache), group))
+                for outcome in batch:
+                    outcome["parallel"] = True
+                outcomes.extend(batch)
+                print(f"⏱️  {len(group)} tools em {(time.perf_counter() - started) * 1000:.0f} ms "
+                      f"(soma sequencial: {sum(o['duration_ms'] for o in batch):.0f} ms)")
+            elif group:
+                print(f"🔧 Executando tool: {group[0].get('tool')}.{group[0].get('action')}")
+                outcomes.append(dict(self._run_tool_call(group[0], cache), parallel=False))
+            group.clear()
+
+        for tool_call in tool_calls:
+            kwargs = {k: v for k, v in tool_call.items() if k not in ["tool", "action"]}
+            if is_read_only_call(tool_call.get("tool"), tool_call.get("action"), **kwargs):
+                group.append(tool_call)
+                continue
+            flush()
+            print(f"🔧 Executando tool: {tool_call.get('tool')}.{tool_call.get('action')}")
+            outcomes.append(dict(self._run_tool_call(tool_call, cache), parallel=False))
+        flush()
 
-        # Buscar contexto dos documentos
-        rag_context = self.doc_processor.build_context(user_query, k=3)
+        self._print_outcomes(outcomes)
+        return outcomes
 
+    async def _arun_tool_call(
+        self, tool_call: Dict[str, Any], semaphore: asyncio.Semaphore, cache: Optional[ToolResultCache] = None
+    ) -> Dict[str, Any]:
+        """Versão assíncrona de _run_tool_call, limitada pelo semáforo"""
+        kwargs = {k: v for k, v in tool_call.items() if k not in ["tool", "action"]}
+        cache_status = None
+        async with semaphore:
+            started = time.perf_counter()
+            if cache is None:
+                result = await aexecute_tool(tool_call.get("tool"), tool_call.get("action"), **kwargs)
+            else:
+                result, cache_status = await cache.aexecute(tool_call.get("tool"), tool_call.get("action"), **kwargs)
+        return {
+            "tool_call": tool_call,
+            "tool_id": f"{tool_call.get('tool')}.{tool_call.get('action')}",
+            "result": result,
+            "started": started,
+            "duration_ms": (time.perf_counter() - started) * 1000,
+            "cache": cache_status,
+        }
+
+    async def _aexecute_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Versão assíncrona de _execute_tool_calls: leituras com gather, escritas em sequência"""
+        semaphore = asyncio.Semaphore(self.tool_workers)
+        cache = self._session_tool_cache()
+        outcomes = []
+        group = []
+
+        async def flush():
+            batch = await asyncio.gather(*(self._arun_tool_call(call, semaphore, cache) for call in group))
+            for outcome in batch:
+                outcome["parallel"] = len(group) > 1
+            outcomes.extend(batch)
+            group.clear()
+
+        for tool_call in tool_calls:
+            kwargs = {k: v for k, v in tool_call.items() if k not in ["tool", "action"]}
+            if is_read_only_call(tool_call.get("tool"), tool_call.get("action"), **kwargs):
+                group.append(tool_call)
+                continue
+            await flush()
+            outcomes.append(dict(await self._arun_tool_call(tool_call, semaphore, cache), parallel=False))
+        await flush()
+
+        self._print_outcomes(outcomes)
+        return outcomes
+
+    def _print_outcomes(self, outcomes: List[Dict[str, Any]]):
+        """Uma linha por resultado, com o tempo e o status do cache"""
+        for outcome in outcomes:
+            cache_note = f", cache: {outcome['cache']}" if outcome.get("cache") else ""
+            print(f"📊 Resultado {outcome['tool_id']} ({outcome['duration_ms']:.0f} ms{cache_note}): "
+                  f"{self._result_summary(outcome['result'])}")
+        print()
+
+    def _result_summary(self, result: ToolResult) -> str:
+        """Resumo curto do resultado para o log (sem imprimir o payload inteiro)"""
+        if result.success:
+            return f"success=True data={result.preview(200)}"
+        return f"success=False error={result.error}"
+
+    def _retrieve_context(self, user_query: str, outcomes: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        Recupera o contexto RAG do turno a partir da pergunta original. Com
+        refresh_context_on_tool, acrescenta documentos buscados por queries
+        derivadas do resultado de cada tool (erro ou dados retornados).
+        """
+        started = time.perf_counter()
+        docs = self.doc_processor.search(user_query, k=self.retrieval_k)
+        seen = {doc.page_content for doc in docs}
+
+        for outcome in outcomes or []:
+            result = outcome["result"]
+            detail = result.error if not result.success else result.preview(300)
+            targeted_query = f"{outcome['tool_id']} {detail}"[:300]
+            for doc in self.doc_processor.search(targeted_query, k=self.retrieval_k):
+                if doc.page_content not in seen:
+                    seen.add(doc.page_content)
+                    docs.append(doc)
+
+        self.session.retrieval_ms += (time.perf_counter() - started) * 1000
+        return self.doc_processor.format_context(docs)
+
+    def _build_system_prompt(self) -> str:
+        """
+        Parte estática do prompt (papel, tools e instruções). Fica byte a byte
+        igual entre iterações e turnos para que o Ollama reaproveite o cache de
+        avaliação do prompt (KV cache) desse prefixo.
+        """
         tools_desc = self._format_tools_description()
 
-        prompt = f"""Você é um assistente inteligente e útil com capacidade de:
+        return f"""Você é um assistente inteligente e útil com capacidade de:
 1. Responder perguntas usando documentos fornecidos
 2. Chamar APIs e endpoints HTTP
 3. Manipular arquivos
@@ -171,19 +356,6 @@ FORMATO:
 
 {tools_desc}
 
----
-
-{rag_context}
-
----
-
-Histórico da conversa:
-{self._format_conversation_history()}
-
----
-
-Pergunta do usuário: {enhanced_query}
-
 ═══════════════════════════════════════════════════════════════════════════════
 
 🔴 INSTRUÇÕES CRÍTICAS - LEIA COM ATENÇÃO:
@@ -198,6 +370,9 @@ Se você vir "[SISTEMA: Transaction ID gerado automaticamente: ...]" na pergunta
 1. Você PRECISA chamar uma tool se a pergunta pede para chamar API, ler/escrever arquivo, etc
 2. A tool DEVE ser chamada em PRIMEIRO, no formato EXATO: <tool>{{"tool": "...", "action": "...", ...}}</tool>
 3. DEPOIS da tool, você pode explicar o que fez ou pedir próximos passos
+4. Se precisar de várias leituras INDEPENDENTES (vários GETs, vários arquivos), emita
+   todos os blocos <tool> seguidos na mesma resposta: eles rodam em paralelo e os
+   resultados voltam juntos
 
 ❌ ERRADO (Explicação ANTES da tool):
 "Vou fazer uma chamada HTTP para..."
@@ -233,23 +408,173 @@ Sua resposta:
 <tool>{{"tool": "api", "action": "call_api", "url": "https://api.github.com/users/octocat", "method": "GET"}}</tool>
 
 Encontrei os dados do usuário octocat. A requisição foi bem-sucedida e retornou as informações do perfil.
+"""
 
-═══════════════════════════════════════════════════════════════════════════════
+    def _build_messages(self, user_query: str, rag_context: str) -> List[BaseMessage]:
+        """
+        Monta as mensagens do chat: prefixo estático de sistema primeiro,
+        depois o histórico e por último a parte que muda a cada iteração
+        (contexto RAG do turno + pergunta/resultado da tool).
+        """
+        # Detectar intenção
+        intent = self._detect_tool_intent(user_query)
+        enhanced_query = self._enhance_query_with_intent(user_query, intent)
 
-Sua resposta:
-"""
-        return prompt
+        messages = [self._system_message]
+        messages.extend(self._history_messages())
+        messages.append(HumanMessage(content=f"""{rag_context}
 
-    def _format_conversation_history(self) -> str:
-        """Formata histórico da conversa"""
-        if not self.conversation_history:
-            return "(Sem histórico)"
+---
 
-        formatted = []
-        for item in self.conversation_history[-4:]:  # Últimas 4 mensagens
-            formatted.append(f"{item['role'].upper()}: {item['content'][:200]}...")
+Pergunta do usuário: {enhanced_query}"""))
+        return messages
 
-        return "\n".join(formatted)
+    def _history_messages(self) -> List[BaseMessage]:
+        """Histórico da conversa como mensagens user/assistant (últimas 4)"""
+        messages = []
+        for item in self.session.conversation_history[-4:]:
+            content = f"{item['content'][:200]}..."
+            if item['role'] == "user":
+                messages.append(HumanMessage(content=content))
+            else:
+                messages.append(AIMessage(content=content))
+        return messages
+
+    def _record_llm_timing(
+        self, iteration: int, meta: Dict[str, Any], wall_seconds: float, ttft_seconds: Optional[float] = None
+    ):
+        """Registra tempos e tokens reportados pelo Ollama para a iteração"""
+        ns_to_ms = 1e-6
+        load_ms = (meta.get("load_duration") or 0) * ns_to_ms
+        prompt_eval_ms = (meta.get("prompt_eval_duration") or 0) * ns_to_ms
+        timing = {
+            "iteration": iteration,
+            "wall_ms": wall_seconds * 1000,
+            # Sem streaming, o primeiro token sai após carregar o modelo e avaliar o prompt
+            "ttft_ms": ttft_seconds * 1000 if ttft_seconds is not None else load_ms + prompt_eval_ms,
+            "prompt_eval_ms": prompt_eval_ms,
+            "prompt_tokens": meta.get("prompt_eval_count"),
+            "eval_ms": (meta.get("eval_duration") or 0) * ns_to_ms,
+            "completion_tokens": meta.get("eval_count"),
+        }
+        self.session.llm_timings.append(timing)
+
+        if meta.get("prompt_eval_duration") is not None or ttft_seconds is not None:
+            # Com a geração cortada no meio o Ollama não envia as contagens finais
+            details = ""
+            if timing["prompt_tokens"] is not None:
+                details = (f" (prompt: {timing['prompt_tokens']} tokens avaliados em {prompt_eval_ms:.0f} ms; "
+                           f"geração: {timing['completion_tokens']} tokens)")
+            print(f"⏱️  TTFT {timing['ttft_ms']:.0f} ms{details}")
+
+    def _scan_stream(self, text: str, checked: int, tools_end: Optional[int]) -> Tuple[int, Optional[int], bool]:
+        """
+        Acompanha o texto em streaming. Retorna até onde já procurou </tool>, o
+        fim do último bloco <tool> completo e se a geração pode ser cortada.
+
+        As tools vêm primeiro: depois de um <tool>{...}</tool> completo, quando
+        já chegou algo que não é outro <tool>, sair do loop fecha o stream e o
+        Ollama para de gerar a explicação. O corte só acontece quando o texto
+        recebido já é conclusivo (_is_conclusive_response): mais texto não muda
+        esse resultado, então a parada depois das tools é a mesma do modo sem
+        streaming. Sem conclusão à vista, a explicação é lida até o fim.
+        """
+        close = text.find("</tool>", max(0, checked - len("</tool>")))
+        if close != -1 and self._parse_tool_call(text[:close + len("</tool>")]):
+            tools_end = close + len("</tool>")
+        if tools_end is not None:
+            tail = text[tools_end:].lstrip()
+            if tail and not (tail.startswith("<tool>") or "<tool>".startswith(tail)):
+                return len(text), tools_end, self._is_conclusive_response(text)
+        return len(text), tools_end, False
+
+    def _invoke_llm(self, messages: List[BaseMessage], iteration: int) -> str:
+        """Invoca o LLM (bloqueante ou em streaming) e registra os tempos"""
+        started = time.perf_counter()
+
+        if not self.stream:
+            response = self.llm.invoke(messages)
+            self._record_llm_timing(iteration, response.response_metadata or {}, time.perf_counter() - started)
+            print(f"[Iteração {iteration}] Resposta do agent:\n{response.content}\n")
+            return response.content
+
+        print(f"[Iteração {iteration}] Resposta do agent:")
+        text = ""
+        meta = {}
+        ttft = None
+        checked = 0  # Até onde o texto já foi procurado por </tool>
+        tools_end = None  # Fim do último bloco <tool> completo
+
+        for chunk in self.llm.stream(messages):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            text += chunk.content
+            meta.update(chunk.response_metadata or {})
+            print(chunk.content, end="", flush=True)
+
+            checked, tools_end, cut = self._scan_stream(text, checked, tools_end)
+            if cut:
+                # O texto lido fica inteiro: a conclusão já recebida decide a parada
+                print("\n✂️  [Tools completas e conclusão recebidas, geração interrompida]", end="")
+                break
+
+        print("\n")
+        self._record_llm_timing(iteration, meta, time.perf_counter() - started, ttft)
+        return text
+
+    async def _ainvoke_llm(self, messages: List[BaseMessage], iteration: int) -> str:
+        """Versão assíncrona de _invoke_llm (ainvoke/astream)"""
+        started = time.perf_counter()
+
+        if not self.stream:
+            response = await self.llm.ainvoke(messages)
+            self._record_llm_timing(iteration, response.response_metadata or {}, time.perf_counter() - started)
+            print(f"[Iteração {iteration}] Resposta do agent:\n{response.content}\n")
+            return response.content
+
+        text = ""
+        meta = {}
+        ttft = None
+        checked = 0
+        tools_end = None
+
+        # Com várias conversas no mesmo loop os tokens se intercalariam no
+        # terminal: a resposta é impressa inteira no final
+        stream = self.llm.astream(messages)
+        try:
+            async for chunk in stream:
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                text += chunk.content
+                meta.update(chunk.response_metadata or {})
+
+                checked, tools_end, cut = self._scan_stream(text, checked, tools_end)
+                if cut:
+                    break
+        finally:
+            await stream.aclose()  # Fecha a conexão e o Ollama para de gerar
+
+        print(f"[Iteração {iteration}] Resposta do agent:\n{text}\n")
+        self._record_llm_timing(iteration, meta, time.perf_counter() - started, ttft)
+        return text
+
+    def _format_tool_outcomes(self, outcomes: List[Dict[str, Any]]) -> str:
+        """Resultados das tools para o prompt seguinte (numerados quando há mais de um)"""
+        blocks = []
+        for number, outcome in enumerate(outcomes, 1):
+            result = outcome['result']
+            if result.success:
+                lines = [f"Tool: {outcome['tool_id']}", "Sucesso: Sim",
+                         f"Dados: {result.preview(500)}"]
+            elif len(outcomes) == 1:
+                lines = [f"Tool: {outcome['tool_id']}", f"Erro: {result.error}"]
+            else:
+                lines = [f"Tool: {outcome['tool_id']}", "Sucesso: Não", f"Erro: {result.error}"]
+
+            if len(outcomes) > 1:
+                lines = [f"{number}. {lines[0]}"] + [f"   {line}" for line in lines[1:]]
+            blocks.append("\n".join(lines))
+        return "\n".join(blocks)
 
     def _detect_tool_intent(self, user_query: str) -> Optional[str]:
         """Detecta automaticamente se a query requer uma tool específica"""
@@ -306,42 +631,52 @@ Sua resposta:
         response_lower = response_text.lower()
         return any(pattern in response_lower for pattern in conclusive_patterns)
 
+    def _recent_iterations(self, count: int) -> List[List[Dict[str, Any]]]:
+        """Execuções das últimas `count` iterações, agrupadas por iteração"""
+        by_iteration = {}
+        for exec_history in self.session.execution_history:
+            by_iteration.setdefault(exec_history['iteration'], []).append(exec_history)
+        return list(by_iteration.values())[-count:]
+
     def _detect_repeated_tool_call(self, tool_call: Dict[str, Any]) -> bool:
         """Detecta se a mesma tool foi chamada repetidas vezes (indicativo de loop)"""
-        if not self.execution_history:
+        if not self.session.execution_history:
             return False
 
         # Extrair identificador da tool
         current_tool_id = f"{tool_call.get('tool')}.{tool_call.get('action')}"
 
-        # Contar quantas vezes essa tool foi executada recentemente
+        # Contar em quantas das últimas iterações essa tool foi executada
+        # (várias chamadas em paralelo na mesma iteração contam uma vez só)
         recent_calls = [
-            exec_history for exec_history in self.execution_history[-3:]
-            if exec_history['tool_id'] == current_tool_id
+            executions for executions in self._recent_iterations(3)
+            if any(exec_history['tool_id'] == current_tool_id for exec_history in executions)
         ]
 
-        # Se a mesma tool foi chamada 2+ vezes nos últimos 3, é um loop
+        # Se a mesma tool foi chamada em 2+ das últimas 3 iterações, é um loop
         return len(recent_calls) >= 2
 
     def _detect_infinite_loop(self, current_query: str) -> bool:
         """Detecta se estamos em um loop infinito (mesma query reconstruída)"""
-        if not self.execution_history:
+        if not self.session.execution_history:
             return False
 
-        # Se as últimas 2 execuções tiveram tools idênticas, é suspeito de loop
-        if len(self.execution_history) >= 2:
-            last_two = self.execution_history[-2:]
-            if (last_two[0]['tool_id'] == last_two[1]['tool_id'] and
-                last_two[0]['success'] == last_two[1]['success']):
+        # Se as últimas 2 iterações executaram as mesmas tools com o mesmo
+        # resultado, é suspeito de loop
+        last_two = self._recent_iterations(2)
+        if len(last_two) == 2:
+            signatures = [
+                sorted((exec_history['tool_id'], exec_history['success']) for exec_history in executions)
+                for executions in last_two
+            ]
+            if signatures[0] == signatures[1]:
                 return True
 
         return False
 
     def _reset_execution_state(self):
         """Reseta o estado de execução para nova conversa"""
-        self.execution_history = []
-        self.last_tool_call = None
-        self.consecutive_successes = 0
+        self.session.reset_turn()
 
     def _extract_transaction_id(self, text: str) -> Optional[str]:
         """Extrai transaction ID da query do usuário"""
@@ -362,7 +697,9 @@ Sua resposta:
         return None
 
     def _generate_transaction_id(self) -> str:
-        """Gera um transaction ID único (UUID v4)"""
+        """Gera um transaction ID único (UUID v4; no replay de cassette, o gravado)"""
+        if self.cassette is not None:
+            return self.cassette.value("transaction_id", lambda: str(uuid.uuid4()))
         return str(uuid.uuid4())
 
     def _enrich_query_with_transaction_id(self, user_query: str) -> str:
@@ -387,119 +724,308 @@ Sua resposta:
             print(f"📝 Transaction ID encontrado: {transaction_id}")
             return user_query
 
-    def chat(self, user_query: str) -> str:
-        """Chat com iteração automática de tools com critérios de parada melhorados"""
+    def _start_turn(self, user_query: str) -> str:
+        """Início do turno: enriquece a query com transaction ID e limpa o estado"""
         print(f"\n🤖 Agent processando: {user_query}\n")
 
         # Enriquecer query com transaction ID se necessário
         enriched_query = self._enrich_query_with_transaction_id(user_query)
-
-        iteration = 0
-        current_query = enriched_query
         self._reset_execution_state()  # Limpar estado anterior
+        return enriched_query
+
+    def _finish_turn(self, user_query: str, response_text: str) -> str:
+        """Resposta final sem tool call: entra no histórico da conversa"""
+        self.session.conversation_history.append({
+            "role": "user",
+            "content": user_query
+        })
+        self.session.conversation_history.append({
+            "role": "assistant",
+            "content": response_text
+        })
+        return response_text
+
+    def _check_loops(self, tool_calls: List[Dict[str, Any]], response_text: str, current_query: str) -> Optional[str]:
+        """Resposta de parada se as chamadas indicam loop; None para seguir"""
+        if any(self._detect_repeated_tool_call(tool_call) for tool_call in tool_calls):
+            print("⚠️  [PARADA] Mesma tool sendo executada repetidamente (loop detectado)")
+            print(f"Resposta final do agent:\n{response_text}\n")
+            return response_text + "\n\n[Sistema: Loop detectado, interrompendo iterações]"
+
+        if self._detect_infinite_loop(current_query):
+            print("⚠️  [PARADA] Loop infinito detectado (mesmas execuções)")
+            return response_text + "\n\n[Sistema: Loop infinito detectado, interrompendo]"
 
-        while iteration < self.max_iterations:
-            iteration += 1
-
-            # Construir e invocar LLM
-            prompt = self._build_prompt(current_query)
-            response = self.llm.invoke(prompt)
-            response_text = response.content
-
-            print(f"[Iteração {iteration}] Resposta do agent:\n{response_text}\n")
-
-            # Verificar se há chamada de tool
-            tool_call = self._parse_tool_call(response_text)
-
-            if not tool_call:
-                # Sem tool call, retornar resposta final
-                self.conversation_history.append({
-                    "role": "user",
-                    "content": user_query
-                })
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": response_text
-                })
-                return response_text
-
-            # Detectar padrões problemáticos
-            if self._detect_repeated_tool_call(tool_call):
-                print("⚠️  [PARADA] Mesma tool sendo executada repetidamente (loop detectado)")
-                print(f"Resposta final do agent:\n{response_text}\n")
-                return response_text + "\n\n[Sistema: Loop detectado, interrompendo iterações]"
-
-            if self._detect_infinite_loop(current_query):
-                print("⚠️  [PARADA] Loop infinito detectado (mesmas execuções)")
-                return response_text + "\n\n[Sistema: Loop infinito detectado, interrompendo]"
-
-            # Executar tool
-            print(f"🔧 Executando tool: {tool_call.get('tool')}.{tool_call.get('action')}")
-            result = self._execute_tool_from_call(tool_call)
-            print(f"📊 Resultado: {result}\n")
+        return None
+
+    def _after_tools(
+        self, iteration: int, user_query: str, response_text: str,
+        tool_calls: List[Dict[str, Any]], outcomes: List[Dict[str, Any]]
+    ) -> Tuple[Optional[str], str]:
+        """
+        Registra as execuções da iteração e monta o próximo prompt. Retorna
+        (resposta final, se a tarefa foi concluída; próxima query).
+        """
+        self.session.last_tool_call = tool_calls[-1]
 
-            # Registrar execução no histórico
-            tool_id = f"{tool_call.get('tool')}.{tool_call.get('action')}"
-            self.execution_history.append({
+        # Registrar cada execução no histórico, com o tempo de cada chamada
+        for outcome in outcomes:
+            self.session.execution_history.append({
                 'iteration': iteration,
-                'tool_id': tool_id,
-                'success': result.success,
-                'error': result.error
+                'tool_id': outcome['tool_id'],
+                'tool_call': outcome['tool_call'],
+                'success': outcome['result'].success,
+                'error': outcome['result'].error,
+                'duration_ms': outcome['duration_ms'],
+                'parallel': outcome['parallel'],
+                'cache': outcome.get('cache')  # 'hit', 'revalidated', 'miss' ou None (sem cache)
             })
 
-            # Lógica de parada após sucesso
-            if result.success:
-                self.consecutive_successes += 1
+        # Lógica de parada após sucesso
+        if all(outcome['result'].success for outcome in outcomes):
+            self.session.consecutive_successes += 1
 
-                # Se houve sucesso, adicionar sinal explícito ao LLM
-                current_query = f"""[✅ AÇÃO EXECUTADA COM SUCESSO]
+            # Se houve sucesso, adicionar sinal explícito ao LLM
+            if len(outcomes) == 1:
+                header = "[✅ AÇÃO EXECUTADA COM SUCESSO]\n\nResultado da execução anterior:"
+                done = "A ação anterior foi executada"
+            else:
+                header = f"[✅ {len(outcomes)} AÇÕES EXECUTADAS COM SUCESSO]\n\nResultados das execuções anteriores:"
+                done = "As ações anteriores foram executadas"
 
-Resultado da execução anterior:
-Tool: {tool_id}
-Sucesso: Sim
-Dados: {json.dumps(result.data, ensure_ascii=False)[:500]}
+            current_query = f"""{header}
+{self._format_tool_outcomes(outcomes)}
 
 Pergunta original: {user_query}
 
-IMPORTANTE: A ação anterior foi executada com SUCESSO. Se isso resolve o problema original, 
+IMPORTANTE: {done} com SUCESSO. Se isso resolve o problema original, 
 RESPONDA APENAS CONFIRMANDO QUE FOI RESOLVIDO e NÃO CHAME MAIS TOOLS.
 Caso contrário, indique qual é o próximo passo necessário."""
 
-                # Se conseguimos sucesso na primeira tentativa e resposta é conclusiva, parar
-                if self.consecutive_successes >= 1 and self._is_conclusive_response(response_text):
-                    print("✅ [PARADA] Ação bem-sucedida e conclusão detectada")
-                    return response_text
-            else:
-                # Reset counter em caso de erro
-                self.consecutive_successes = 0
+            # Se conseguimos sucesso na primeira tentativa e resposta é conclusiva, parar
+            if self.session.consecutive_successes >= 1 and self._is_conclusive_response(response_text):
+                print("✅ [PARADA] Ação bem-sucedida e conclusão detectada")
+                return response_text, current_query
+        else:
+            # Reset counter em caso de erro
+            self.session.consecutive_successes = 0
 
-                current_query = f"""[❌ ERRO NA EXECUÇÃO]
+            if len(outcomes) == 1:
+                header = "[❌ ERRO NA EXECUÇÃO]\n\nErro na execução anterior:"
+            else:
+                failed = sum(1 for outcome in outcomes if not outcome['result'].success)
+                header = (f"[❌ ERRO EM {failed} DE {len(outcomes)} EXECUÇÕES]\n\n"
+                          f"Resultados das execuções anteriores:")
 
-Erro na execução anterior:
-Tool: {tool_id}
-Erro: {result.error}
+            current_query = f"""{header}
+{self._format_tool_outcomes(outcomes)}
 
 Pergunta original: {user_query}
 
 Por favor, tente um approach diferente ou analise o erro. Se o erro persistir após 
 uma nova tentativa, responda com uma explicação clara do problema."""
 
+        return None, current_query
+
+    @contextmanager
+    def _use_session(self, session: Optional[AgentSession]):
+        """Liga a sessão à chamada atual (só a esta thread / task asyncio)"""
+        token = _current_session.set(session) if session is not None else None
+        try:
+            yield
+        finally:
+            if token is not None:
+                _current_session.reset(token)
+
+    @contextmanager
+    def _traced_turn(self):
+        """Abre o span raiz do turno na sessão atual e o entrega à telemetria no fim"""
+        session = self.session
+        turn = session.trace = Span("turn")
+        try:
+            yield turn
+        finally:
+            turn.finish(
+                iterations=len(session.llm_timings),
+                tool_calls=len(session.execution_history),
+            )
+            self.telemetry.record_turn(turn, session.session_id)
+
+    def prometheus_metrics(self) -> str:
+        """Métricas dos turnos e dos caches de retrieval no formato texto do Prometheus"""
+        metrics = self.telemetry.metrics
+        retrieval = self.doc_processor.retrieval_cache_stats()
+        for field in ("hits", "misses", "entries"):
+            metrics.describe(f"agent_retrieval_cache_{field}", "gauge", f"Cache de retrieval: {field} acumulados")
+        for cache_name in ("query_embeddings", "search_results"):
+            for field in ("hits", "misses", "entries"):
+                metrics.set(f"agent_retrieval_cache_{field}", retrieval[cache_name][field], cache=cache_name)
+        return metrics.render_prometheus()
+
+    def close(self):
+        """Encerra o pool de threads das tools; chamar quando o Agent não for mais usado"""
+        self._tool_executor.shutdown(wait=True)
+
+    def _trace_llm(self, span: Span):
+        """Tokens e tempos do Ollama no span do LLM, com avaliação do prompt e geração como filhos"""
+        if not self.session.llm_timings:
+            return
+        timing = self.session.llm_timings[-1]
+        span.attributes.update({
+            key: round(timing[key], 3) for key in ("ttft_ms", "prompt_tokens", "completion_tokens")
+            if timing.get(key) is not None
+        })
+        # Primeiro token = fim da avaliação do prompt, do ponto de vista do agent
+        first_token = min(span.start + timing["ttft_ms"] / 1000, span.end)
+        span.child("llm.prompt_eval", span.start, first_token, ollama_ms=round(timing["prompt_eval_ms"], 3))
+        span.child("llm.generation", first_token, span.end, ollama_ms=round(timing["eval_ms"], 3))
+
+    @staticmethod
+    def _tool_label(tool_call: Dict[str, Any]) -> str:
+        """
+        tool.action para as métricas; nomes que o LLM inventou viram "unknown",
+        senão cada um criaria uma série nova que nunca sai da memória
+        """
+        tool_name, action = tool_call.get("tool"), tool_call.get("action")
+        return f"{tool_name}.{action}" if is_known_action(tool_name, action) else "unknown"
+
+    def _trace_tools(self, span: Span, outcomes: List[Dict[str, Any]]):
+        """Um filho por chamada (medida na thread que executou), com o status do cache"""
+        for outcome in outcomes:
+            span.child(
+                "tool",
+                outcome["started"],
+                outcome["started"] + outcome["duration_ms"] / 1000,
+                tool=self._tool_label(outcome["tool_call"]),
+                tool_id=outcome["tool_id"],  # Como veio do LLM (só no trace do turno)
+                success=outcome["result"].success,
+                cache=outcome.get("cache"),
+                parallel=outcome["parallel"],
+            )
+
+    def chat(self, user_query: str, session: Optional[AgentSession] = None) -> str:
+        """Chat com iteração automática de tools com critérios de parada melhorados"""
+        with self._use_session(session), self._traced_turn():
+            return self._chat(user_query)
+
+    def _chat(self, user_query: str) -> str:
+        """Loop de iterações de chat() na sessão atual"""
+        turn = self.session.trace
+        current_query = self._start_turn(user_query)
+
+        # Retrieval uma vez por turno, pela pergunta original: as iterações
+        # seguintes reaproveitam o contexto em vez de buscar pelo texto de status
+        with turn.span("retrieval"):
+            rag_context = self._retrieve_context(user_query)
+
+        for iteration in range(1, self.max_iterations + 1):
+            with turn.span("iteration", iteration=iteration) as step:
+                # Construir e invocar LLM
+                with step.span("prompt_build"):
+                    messages = self._build_messages(current_query, rag_context)
+                with step.span("llm") as llm_span:
+                    response_text = self._invoke_llm(messages, iteration)
+                self._trace_llm(llm_span)
+
+                # Verificar se há chamadas de tool (uma resposta pode trazer várias)
+                with step.span("parse") as parse_span:
+                    tool_calls = self._parse_tool_calls(response_text)
+                    parse_span.attributes["tool_calls"] = len(tool_calls)
+                if not tool_calls:
+                    return self._finish_turn(user_query, response_text)
+
+                # Detectar padrões problemáticos
+                stop_response = self._check_loops(tool_calls, response_text, current_query)
+                if stop_response is not None:
+                    return stop_response
+
+                # Executar tools (leituras independentes em paralelo)
+                with step.span("tools") as tools_span:
+                    outcomes = self._execute_tool_calls(tool_calls)
+                self._trace_tools(tools_span, outcomes)
+
+                if self.refresh_context_on_tool:
+                    with step.span("retrieval"):
+                        rag_context = self._retrieve_context(user_query, outcomes)
+
+                final_response, current_query = self._after_tools(
+                    iteration, user_query, response_text, tool_calls, outcomes
+                )
+                if final_response is not None:
+                    return final_response
+
         return f"⚠️  Máximo de iterações ({self.max_iterations}) atingido"
 
-    def initialize_docs(self) -> bool:
-        """Inicializa documentos e vector store"""
-        print("📚 Carregando documentos...")
-        docs = self.doc_processor.load_documents()
+    async def achat(self, user_query: str, session: Optional[AgentSession] = None) -> str:
+        """
+        Versão assíncrona de chat(): o LLM é chamado com ainvoke/astream, a API
+        com httpx assíncrono e a busca no FAISS e o I/O de arquivos rodam em
+        threads, então o event loop fica livre enquanto espera o Ollama ou uma
+        API. Conversas simultâneas passam cada uma a sua AgentSession (ou usam
+        um Agent cada, compartilhando o mesmo doc_processor).
+        """
+        with self._use_session(session), self._traced_turn():
+            return await self._achat(user_query)
+
+    async def _achat(self, user_query: str) -> str:
+        """Loop de iterações de achat() na sessão atual"""
+        turn = self.session.trace
+        current_query = self._start_turn(user_query)
+        with turn.span("retrieval"):
+            rag_context = await asyncio.to_thread(self._retrieve_context, user_query)
+
+        for iteration in range(1, self.max_iterations + 1):
+            with turn.span("iteration", iteration=iteration) as step:
+                with step.span("prompt_build"):
+                    messages = self._build_messages(current_query, rag_context)
+                with step.span("llm") as llm_span:
+                    response_text = await self._ainvoke_llm(messages, iteration)
+                self._trace_llm(llm_span)
+
+                with step.span("parse") as parse_span:
+                    tool_calls = self._parse_tool_calls(response_text)
+                    parse_span.attributes["tool_calls"] = len(tool_calls)
+                if not tool_calls:
+                    return self._finish_turn(user_query, response_text)
+
+                stop_response = self._check_loops(tool_calls, response_text, current_query)
+                if stop_response is not None:
+                    return stop_response
+
+                with step.span("tools") as tools_span:
+                    outcomes = await self._aexecute_tool_calls(tool_calls)
+                self._trace_tools(tools_span, outcomes)
+
+                if self.refresh_context_on_tool:
+                    with step.span("retrieval"):
+                        rag_context = await asyncio.to_thread(self._retrieve_context, user_query, outcomes)
+
+                final_response, current_query = self._after_tools(
+                    iteration, user_query, response_text, tool_calls, outcomes
+                )
+                if final_response is not None:
+                    return final_response
 
-        if not docs:
+        return f"⚠️  Máximo de iterações ({self.max_iterations}) atingido"
+
+    def initialize_docs(self, force_rebuild: bool = False) -> bool:
+        """Inicializa documentos e vector store (reaproveita o índice salvo se válido)"""
+        print("📚 Verificando índice salvo...")
+        if not force_rebuild:
+            if self.doc_processor.is_vector_store_current():
+                if self.doc_processor.load_vector_store():
+                    print("✓ Documentos preparados (índice reaproveitado)!")
+                    return True
+            elif self.doc_processor.update_vector_store() is not None:
+                print("✓ Documentos preparados (índice atualizado incrementalmente)!")
+                return True
+
+        print("📚 Carregando documentos e criando índice...")
+        if not self.doc_processor.build_vector_store():
             print("⚠️  Nenhum documento carregado. Crie arquivos em ./docs/")
             return False
 
-        print("🔄 Criando índice...")
-        chunks = self.doc_processor.chunk_documents()
-        self.doc_processor.create_vector_store(chunks)
         self.doc_processor.save_vector_store()
 
         print("✓ Documentos preparados!")
         return True
-
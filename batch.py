@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import redirect_stdout
+from typing import Any, Dict, Iterator, Optional, Tuple
+from agent import Agent, AgentSession
+from telemetry import LatencyStats
+
+def read_queries(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Lê o JSONL de entrada: cada linha é uma string (a query) ou um objeto com
+    "query" (ou "message"); os demais campos voltam na saída. Linhas vazias
+    são ignoradas.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, {"error": f"JSON inválido: {e}"}
+                continue
+            if isinstance(record, str):
+                record = {"query": record}
+            elif not isinstance(record, dict):
+                record = {"error": "Linha deve ser uma string ou um objeto"}
+            yield line_number, record
+
+def run_query(agent: Agent, line_number: int, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Roda uma query em uma sessão nova e monta o registro de saída"""
+    query = record.get("query") or record.get("message")
+    output = {"line": line_number, **{k: v for k, v in record.items() if k not in ("query", "message", "error")}}
+    output["query"] = query
+    if record.get("error") or not isinstance(query, str) or not query.strip():
+        output["error"] = record.get("error") or "Campo 'query' é obrigatório"
+        return output
+
+    # Sessão própria: histórico, loops e tempos não vazam entre queries
+    session = AgentSession()
+    started = time.perf_counter()
+    try:
+        output["response"] = agent.chat(query, session=session)
+    except Exception as e:
+        output["error"] = str(e)
+    total_ms = (time.perf_counter() - started) * 1000
+
+    output.update({
+        "iterations": len(session.llm_timings),
+        "tool_calls": session.execution_history,
+        "latency_ms": {
+            "total": round(total_ms, 1),
+            "retrieval": round(session.retrieval_ms, 1),
+            "llm": round(sum(t["wall_ms"] for t in session.llm_timings), 1),
+            "ttft": [round(t["ttft_ms"], 1) for t in session.llm_timings],
+            # Soma por chamada: com leituras em paralelo pode passar do tempo real
+            "tools": round(sum(e["duration_ms"] for e in session.execution_history), 1),
+        },
+    })
+    return output
+
+def run_batch(agent: Agent, in_path: str, out_path: str, workers: int = 4, verbose: bool = False) -> Dict[str, Any]:
+    """
+    Roda todas as queries de `in_path` com um único Agent (LLM + índice
+    carregados uma vez) em `workers` threads, gravando cada resposta em
+    `out_path` assim que termina (a ordem de saída é a de conclusão; o campo
+    "line" aponta a linha de entrada). No máximo 2 × workers queries ficam
+    em voo, então arquivos grandes não são carregados de uma vez.
+
+    Sem `verbose` o log do agent (prints por iteração) é descartado: com
+    várias queries ao mesmo tempo ele ficaria intercalado no terminal.
+    """
+    latency = LatencyStats(window=100_000)
+    invalid = 0  # Linhas sem query válida (não entram nos percentis)
+    queries = read_queries(in_path)
+    started = time.perf_counter()
+    progress = sys.stderr
+
+    with open(out_path, "w", encoding="utf-8") as out, \
+            open(os.devnull, "w") as devnull, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool, \
+            redirect_stdout(sys.stdout if verbose else devnull):
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < workers * 2:
+                item: Optional[Tuple[int, Dict[str, Any]]] = next(queries, None)
+                if item is None:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(run_query, agent, *item))
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                output = future.result()
+                out.write(json.dumps(output, ensure_ascii=False, default=str) + "\n")
+                out.flush()
+                error = "error" in output
+                if "latency_ms" in output:
+                    latency.record(output["latency_ms"]["total"], error=error)
+                else:
+                    invalid += 1
+                status = "❌" if error else "✅"
+                print(f"{status} linha {output['line']} "
+                      f"({output.get('latency_ms', {}).get('total', 0):.0f} ms, "
+                      f"{output.get('iterations', 0)} iterações)", file=progress)
+
+    wall_s = time.perf_counter() - started
+    stats = latency.stats()
+    summary = {
+        "queries": stats["requests"] + invalid,
+        "errors": stats["errors"] + invalid,
+        "workers": workers,
+        "wall_s": round(wall_s, 2),
+        "throughput_qps": round(stats["requests"] / wall_s, 3) if wall_s else 0.0,  # Queries executadas
+        "latency_ms": {k: v for k, v in stats.items() if k.endswith("_ms")},
+    }
+    print(f"📦 {summary['queries']} queries em {summary['wall_s']} s "
+          f"({summary['throughput_qps']} q/s, {workers} workers, {summary['errors']} erros) → {out_path}", file=progress)
+    return summary
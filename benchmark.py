@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Benchmarks offline do agent, contra o Ollama falso de fake_ollama.py
+(latência configurável, respostas roteirizadas, embeddings determinísticos).
+
+Mede: build do índice (docs/s, chunks/s), search() (QPS, p50/p99, frio e com
+cache), Agent.chat (iterações e tempo por turno) e o overhead de execute_tool.
+O resultado vai para um JSON; --compare mostra a variação contra outro.
+
+Uso: python benchmark.py [--out benchmark_results.json] [--compare anterior.json]
+     python benchmark.py --quick                        # poucas amostras, para CI
+     python benchmark.py --docs 80 --queries 500 --turns 40 --chat-latency 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import subprocess
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+from fake_ollama import FakeOllama
+
+WORDS = (
+    "api conta saldo ledger transação bloqueio judicial tenant usuário endpoint token "
+    "autenticação erro timeout retry cache índice documento chunk embedding busca "
+    "servidor resposta requisição header payload status deploy log métrica latência"
+).split()
+
+def option_value(args: list, name: str, default: str) -> str:
+    """Valor de uma opção --nome VALOR da linha de comando"""
+    if name in args and args.index(name) + 1 < len(args):
+        return args[args.index(name) + 1]
+    return default
+
+@contextmanager
+def quiet():
+    """Descarta os prints do agent/RAG durante a medição"""
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        yield
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """Média e percentis (nearest-rank) de uma lista de latências em ms"""
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {}
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+
+    return {
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+def write_docs(path: Path, count: int, paragraphs: int = 12, seed: int = 7):
+    """Gera `count` documentos markdown sintéticos (conteúdo determinístico)"""
+    rng = random.Random(seed)
+    path.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        sections = [f"# Documento {i}\n"]
+        for p in range(paragraphs):
+            words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(60, 120)))
+            sections.append(f"## Seção {p}\n\n{words}.\n")
+        (path / f"doc_{i:04d}.md").write_text("\n".join(sections), encoding="utf-8")
+
+def bench_index_build(docs_path: Path, server: FakeOllama) -> Dict[str, Any]:
+    """Build completo do índice (carregar → dividir → embedar → indexar)"""
+    from rag import DocumentProcessor
+
+    processor = DocumentProcessor(
+        docs_path=str(docs_path),
+        ollama_base_url=server.url,
+        embedding_cache_path=None,  # Mede o caminho até o "Ollama", não o cache
+        load_workers=2,
+    )
+    before = dict(server.counts)
+    started = time.perf_counter()
+    with quiet():
+        processor.build_vector_store()
+    wall_s = time.perf_counter() - started
+
+    files = len(processor.file_fingerprints)
+    chunks = processor.vector_store.index.ntotal
+    return {
+        "processor": processor,
+        "result": {
+            "files": files,
+            "chunks": chunks,
+            "wall_s": round(wall_s, 3),
+            "docs_per_s": round(files / wall_s, 2),
+            "chunks_per_s": round(chunks / wall_s, 2),
+            "embed_requests": server.counts["embed"] - before["embed"],
+        },
+    }
+
+def bench_search(processor, queries: int, k: int = 3) -> Dict[str, Any]:
+    """search(): queries distintas (embedding + FAISS) e depois as mesmas de novo (cache)"""
+    rng = random.Random(11)
+    texts = [" ".join(rng.choice(WORDS) for _ in range(6)) + f" #{i}" for i in range(queries)]
+    processor.search_cache.clear()
+    processor.query_embedding_cache.clear()
+
+    result = {}
+    for label in ("cold", "cached"):
+        samples = []
+        started = time.perf_counter()
+        for text in texts:
+            t0 = time.perf_counter()
+            processor.search(text, k=k)
+            samples.append((time.perf_counter() - t0) * 1000)
+        wall_s = time.perf_counter() - started
+        result[label] = {"queries": queries, "qps": round(queries / wall_s, 1), **summarize(samples)}
+    return result
+
+def bench_agent_chat(processor, server: FakeOllama, turns: int, stream: bool) -> Dict[str, Any]:
+    """Agent.chat com o roteiro padrão (uma tool e a conclusão), sessão nova por turno"""
+    from agent import Agent, AgentSession
+
+    agent = Agent(ollama_base_url=server.url, doc_processor=processor, stream=stream)
+    # Cada modo começa com o cache de retrieval frio
+    processor.search_cache.clear()
+    processor.query_embedding_cache.clear()
+    samples, iterations, llm_ms, tool_calls = [], [], [], 0
+    before = server.counts["chat"]
+    for i in range(turns):
+        session = AgentSession()
+        started = time.perf_counter()
+        with quiet():
+            agent.chat(f"Qual é o status da transação {i} na API de saldo?", session=session)
+        samples.append((time.perf_counter() - started) * 1000)
+        iterations.append(len(session.llm_timings))
+        llm_ms.append(sum(t["wall_ms"] for t in session.llm_timings))
+        tool_calls += len(session.execution_history)
+    agent.close()
+
+    total_llm = sum(llm_ms)
+    total = sum(samples)
+    return {
+        "turns": turns,
+        "stream": stream,
+        "iterations_mean": round(sum(iterations) / turns, 2),
+        "llm_requests": server.counts["chat"] - before,
+        "tool_calls": tool_calls,
+        # Tempo fora do LLM (retrieval, parse, tools, prompt): o que o código controla
+        "overhead_ms_per_turn": round((total - total_llm) / turns, 3),
+        **summarize(samples),
+    }
+
+def bench_execute_tool(calls: int) -> Dict[str, Any]:
+    """
+    Custo do despacho de execute_tool comparado à chamada direta da action
+    (melhor de 3 rodadas, para tirar o ruído de agendamento)
+    """
+    from tools import JsonTool, SystemTool, execute_tool
+
+    cases = {
+        "system.get_timestamp": (lambda: SystemTool.get_timestamp(),
+                                 lambda: execute_tool("system", "get_timestamp")),
+        "json.parse_json": (lambda: JsonTool.parse_json('{"a": [1, 2, 3]}'),
+                            lambda: execute_tool("json", "parse_json", content='{"a": [1, 2, 3]}')),
+    }
+    result = {}
+    for name, (direct, dispatched) in cases.items():
+        timings = {}
+        for label, fn in (("direct", direct), ("execute_tool", dispatched)):
+            rounds = []
+            for _ in range(3):
+                started = time.perf_counter()
+                for _ in range(calls):
+                    fn()
+                rounds.append((time.perf_counter() - started) * 1e6 / calls)
+            timings[label] = min(rounds)
+        result[name] = {
+            "direct_us": round(timings["direct"], 3),
+            "execute_tool_us": round(timings["execute_tool"], 3),
+            "overhead_us": round(timings["execute_tool"] - timings["direct"], 3),
+        }
+    return result
+
+def git_commit() -> str:
+    """Commit atual (para comparar resultados entre mudanças)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or "desconhecido"
+    except (OSError, subprocess.SubprocessError):
+        return "desconhecido"
+
+def flatten(data: Any, prefix: str = "") -> Dict[str, float]:
+    """{'a': {'b': 1}} → {'a.b': 1}, só valores numéricos"""
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix] = data
+    return flat
+
+def print_comparison(previous: Dict[str, Any], current: Dict[str, Any]):
+    """Variação de cada métrica contra um resultado anterior"""
+    old, new = flatten(previous.get("results", {})), flatten(current["results"])
+    print(f"\n📊 Comparação com {previous.get('meta', {}).get('commit', '?')} → {current['meta']['commit']}")
+    for key in sorted(old.keys() & new.keys()):
+        if old[key]:
+            change = (new[key] - old[key]) / abs(old[key]) * 100
+            print(f"   {key:<45} {old[key]:>12} → {new[key]:>12} ({change:+.1f}%)")
+
+def main():
+    args = sys.argv[1:]
+    quick = "--quick" in args
+    config = {
+        "docs": int(option_value(args, "--docs", "8" if quick else "40")),
+        "queries": int(option_value(args, "--queries", "50" if quick else "300")),
+        "turns": int(option_value(args, "--turns", "5" if quick else "20")),
+        "tool_calls": int(option_value(args, "--tool-calls", "2000" if quick else "20000")),
+        "chat_latency_s": float(option_value(args, "--chat-latency", "0.05")),
+        "token_latency_s": float(option_value(args, "--token-latency", "0.0")),
+        "embed_latency_s": float(option_value(args, "--embed-latency", "0.005")),
+    }
+    out_path = option_value(args, "--out", "benchmark_results.json")
+    compare_path = option_value(args, "--compare", None)
+
+    print("⏱️  Benchmark offline do agent")
+    print(f"   {config}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, FakeOllama(
+        chat_latency=config["chat_latency_s"],
+        token_latency=config["token_latency_s"],
+        embed_latency=config["embed_latency_s"],
+    ) as server:
+        docs_path = Path(tmp) / "docs"
+        write_docs(docs_path, config["docs"])
+
+        print("\n📚 Build do índice...")
+        build = bench_index_build(docs_path, server)
+        results["index_build"] = build["result"]
+        print(f"   {build['result']}")
+
+        print("\n🔎 search()...")
+        results["search"] = bench_search(build["processor"], config["queries"])
+        for label, stats in results["search"].items():
+            print(f"   {label}: {stats['qps']} QPS, p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms")
+
+        print("\n🤖 Agent.chat...")
+        for stream in (False, True):
+            label = "stream" if stream else "invoke"
+            stats = bench_agent_chat(build["processor"], server, config["turns"], stream)
+            results[f"agent_chat_{label}"] = stats
+            print(f"   {label}: {stats['iterations_mean']} iterações/turno, p50 {stats['p50_ms']} ms, "
+                  f"p99 {stats['p99_ms']} ms, fora do LLM {stats['overhead_ms_per_turn']} ms/turno")
+
+        print("\n🔧 execute_tool...")
+        results["execute_tool"] = bench_execute_tool(config["tool_calls"])
+        for name, stats in results["execute_tool"].items():
+            print(f"   {name}: {stats['execute_tool_us']} µs (overhead {stats['overhead_us']} µs)")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": config,
+        },
+        "results": results,
+    }
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados em {out_path}")
+
+    if compare_path:
+        with open(compare_path, "r", encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
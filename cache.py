@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+from langchain_core.embeddings import Embeddings
+
+class CachedEmbeddings(Embeddings):
+    """
+    Cache em disco (SQLite) para embeddings, endereçado por conteúdo.
+
+    A chave é o nome do modelo + SHA-256 do texto, então rebuilds, testes com
+    outro chunk_size e queries repetidas reaproveitam vetores já calculados em
+    vez de fazer outro round trip HTTP ao Ollama. O cache tem limite de
+    entradas com despejo LRU e contadores de hit/miss.
+
+    Leituras não escrevem no SQLite: os acessos (last_used) ficam em memória
+    e vão para o disco junto com a próxima gravação, ao acumular
+    `touch_flush_entries` ou em close().
+    """
+
+    touch_flush_entries = 1024
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        path: str = "./.cache/embeddings.sqlite",
+        max_entries: int = 100_000
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._touched: Dict[str, int] = {}  # chave → último acesso (ns) ainda não gravado
+
+    def _key(self, text: str) -> str:
+        """Chave do cache: modelo + hash do texto"""
+        return f"{self.model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Busca vetores no cache e marca os encontrados como usados agora (em memória)"""
+        found = {}
+        now = time.time_ns()
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self._lock:
+            # Lotes abaixo do limite de variáveis do SQLite
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+                    self._touched[key] = now
+            if len(self._touched) >= self.touch_flush_entries:
+                self._flush_touched()
+                self._conn.commit()
+
+        return found
+
+    def _flush_touched(self):
+        """Grava os acessos pendentes (chamar com o lock, antes do commit)"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _put_many(self, items: Dict[str, List[float]]):
+        """Grava vetores novos e despeja os menos usados se passar do limite"""
+        now = time.time_ns()
+        with self._lock:
+            # Chave já presente (outra thread embedou o mesmo texto) tem o mesmo
+            # vetor: só o acesso é atualizado, e a contagem não muda
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array('f', vector).tobytes(), now) for key, vector in items.items()]
+            ).rowcount
+            self._count += inserted
+            self._touched.update(dict.fromkeys(items, now))
+            self._flush_touched()  # Antes do despejo, para ele ver a ordem LRU atual
+            if self._count > self.max_entries:
+                evicted = self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (self._count - self.max_entries,)
+                ).rowcount
+                self._count -= evicted
+            self._conn.commit()
+
+    def _record(self, hits: int = 0, misses: int = 0):
+        """Atualiza os contadores (seguro entre threads)"""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeda textos, chamando o Ollama só para os que não estão no cache"""
+        keys = [self._key(text) for text in texts]
+        cached = self._get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        miss_count = sum(1 for key in keys if key not in cached)
+        self._record(hits=len(keys) - miss_count, misses=miss_count)
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._put_many(computed)
+            cached.update(computed)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embeda uma query usando o mesmo cache (OllamaEmbeddings não diferencia query de documento)"""
+        key = self._key(text)
+        cached = self._get_many([key])
+
+        if key in cached:
+            self._record(hits=1)
+            return cached[key]
+
+        self._record(misses=1)
+        vector = self.embeddings.embed_query(text)
+        self._put_many({key: vector})
+        return vector
+
+    def stats(self) -> Dict[str, Any]:
+        """Estatísticas do cache"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._count,
+            "max_entries": self.max_entries,
+        }
+
+    def close(self):
+        """Grava os acessos pendentes e fecha a conexão"""
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+class TTLCache:
+    """Cache LRU em memória com expiração por tempo (TTL) e contadores de hit/miss"""
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl  # Segundos; None = sem expiração
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # chave → (expira_em, valor)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Retorna o valor ou None se ausente/expirado"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        """Grava um valor, despejando o menos usado se passar do limite"""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> bool:
+        """Remove uma entrada; retorna se ela existia"""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        """Descarta todas as entradas (mantém os contadores)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Estatísticas do cache"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
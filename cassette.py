@@ -0,0 +1,350 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import threading
+from array import array
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Tuple
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+CASSETTE_MODES = ("record", "replay", "replay_timed")
+
+class CassetteMiss(KeyError):
+    """Requisição sem gravação correspondente no modo replay"""
+
+class Cassette:
+    """
+    Gravação das requisições ao LLM e ao modelo de embeddings em um JSONL.
+
+    - record: repassa ao Ollama e grava requisição, resposta e tempos
+    - replay: devolve as respostas gravadas sem latência de modelo
+    - replay_timed: devolve as respostas respeitando os tempos gravados
+      (TTFT e intervalo entre chunks no streaming)
+
+    No replay as chamadas de chat são casadas pelo hash das mensagens; se o
+    prompt mudou (timestamps, IDs gerados, ...), a próxima gravação ainda não
+    usada, na ordem original, responde e conta como divergência. Assim o
+    replay reproduz a conversa e as iterações mesmo com prompts não
+    determinísticos, e `stats()` mostra quanto o prompt se afastou.
+    """
+
+    def __init__(self, path: str, mode: str = "replay"):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Modo de cassette inválido: {mode} (use um de {', '.join(CASSETTE_MODES)})")
+        self.path = path
+        self.mode = mode
+        self.counts = defaultdict(int)  # "chat.recorded", "chat.replayed", "chat.mismatch", ...
+        self._lock = threading.Lock()
+
+        # Replay: entradas de chat na ordem gravada + índice por hash da requisição
+        self._chats: List[Dict[str, Any]] = []
+        self._chat_used: List[bool] = []
+        self._chat_by_key: Dict[str, deque] = defaultdict(deque)
+        self._next_chat = 0
+        # Replay: vetor e custo (segundos) por texto, e queries na ordem gravada
+        self._vectors: Dict[str, Tuple[List[float], float]] = {}
+        self._queries: deque = deque()
+        # Replay: valores não determinísticos gravados (IDs gerados), por nome
+        self._values: Dict[str, deque] = defaultdict(deque)
+
+        if mode == "record":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "w", encoding="utf-8")
+        else:
+            self._file = None
+            self._load()
+
+    @property
+    def timed(self) -> bool:
+        return self.mode == "replay_timed"
+
+    @staticmethod
+    def _hash(payload: Any) -> str:
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def chat_key(model: str, messages: Any) -> str:
+        """Hash do modelo + mensagens (tipo e conteúdo)"""
+        if isinstance(messages, str):
+            normalized = [["human", messages]]
+        else:
+            normalized = [[m.type, m.content] if isinstance(m, BaseMessage) else [m[0], m[1]] for m in messages]
+        return Cassette._hash([model, normalized])
+
+    @staticmethod
+    def text_key(model: str, text: str) -> str:
+        return Cassette._hash([model, text])
+
+    @staticmethod
+    def _pack(vector: List[float]) -> str:
+        """Vetor → base64 de float32 (bem menor que a lista em JSON)"""
+        return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+    @staticmethod
+    def _unpack(data: str) -> List[float]:
+        return array("f", base64.b64decode(data)).tolist()
+
+    def _load(self):
+        """Lê a gravação e monta os índices do replay"""
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["kind"] == "chat":
+                    self._chat_by_key[entry["key"]].append(len(self._chats))
+                    self._chats.append(entry)
+                    self._chat_used.append(False)
+                elif entry["kind"] == "embed":
+                    cost = entry["elapsed_s"] / max(1, len(entry["keys"]))
+                    for key, packed in zip(entry["keys"], entry["vectors"]):
+                        self._vectors[key] = (self._unpack(packed), cost)
+                    if entry.get("query"):
+                        self._queries.append(entry["keys"][0])
+                elif entry["kind"] == "value":
+                    self._values[entry["name"]].append(entry["value"])
+
+    def _write(self, entry: Dict[str, Any]):
+        """Acrescenta uma entrada (flush a cada uma: a gravação sobrevive a um crash)"""
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.counts[f"{entry['kind']}.recorded"] += 1
+
+    def record_chat(self, key: str, chunks: List[Tuple[float, str, Dict[str, Any]]], elapsed_s: float, complete: bool):
+        """Grava uma resposta de chat como chunks (offset em s, texto, metadados)"""
+        self._write({
+            "kind": "chat",
+            "key": key,
+            "elapsed_s": round(elapsed_s, 6),
+            "complete": complete,  # False: o agent cortou o streaming no meio
+            "chunks": [[round(offset, 6), text, meta] for offset, text, meta in chunks],
+        })
+
+    def next_chat(self, key: str) -> Dict[str, Any]:
+        """Gravação para a requisição: pelo hash ou, se o prompt mudou, a próxima na ordem"""
+        with self._lock:
+            candidates = self._chat_by_key.get(key)
+            while candidates:
+                index = candidates.popleft()
+                if not self._chat_used[index]:
+                    self.counts["chat.replayed"] += 1
+                    return self._take(index)
+
+            while self._next_chat < len(self._chats) and self._chat_used[self._next_chat]:
+                self._next_chat += 1
+            if self._next_chat == len(self._chats):
+                raise CassetteMiss(f"Cassette {self.path}: nenhuma resposta de chat gravada restante")
+            self.counts["chat.replayed"] += 1
+            self.counts["chat.mismatch"] += 1
+            return self._take(self._next_chat)
+
+    def _take(self, index: int) -> Dict[str, Any]:
+        self._chat_used[index] = True
+        return self._chats[index]
+
+    def record_embeddings(self, keys: List[str], vectors: List[List[float]], elapsed_s: float, query: bool = False):
+        """Grava um lote de embeddings (ou uma query)"""
+        self._write({
+            "kind": "embed",
+            "query": query,
+            "elapsed_s": round(elapsed_s, 6),
+            "keys": keys,
+            "vectors": [self._pack(vector) for vector in vectors],
+        })
+
+    def lookup_embeddings(self, keys: List[str], query: bool = False) -> Tuple[List[List[float]], float]:
+        """
+        Vetores gravados para os textos e o custo gravado somado. Uma query
+        que não bate (texto derivado de um resultado de tool, por exemplo)
+        recebe a próxima query gravada, como no chat.
+        """
+        with self._lock:
+            vectors, cost = [], 0.0
+            for key in keys:
+                found = self._vectors.get(key)
+                if found is None and query and self._queries:
+                    found = self._vectors[self._queries.popleft()]
+                    self.counts["embed.mismatch"] += 1
+                elif found is not None and query and self._queries and self._queries[0] == key:
+                    self._queries.popleft()
+                if found is None:
+                    raise CassetteMiss(f"Cassette {self.path}: embedding não gravado para o texto {key[:12]}…")
+                vectors.append(found[0])
+                cost += found[1]
+            self.counts["embed.replayed"] += len(keys)
+            return vectors, cost
+
+    def value(self, name: str, produce: Callable[[], Any]) -> Any:
+        """
+        Valor não determinístico do agent (ex.: transaction ID gerado): gravado
+        no record e devolvido na mesma ordem no replay, para que os prompts
+        reproduzidos batam com os gravados.
+        """
+        if self.mode == "record":
+            value = produce()
+            self._write({"kind": "value", "name": name, "value": value})
+            return value
+        with self._lock:
+            if self._values[name]:
+                self.counts["value.replayed"] += 1
+                return self._values[name].popleft()
+            self.counts["value.missing"] += 1
+        return produce()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de gravação/replay e divergências"""
+        with self._lock:
+            stats = dict(self.counts)
+        stats["mode"] = self.mode
+        stats["path"] = self.path
+        if self.mode != "record":
+            stats["chat.unused"] = self._chat_used.count(False)
+        return stats
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def _chunk_to_record(chunk: Any) -> Tuple[str, Dict[str, Any]]:
+    return chunk.content, dict(chunk.response_metadata or {})
+
+class CassetteChatModel:
+    """
+    Envolve o ChatOllama do Agent (invoke/stream/ainvoke/astream). Os demais
+    atributos vão direto para o modelo original.
+    """
+
+    def __init__(self, llm: Any, cassette: Cassette):
+        self.llm = llm
+        self.cassette = cassette
+        self.model = getattr(llm, "model", "")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+    def _key(self, messages: Any) -> str:
+        return Cassette.chat_key(self.model, messages)
+
+    # Gravação
+
+    def _record_invoke(self, messages: Any, response: AIMessage, started: float):
+        elapsed = time.perf_counter() - started
+        content, meta = _chunk_to_record(response)
+        self.cassette.record_chat(self._key(messages), [(elapsed, content, meta)], elapsed, complete=True)
+
+    # Replay
+
+    @staticmethod
+    def _as_message(entry: Dict[str, Any]) -> AIMessage:
+        meta = {}
+        for _, _, chunk_meta in entry["chunks"]:
+            meta.update(chunk_meta)
+        return AIMessage(content="".join(text for _, text, _ in entry["chunks"]), response_metadata=meta)
+
+    def invoke(self, messages: Any, **kwargs) -> AIMessage:
+        if self.cassette.mode != "record":
+            entry = self.cassette.next_chat(self._key(messages))
+            if self.cassette.timed:
+                time.sleep(entry["elapsed_s"])
+            return self._as_message(entry)
+
+        started = time.perf_counter()
+        response = self.llm.invoke(messages, **kwargs)
+        self._record_invoke(messages, response, started)
+        return response
+
+    async def ainvoke(self, messages: Any, **kwargs) -> AIMessage:
+        if self.cassette.mode != "record":
+            entry = self.cassette.next_chat(self._key(messages))
+            if self.cassette.timed:
+                await asyncio.sleep(entry["elapsed_s"])
+            return self._as_message(entry)
+
+        started = time.perf_counter()
+        response = await self.llm.ainvoke(messages, **kwargs)
+        self._record_invoke(messages, response, started)
+        return response
+
+    def stream(self, messages: Any, **kwargs) -> Iterator[AIMessageChunk]:
+        key = self._key(messages)
+        if self.cassette.mode != "record":
+            entry = self.cassette.next_chat(key)
+            started = time.perf_counter()
+            for offset, text, meta in entry["chunks"]:
+                if self.cassette.timed:
+                    time.sleep(max(0.0, offset - (time.perf_counter() - started)))
+                yield AIMessageChunk(content=text, response_metadata=meta)
+            return
+
+        started = time.perf_counter()
+        chunks = []
+        complete = False
+        try:
+            for chunk in self.llm.stream(messages, **kwargs):
+                chunks.append((time.perf_counter() - started, *_chunk_to_record(chunk)))
+                yield chunk
+            complete = True
+        finally:
+            # Também grava quando o agent corta a geração (o gerador é fechado)
+            self.cassette.record_chat(key, chunks, time.perf_counter() - started, complete)
+
+    async def astream(self, messages: Any, **kwargs) -> AsyncIterator[AIMessageChunk]:
+        key = self._key(messages)
+        if self.cassette.mode != "record":
+            entry = self.cassette.next_chat(key)
+            started = time.perf_counter()
+            for offset, text, meta in entry["chunks"]:
+                if self.cassette.timed:
+                    await asyncio.sleep(max(0.0, offset - (time.perf_counter() - started)))
+                yield AIMessageChunk(content=text, response_metadata=meta)
+            return
+
+        started = time.perf_counter()
+        chunks = []
+        complete = False
+        stream = self.llm.astream(messages, **kwargs)
+        try:
+            async for chunk in stream:
+                chunks.append((time.perf_counter() - started, *_chunk_to_record(chunk)))
+                yield chunk
+            complete = True
+        finally:
+            await stream.aclose()
+            self.cassette.record_chat(key, chunks, time.perf_counter() - started, complete)
+
+class CassetteEmbeddings(Embeddings):
+    """Envolve o modelo de embeddings do DocumentProcessor (com ou sem cache)"""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cassette: Cassette):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cassette = cassette
+
+    def _embed(self, texts: List[str], query: bool) -> List[List[float]]:
+        keys = [Cassette.text_key(self.model_name, text) for text in texts]
+        if self.cassette.mode != "record":
+            vectors, cost = self.cassette.lookup_embeddings(keys, query=query)
+            if self.cassette.timed:
+                time.sleep(cost)
+            return vectors
+
+        started = time.perf_counter()
+        if query:
+            vectors = [self.embeddings.embed_query(texts[0])]
+        else:
+            vectors = self.embeddings.embed_documents(texts)
+        self.cassette.record_embeddings(keys, vectors, time.perf_counter() - started, query=query)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, query=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], query=True)[0]
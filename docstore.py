@@ -0,0 +1,123 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Mapping, Tuple, Union
+from langchain_community.docstore.base import Docstore
+from langchain.schema import Document
+
+# Arquivo SQLite com o texto e os metadados dos chunks, ao lado do índice FAISS
+# (nome de manifestos antigos; saves novos usam docstore-<geração>.sqlite, ver rag.py)
+DOCSTORE_FILE = "docstore.sqlite"
+
+class SQLiteDocstore(Docstore):
+    """
+    Docstore somente leitura em SQLite: o texto e os metadados de cada chunk
+    são lidos sob demanda pelo ID, em vez de ficarem todos em memória como no
+    InMemoryDocstore pickled. Vários processos abrem o mesmo arquivo e
+    compartilham o page cache do sistema operacional.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()  # Uma conexão por thread
+
+    def _conn(self) -> sqlite3.Connection:
+        """Conexão somente leitura da thread atual"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Busca um chunk pelo ID (mesmo contrato do InMemoryDocstore)"""
+        row = self._conn().execute(
+            "SELECT content, metadata FROM chunks WHERE id = ?", (search,)
+        ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Não suportado: o docstore em disco é reescrito inteiro pelo save"""
+        raise NotImplementedError("SQLiteDocstore é somente leitura; carregue com writable=True para alterar")
+
+    def delete(self, ids: List) -> None:
+        """Não suportado: o docstore em disco é reescrito inteiro pelo save"""
+        raise NotImplementedError("SQLiteDocstore é somente leitura; carregue com writable=True para alterar")
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def index_map(self) -> "SQLiteIndexMap":
+        """Mapeamento posição FAISS → ID lido sob demanda do mesmo arquivo"""
+        return SQLiteIndexMap(self)
+
+    def load_all(self) -> Tuple[Dict[str, Document], Dict[int, str]]:
+        """Lê tudo para memória (para atualizações incrementais)"""
+        documents = {}
+        index_to_id = {}
+        for pos, chunk_id, content, metadata in self._conn().execute(
+            "SELECT pos, id, content, metadata FROM chunks ORDER BY pos"
+        ):
+            documents[chunk_id] = Document(id=chunk_id, page_content=content, metadata=json.loads(metadata))
+            index_to_id[pos] = chunk_id
+        return documents, index_to_id
+
+class SQLiteIndexMap(Mapping):
+    """index_to_docstore_id do FAISS sem carregar todos os IDs em memória"""
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self.docstore = docstore
+
+    def __getitem__(self, pos: int) -> str:
+        row = self.docstore._conn().execute("SELECT id FROM chunks WHERE pos = ?", (int(pos),)).fetchone()
+        if row is None:
+            raise KeyError(pos)
+        return row[0]
+
+    def __iter__(self) -> Iterator[int]:
+        for (pos,) in self.docstore._conn().execute("SELECT pos FROM chunks ORDER BY pos"):
+            yield pos
+
+    def __len__(self) -> int:
+        return len(self.docstore)
+
+def write_docstore(
+    path: str,
+    index_to_id: Mapping,
+    docstore: Docstore,
+    batch_size: int = 1000
+):
+    """
+    Grava os chunks em um SQLite novo e troca o arquivo de forma atômica:
+    processos que ainda leem o arquivo antigo continuam com a versão deles.
+    """
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute(
+            "CREATE TABLE chunks (pos INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+            "content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        rows = []
+        for pos in sorted(index_to_id):
+            chunk_id = index_to_id[pos]
+            doc = docstore.search(chunk_id)
+            if not isinstance(doc, Document):
+                raise ValueError(f"Chunk {chunk_id} ausente no docstore")
+            rows.append((pos, chunk_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False)))
+            if len(rows) >= batch_size:
+                conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+                rows = []
+        if rows:
+            conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, path)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita os endpoints do Ollama usados pelo agent
+(/api/chat e /api/embed) com latência configurável e respostas roteirizadas.
+Serve para benchmarks e testes offline, sem modelo nem GPU.
+
+Uso: python fake_ollama.py [--port 11435] [--chat-latency 0.2] [--token-latency 0.005]
+"""
+
+import sys
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+# (trecho da última mensagem, resposta): a primeira regra que casa responde.
+# Padrão: pede uma tool na primeira iteração e conclui depois do resultado.
+DEFAULT_RULES = [
+    ("AÇÃO EXECUTADA COM SUCESSO", "Pronto, a ação foi executada com sucesso e o problema foi resolvido."),
+    ("AÇÕES EXECUTADAS COM SUCESSO", "Pronto, as ações foram executadas com sucesso e o problema foi resolvido."),
+    ("[❌", "Não foi possível concluir: a tool retornou erro."),
+    ("", '<tool>{"tool": "system", "action": "get_timestamp"}</tool>'),
+]
+
+class FakeOllama(ThreadingHTTPServer):
+    """
+    Stand-in do Ollama em uma thread própria.
+
+    `chat_latency` é o tempo até o primeiro token, `token_latency` o intervalo
+    entre pedaços de `chunk_chars` caracteres; `embed_latency` é o custo fixo
+    de cada /api/embed e `embed_item_latency` o custo por texto do lote. Os
+    embeddings são determinísticos (derivados do hash do texto).
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rules: Optional[List[Tuple[str, str]]] = None,
+        chat_latency: float = 0.05,
+        token_latency: float = 0.0,
+        chunk_chars: int = 8,
+        embed_latency: float = 0.005,
+        embed_item_latency: float = 0.0005,
+        embed_dim: int = 768
+    ):
+        super().__init__((host, port), FakeOllamaHandler)
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.chat_latency = chat_latency
+        self.token_latency = token_latency
+        self.chunk_chars = chunk_chars
+        self.embed_latency = embed_latency
+        self.embed_item_latency = embed_item_latency
+        self.embed_dim = embed_dim
+        self.counts = {"chat": 0, "embed": 0, "embedded_texts": 0}
+        self._counts_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        """Atende em uma thread daemon"""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Para de atender e fecha o socket"""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FakeOllama":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle_error(self, request, client_address):
+        # Cliente que fechou a conexão (o agent corta o streaming): o reset
+        # chega na escrita ou na leitura da próxima requisição keep-alive
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def count(self, name: str, amount: int = 1):
+        with self._counts_lock:
+            self.counts[name] += amount
+
+    def reply_for(self, messages: List[Dict[str, Any]]) -> str:
+        """Resposta roteirizada para a última mensagem"""
+        last = messages[-1].get("content", "") if messages else ""
+        for needle, response in self.rules:
+            if needle in last:
+                return response
+        return ""
+
+    def embed(self, text: str) -> List[float]:
+        """Vetor unitário determinístico para o texto"""
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.embed_dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """POST /api/chat (stream ou não), POST /api/embed, GET /api/tags"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, como o Ollama
+    # Headers e corpo saem em writes separados: com Nagle + ACK atrasado cada
+    # resposta esperaria ~40 ms a mais
+    disable_nagle_algorithm = True
+    server: FakeOllama
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload: Dict[str, Any]):
+        """Uma linha NDJSON em transfer-encoding chunked"""
+        line = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": []})
+        else:
+            self._send_json(404, {"error": f"rota {self.path} não encontrada"})
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {"error": f"JSON inválido: {e}"})
+            return
+
+        if self.path == "/api/chat":
+            self._chat(payload)
+        elif self.path == "/api/embed":
+            self._embed(payload)
+        else:
+            self._send_json(404, {"error": f"rota {self.path} não encontrada"})
+
+    def _chat(self, payload: Dict[str, Any]):
+        server = self.server
+        server.count("chat")
+        started = time.perf_counter()
+        messages = payload.get("messages") or []
+        content = server.reply_for(messages)
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        base = {"model": payload.get("model", "fake"), "created_at": datetime.now(timezone.utc).isoformat()}
+
+        time.sleep(server.chat_latency)  # Carga do modelo + avaliação do prompt
+        prompt_eval_ns = int((time.perf_counter() - started) * 1e9)
+        pieces = [content[i:i + server.chunk_chars] for i in range(0, len(content), server.chunk_chars)] or [""]
+
+        def final(eval_ns: int) -> Dict[str, Any]:
+            return dict(
+                base,
+                message={"role": "assistant", "content": ""},
+                done=True,
+                done_reason="stop",
+                total_duration=int((time.perf_counter() - started) * 1e9),
+                load_duration=0,
+                prompt_eval_count=prompt_chars // 4,  # ~4 caracteres por token
+                prompt_eval_duration=prompt_eval_ns,
+                eval_count=len(pieces),
+                eval_duration=eval_ns,
+            )
+
+        if not payload.get("stream", True):
+            time.sleep(server.token_latency * len(pieces))
+            response = final(int(server.token_latency * len(pieces) * 1e9))
+            response["message"]["content"] = content
+            self._send_json(200, response)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        eval_started = time.perf_counter()
+        try:
+            for piece in pieces:
+                self._write_chunk(dict(base, message={"role": "assistant", "content": piece}, done=False))
+                if server.token_latency:
+                    time.sleep(server.token_latency)
+            self._write_chunk(final(int((time.perf_counter() - eval_started) * 1e9)))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # O agent fecha o stream ao ver um <tool> completo
+            self.close_connection = True
+
+    def _embed(self, payload: Dict[str, Any]):
+        server = self.server
+        texts = payload.get("input") or []
+        if isinstance(texts, str):
+            texts = [texts]
+        server.count("embed")
+        server.count("embedded_texts", len(texts))
+        time.sleep(server.embed_latency + server.embed_item_latency * len(texts))
+        self._send_json(200, {
+            "model": payload.get("model", "fake"),
+            "embeddings": [server.embed(text) for text in texts],
+        })
+
+def option_value(args: list, name: str, default: str) -> str:
+    """Valor de uma opção --nome VALOR da linha de comando"""
+    if name in args and args.index(name) + 1 < len(args):
+        return args[args.index(name) + 1]
+    return default
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    server = FakeOllama(
+        port=int(option_value(args, "--port", "11435")),
+        chat_latency=float(option_value(args, "--chat-latency", "0.05")),
+        token_latency=float(option_value(args, "--token-latency", "0.0")),
+        embed_latency=float(option_value(args, "--embed-latency", "0.005")),
+    )
+    print(f"🧪 Ollama falso em {server.url} (Ctrl+C para sair)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Encerrando...")
+    finally:
+        server.server_close()
@@ -2,15 +2,27 @@
 """
 CLI simples para o Agent agentic local
 Uso: python main.py "sua pergunta aqui"
+     python main.py --rebuild "sua pergunta aqui"   # força reindexação
+     python main.py --stream "sua pergunta aqui"    # tokens ao vivo, corta a geração após a tool e a conclusão
+     python main.py --tool-cache                     # reaproveita GETs/leituras repetidos na sessão
+     python main.py serve [--host 127.0.0.1] [--port 8000] [--workers 4]   # chat via HTTP local
+     python main.py --batch in.jsonl [--out out.jsonl] [--workers 4] [--verbose]   # lote de queries
+     python main.py --record conversa.jsonl "pergunta"         # grava as chamadas ao LLM/embeddings
+     python main.py --replay conversa.jsonl "pergunta"         # reproduz sem o modelo (--replay-timed: com os tempos gravados)
+     python main.py --profile [--trace spans.jsonl] "pergunta"  # tempo por etapa ao sair (e spans de cada turno em JSONL)
 """
 
 import sys
 import os
+import atexit
 from pathlib import Path
 from agent import Agent
+from cassette import Cassette
+from telemetry import Telemetry
 from rich.console import Console
 from rich.panel import Panel
 from rich.syntax import Syntax
+from rich.table import Table
 
 console = Console()
 
@@ -23,15 +35,65 @@ def print_header():
         border_style="cyan"
     ))
 
-def initialize_agent() -> Agent:
+def initialize_agent(
+    stream: bool = False, tool_cache: bool = False, cassette: Cassette = None, telemetry: Telemetry = None
+) -> Agent:
     """Inicializa o agent"""
     agent = Agent(
         model_name="mistral",
         ollama_base_url="http://localhost:11434",
-        docs_path="./docs"
+        docs_path="./docs",
+        stream=stream,
+        tool_cache=tool_cache,
+        cassette=cassette,
+        telemetry=telemetry
     )
     return agent
 
+def print_profile(telemetry: Telemetry):
+    """Tabela com o tempo gasto em cada etapa dos turnos"""
+    rows = telemetry.summary()
+    if not rows:
+        return
+    table = Table(title="⏱️  Tempo por etapa", title_justify="left")
+    table.add_column("Etapa", overflow="fold")
+    for column in ("Chamadas", "Total (ms)", "Média", "p50", "p95", "Máx"):
+        table.add_column(column, justify="right")
+    for row in rows:
+        table.add_row(
+            row["stage"], str(row["count"]),
+            *(f"{row[key]:.1f}" for key in ("total_ms", "mean_ms", "p50_ms", "p95_ms", "max_ms"))
+        )
+    console.print(table)
+    tokens = telemetry.tokens()
+    console.print(f"[dim]Tokens: {tokens.get('prompt', 0)} de prompt, {tokens.get('completion', 0)} gerados[/dim]")
+
+
+def pop_option(args: list, name: str, default: str) -> str:
+    """Remove `--nome valor` de args e retorna o valor (ou o padrão)"""
+    if name in args:
+        idx = args.index(name)
+        if idx + 1 < len(args):
+            value = args[idx + 1]
+            del args[idx:idx + 2]
+            return value
+        del args[idx]
+    return default
+
+def open_cassette(args: list) -> Cassette:
+    """Cassette de --record/--replay/--replay-timed (ou None)"""
+    for option, mode in (("--record", "record"), ("--replay", "replay"), ("--replay-timed", "replay_timed")):
+        path = pop_option(args, option, None)
+        if path:
+            cassette = Cassette(path, mode=mode)
+
+            def report():
+                cassette.close()
+                console.print(f"[dim]📼 Cassette: {cassette.stats()}[/dim]")
+
+            atexit.register(report)
+            return cassette
+    return None
 
 def main():
     """Função principal"""
@@ -41,19 +103,60 @@ def main():
     if not Path("./docs").exists():
         console.print("[yellow]Criando documentos de exemplo...[/yellow]")
 
+    args = sys.argv[1:]
+    force_rebuild = "--rebuild" in args
+    stream = "--stream" in args
+    tool_cache = "--tool-cache" in args
+    verbose = "--verbose" in args
+    profile = "--profile" in args
+    args = [arg for arg in args if arg not in ("--rebuild", "--stream", "--tool-cache", "--verbose", "--profile")]
+
+    cassette = open_cassette(args)
+    telemetry = Telemetry(jsonl_path=pop_option(args, "--trace", None))
+    atexit.register(telemetry.close)
+    if profile:
+        atexit.register(print_profile, telemetry)
+    batch_path = pop_option(args, "--batch", None)
+    if batch_path:
+        out_path = pop_option(args, "--out", str(Path(batch_path).with_suffix(".out.jsonl")))
+        workers = int(pop_option(args, "--workers", "4"))
+        stream = False
+
+    serve_mode = bool(args) and args[0] == "serve"
+    if serve_mode:
+        args = args[1:]
+        host = pop_option(args, "--host", "127.0.0.1")
+        port = int(pop_option(args, "--port", "8000"))
+        workers = int(pop_option(args, "--workers", "4"))
+        # Com várias sessões ao mesmo tempo os tokens se misturariam no terminal
+        stream = False
+
     # Inicializar agent
     console.print("[cyan]Inicializando agent...[/cyan]")
-    agent = initialize_agent()
+    agent = initialize_agent(stream=stream, tool_cache=tool_cache, cassette=cassette, telemetry=telemetry)
+    atexit.register(agent.close)
 
-    # Preparar documentos
-    if not agent.initialize_docs():
+    # Preparar documentos (reaproveita ./vector_store se o manifesto ainda bate)
+    if not agent.initialize_docs(force_rebuild=force_rebuild):
         console.print("[red]Erro ao carregar documentos[/red]")
         sys.exit(1)
 
+    if batch_path:
+        # Um Agent e um índice para o lote todo; cada query tem a sua sessão
+        from batch import run_batch
+        summary = run_batch(agent, batch_path, out_path, workers=workers, verbose=verbose)
+        sys.exit(1 if summary["errors"] else 0)
+
+    if serve_mode:
+        # Processo quente: um Agent e um índice para todas as sessões
+        from server import serve
+        serve(agent, host=host, port=port, workers=workers)
+        return
+
     # Processar queries
-    if len(sys.argv) > 1:
+    if args:
         # Query passada como argumento
-        query = " ".join(sys.argv[1:])
+        query = " ".join(args)
         response = agent.chat(query)
         console.print(Panel(response, border_style="green", title="Resposta do Agent"))
     else:
@@ -1,122 +1,995 @@
 import os
 import json
-from typing import List, Optional
+import hashlib
+import uuid
+import math
+import time
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 from langchain_community.document_loaders import (
     PyPDFLoader, TextLoader, DirectoryLoader
 )
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
+import faiss
+import numpy as np
 from langchain_ollama import OllamaEmbeddings
 from langchain.schema import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from cache import CachedEmbeddings, TTLCache
+from cassette import Cassette, CassetteEmbeddings
+from docstore import DOCSTORE_FILE, SQLiteDocstore, write_docstore
+
+# Extensões indexadas a partir de docs_path
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".md")
+
+# Manifesto salvo ao lado do índice FAISS para permitir warm-start
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 4  # 4: chunks guardam start_index (posição no documento de origem)
+
+# Vetores gravados com faiss.write_index e lidos via mmap (o docstore fica em DOCSTORE_FILE).
+# Cada save grava index-<geração>.faiss e docstore-<geração>.sqlite e só então troca o
+# manifesto, que aponta a geração: índice, docstore e manifesto mudam juntos. Os nomes
+# fixos abaixo são os de manifestos sem geração (salvos antes disso).
+INDEX_FILE = "index.faiss"
+
+# Tipos de índice FAISS suportados: flat (busca exata) ou ANN
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+# Estimativa de tokens por caracteres (sem tokenizer do modelo): ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+# Sobra mínima do orçamento para valer a pena incluir um trecho truncado
+MIN_TRUNCATED_TOKENS = 64
+
+def _load_file(path: str) -> Tuple[List[Document], Optional[str], Optional[str]]:
+    """Carrega um arquivo (roda nos processos do pool): documentos, sha256 e erro"""
+    try:
+        sha256 = DocumentProcessor._hash_file(Path(path))
+        if path.lower().endswith(".pdf"):
+            docs = PyPDFLoader(path).load()
+        else:
+            docs = TextLoader(path, encoding='utf-8').load()
+        return docs, sha256, None
+    except Exception as e:
+        return [], None, str(e)
+
+def _bounded_map(executor: Executor, fn, items: Iterable, window: int) -> Iterator[Tuple[Any, Any]]:
+    """
+    Aplica fn aos itens no executor com no máximo `window` tarefas em voo,
+    devolvendo (item, resultado) na ordem de entrada. O próximo item só é
+    consumido quando há vaga, então o produtor nunca corre à frente (backpressure).
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) >= window:
+            done_item, future = pending.popleft()
+            yield done_item, future.result()
+        pending.append((item, executor.submit(fn, item)))
+
+    while pending:
+        done_item, future = pending.popleft()
+        yield done_item, future.result()
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    """Agrupa um iterável em listas de até `size` itens"""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
 class DocumentProcessor:
     """Processa e indexa documentos para RAG"""
 
-    def __init__(self, docs_path: str = "./docs", model_name: str = "nomic-embed-text"):
+    def __init__(
+        self,
+        docs_path: str = "./docs",
+        model_name: str = "nomic-embed-text",
+        ollama_base_url: Optional[str] = None,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        embedding_cache_path: Optional[str] = "./.cache/embeddings.sqlite",
+        embedding_cache_size: int = 100_000,
+        load_workers: Optional[int] = None,
+        embed_batch_size: int = 64,
+        embed_concurrency: int = 4,
+        embed_retries: int = 3,
+        index_type: Optional[str] = None,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        hnsw_m: int = 32,
+        ef_search: int = 64,
+        pq_m: Optional[int] = None,
+        query_cache_size: int = 256,
+        query_cache_ttl: Optional[float] = 300.0,
+        context_tokens: Optional[int] = 1500,
+        mmr_lambda: Optional[float] = None,
+        mmr_fetch_k: int = 20,
+        cassette: Optional[Cassette] = None
+    ):
         self.docs_path = docs_path
         self.model_name = model_name
-        self.embeddings = OllamaEmbeddings(model=model_name)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.load_workers = load_workers  # Processos para carregar arquivos (None = todos os cores)
+        self.embed_batch_size = embed_batch_size  # Chunks por requisição de embedding
+        self.embed_concurrency = embed_concurrency  # Requisições simultâneas ao Ollama
+        self.embed_retries = embed_retries  # Novas tentativas por lote com falha
+
+        # Montagem do contexto: orçamento em tokens (None = sem limite) e MMR
+        # opcional (None = desligado; 1.0 = só relevância, 0.0 = só diversidade)
+        self.context_tokens = context_tokens
+        self.mmr_lambda = mmr_lambda
+        self.mmr_fetch_k = mmr_fetch_k  # Candidatos avaliados pelo MMR
+
+        # Índice ANN: None = usa o tipo salvo no manifesto (ou flat num build novo)
+        if index_type is not None and index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type inválido: {index_type} (use um de {', '.join(INDEX_TYPES)})")
+        self.index_type = index_type
+        self.nlist = nlist  # Listas do IVF (None = ~4·√n)
+        self.nprobe = nprobe  # Listas visitadas por busca no IVF
+        self.hnsw_m = hnsw_m  # Vizinhos por nó no HNSW
+        self.ef_search = ef_search  # Tamanho da fila de busca no HNSW
+        self.pq_m = pq_m  # Subquantizadores do PQ (None = maior divisor de d até 64)
+        self.index_params = {"type": "flat"}  # Parâmetros efetivos do índice construído
+        self.read_only = False  # Índice mmap + docstore SQLite carregados sob demanda
+
+        # Cache de retrieval: embeddings de queries e top-k por (query, k, versão do índice)
+        self.index_version = 0  # Incrementado a cada build/load/update do índice
+        self.query_embedding_cache = TTLCache(max_entries=query_cache_size, ttl=query_cache_ttl)
+        self.search_cache = TTLCache(max_entries=query_cache_size, ttl=query_cache_ttl)
+        # None: OLLAMA_HOST ou http://localhost:11434 (padrão do cliente ollama)
+        self.embeddings = OllamaEmbeddings(model=model_name, base_url=ollama_base_url)
+        if embedding_cache_path:
+            # Cache em disco: rebuilds e queries repetidas não voltam ao Ollama
+            self.embeddings = CachedEmbeddings(
+                self.embeddings, model_name, path=embedding_cache_path, max_entries=embedding_cache_size
+            )
+        if cassette is not None:
+            # Grava/reproduz os embeddings (por fora do cache: o replay não depende dele)
+            self.embeddings = CassetteEmbeddings(self.embeddings, model_name, cassette)
         self.vector_store = None
         self.documents = []
+        self.file_fingerprints = {}  # Fingerprints dos arquivos lidos no último load
+        self._files_read = 0  # Progresso do load atual (para o ETA do pipeline streaming)
+        # Build preguiçoso da primeira busca: uma vez só, mesmo com várias threads
+        self._build_lock = threading.Lock()
+        self._building = False
 
-    def load_documents(self) -> List[Document]:
-        """Carrega documentos da pasta"""
-        os.makedirs(self.docs_path, exist_ok=True)
+    def _bump_index_version(self):
+        """Marca o índice como novo: resultados de busca em cache deixam de valer"""
+        self.index_version += 1
+        self.search_cache.clear()
 
-        if not os.path.exists(self.docs_path) or not os.listdir(self.docs_path):
-            print(f"⚠️  Nenhum documento encontrado em {self.docs_path}")
+    def retrieval_cache_stats(self) -> Dict[str, Any]:
+        """Hit rate dos caches de retrieval"""
+        return {
+            "index_version": self.index_version,
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "search_results": self.search_cache.stats(),
+        }
+
+    def _scan_doc_files(self) -> List[Path]:
+        """Lista os arquivos suportados em docs_path (ordem determinística)"""
+        if not os.path.isdir(self.docs_path):
             return []
 
-        documents = []
+        return sorted(
+            path for path in Path(self.docs_path).rglob("*")
+            if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS
+        )
+
+    def _fingerprint_files(self, paths: Optional[List[Path]] = None) -> Dict[str, Dict[str, int]]:
+        """Retorna tamanho e mtime de cada arquivo, chaveado pelo caminho relativo"""
+        fingerprints = {}
+        for path in paths if paths is not None else self._scan_doc_files():
+            stat = path.stat()
+            relpath = path.relative_to(self.docs_path).as_posix()
+            fingerprints[relpath] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        return fingerprints
+
+    def build_manifest(self) -> Dict[str, Any]:
+        """Monta o manifesto que descreve o índice atual"""
+        return {
+            "version": MANIFEST_VERSION,
+            "embedding_model": self.model_name,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "index": self.index_params,
+            "files": self.file_fingerprints,
+        }
+
+    def load_manifest(self, path: str = "./vector_store") -> Optional[Dict[str, Any]]:
+        """Lê o manifesto salvo junto ao índice"""
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _manifest_mismatch(self, manifest: Dict[str, Any]) -> Optional[str]:
+        """Compara a configuração do manifesto com a atual; retorna o motivo da diferença"""
+        saved_index = manifest.get("index", {})
+        # Tipo configurado no build (difere do efetivo quando o ivfpq caiu para IVF-Flat)
+        saved_index_type = saved_index.get("requested", saved_index.get("type", "flat"))
+        if self.index_type is None:
+            # Sem tipo explícito, adota o índice que já está salvo
+            self.index_type = saved_index_type
+
+        expected = {
+            "version": MANIFEST_VERSION,
+            "embedding_model": self.model_name,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+        }
+        for key, value in expected.items():
+            if manifest.get(key) != value:
+                return f"{key} mudou ({manifest.get(key)} → {value})"
+
+        if saved_index_type != self.index_type:
+            return f"tipo de índice mudou ({saved_index_type} → {self.index_type})"
+
+        return None
+
+    def is_vector_store_current(self, path: str = "./vector_store") -> bool:
+        """Verifica se o índice salvo corresponde aos documentos e à configuração atuais"""
+        manifest = self.load_manifest(path)
+        if manifest is None:
+            print(f"ℹ️  Nenhum manifesto válido em {path}")
+            return False
+
+        mismatch = self._manifest_mismatch(manifest)
+        if mismatch:
+            print(f"ℹ️  Manifesto desatualizado: {mismatch}")
+            return False
+
+        saved_files = {
+            relpath: {"size": entry.get("size"), "mtime_ns": entry.get("mtime_ns")}
+            for relpath, entry in manifest.get("files", {}).items()
+        }
+        if saved_files != self._fingerprint_files():
+            print("ℹ️  Manifesto desatualizado: documentos alterados em " + self.docs_path)
+            return False
+
+        return True
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        """SHA-256 do conteúdo do arquivo"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _relpath(self, source: str) -> str:
+        """Caminho relativo a docs_path usado como chave no manifesto"""
+        try:
+            return Path(source).relative_to(self.docs_path).as_posix()
+        except ValueError:
+            return Path(source).as_posix()
+
+    @staticmethod
+    def _chunk_ids(relpath: str, chunks: List[Document]) -> List[str]:
+        """IDs estáveis por conteúdo: o mesmo texto no mesmo arquivo mantém o mesmo ID"""
+        ids = []
+        occurrences = {}
+        for chunk in chunks:
+            digest = hashlib.sha256(f"{relpath}\0{chunk.page_content}".encode("utf-8")).hexdigest()
+            # Chunks repetidos dentro do arquivo recebem o número da ocorrência
+            count = occurrences.get(digest, 0)
+            occurrences[digest] = count + 1
+            ids.append(f"{digest}-{count}")
+        return ids
+
+    def _assign_chunk_ids(self, chunks: List[Document]) -> List[str]:
+        """Calcula IDs dos chunks e registra a lista de IDs de cada arquivo"""
+        by_file = {}
+        for chunk in chunks:
+            by_file.setdefault(self._relpath(chunk.metadata.get("source", "")), []).append(chunk)
+
+        ids_by_chunk = {}
+        for relpath, file_chunks in by_file.items():
+            file_ids = self._chunk_ids(relpath, file_chunks)
+            for chunk, chunk_id in zip(file_chunks, file_ids):
+                ids_by_chunk[id(chunk)] = chunk_id
+            if relpath in self.file_fingerprints:
+                self.file_fingerprints[relpath]["chunks"] = file_ids
+
+        for entry in self.file_fingerprints.values():
+            entry.setdefault("chunks", [])
 
-        # Carregar PDFs
-        pdf_files = list(Path(self.docs_path).glob("**/*.pdf"))
-        for pdf_file in pdf_files:
+        return [ids_by_chunk[id(chunk)] for chunk in chunks]
+
+    def _make_splitter(self) -> RecursiveCharacterTextSplitter:
+        """Splitter configurado com os parâmetros atuais de chunk"""
+        return RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            separators=["\n\n", "\n", " ", ""],
+            add_start_index=True  # Permite juntar chunks vizinhos recuperados juntos
+        )
+
+    def _load_files(self, paths: List[Path]) -> Iterator[Tuple[Path, List[Document], Optional[str], Optional[str]]]:
+        """Carrega arquivos em um pool de processos, mantendo a ordem de entrada"""
+        workers = min(self.load_workers or os.cpu_count() or 1, len(paths))
+
+        if workers <= 1:
+            for path in paths:
+                yield (path, *_load_file(str(path)))
+            return
+
+        # PDFs são CPU-bound: cada arquivo vai para um processo. A janela limitada
+        # deixa o pool adiantar só alguns arquivos enquanto o embedding consome
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for path, result in _bounded_map(executor, _load_file, map(str, paths), workers * 2):
+                yield (Path(path), *result)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embeda um lote, com novas tentativas e backoff exponencial"""
+        for attempt in range(self.embed_retries + 1):
             try:
-                loader = PyPDFLoader(str(pdf_file))
-                docs = loader.load()
-                documents.extend(docs)
-                print(f"✓ PDF carregado: {pdf_file.name}")
+                return self.embeddings.embed_documents(texts)
             except Exception as e:
-                print(f"✗ Erro ao carregar {pdf_file.name}: {e}")
+                if attempt == self.embed_retries:
+                    raise
+                delay = 0.5 * 2 ** attempt
+                print(f"⚠️  Lote de {len(texts)} chunks falhou ({e}), nova tentativa em {delay:.1f}s")
+                time.sleep(delay)
 
-        # Carregar TXT e MD
-        for ext in ["*.txt", "*.md"]:
-            text_files = list(Path(self.docs_path).glob(f"**/{ext}"))
-            for text_file in text_files:
-                try:
-                    loader = TextLoader(str(text_file), encoding='utf-8')
-                    docs = loader.load()
-                    documents.extend(docs)
-                    print(f"✓ Arquivo carregado: {text_file.name}")
-                except Exception as e:
-                    print(f"✗ Erro ao carregar {text_file.name}: {e}")
+    def _embed_batches(
+        self, batches: Iterable[List[Tuple[str, Document]]]
+    ) -> Iterator[Tuple[List[Tuple[str, Document]], List[List[float]]]]:
+        """
+        Embeda lotes em paralelo com no máximo embed_concurrency requisições em
+        voo. Só consome o próximo lote quando há vaga (backpressure) e devolve
+        os resultados na ordem de entrada.
+        """
+        def embed(batch):
+            return self._embed_batch([chunk.page_content for _, chunk in batch])
+
+        with ThreadPoolExecutor(max_workers=self.embed_concurrency) as executor:
+            yield from _bounded_map(executor, embed, batches, self.embed_concurrency)
+
+    def _index_chunks(self, pairs: Iterable[Tuple[str, Document]], total: Optional[int] = None):
+        """Embeda pares (id, chunk) em lotes e adiciona ao vector store, reportando progresso"""
+        done = 0
+        started = time.perf_counter()
+        last_report = started
+
+        for batch, vectors in self._embed_batches(_batched(pairs, self.embed_batch_size)):
+            text_embeddings = [(chunk.page_content, vector) for (_, chunk), vector in zip(batch, vectors)]
+            metadatas = [chunk.metadata for _, chunk in batch]
+            batch_ids = [chunk_id for chunk_id, _ in batch]
+
+            if self.vector_store is None:
+                self.vector_store = FAISS.from_embeddings(
+                    text_embeddings, self.embeddings, metadatas=metadatas, ids=batch_ids
+                )
+            else:
+                self.vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=batch_ids)
+
+            done += len(batch)
+            now = time.perf_counter()
+            if now - last_report >= 2 or done == total:
+                last_report = now
+                rate = done / max(now - started, 1e-9)
+                if total:
+                    eta = (total - done) / rate if rate else 0
+                else:
+                    # Streaming: total de chunks desconhecido, estima pelos arquivos já lidos
+                    files_done, files_total = self._files_read, len(self.file_fingerprints)
+                    eta = (now - started) * (files_total - files_done) / files_done if files_done else 0
+                progress = f"{done}/{total}" if total else f"{done}"
+                print(f"   ⏳ {progress} chunks embedados ({rate:.1f} chunks/s, ETA {eta:.0f}s)")
+
+        return done
+
+    def _build_ann_index(self, vectors: np.ndarray) -> Tuple[Any, Dict[str, Any]]:
+        """Treina e preenche o índice ANN configurado a partir dos vetores do índice flat"""
+        n, d = vectors.shape
+        index_type = self.index_type or "flat"
+
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(d, self.hnsw_m)
+            index.add(vectors)
+            return index, {"type": "hnsw", "hnsw_m": self.hnsw_m}
+
+        # IVF: ~4·√n listas, com pelo menos 39 pontos de treino por lista
+        nlist = self.nlist or max(1, min(int(4 * math.sqrt(n)), n // 39))
+        quantizer = faiss.IndexFlatL2(d)
+
+        # PQ de 8 bits treina 256 centróides por subquantizador: o FAISS pede ~39 pontos por centróide
+        if index_type == "ivfpq" and n >= 39 * 256:
+            pq_m = self.pq_m or max(m for m in range(1, min(d, 64) + 1) if d % m == 0)
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m, 8)
+            params = {"type": "ivfpq", "nlist": nlist, "pq_m": pq_m}
+        else:
+            index = faiss.IndexIVFFlat(quantizer, d, nlist)
+            params = {"type": "ivf", "nlist": nlist}
+            if index_type == "ivfpq":
+                print(f"⚠️  Poucos vetores ({n}) para treinar PQ, usando IVF-Flat")
+                # O manifesto guarda o pedido: o fallback não conta como mudança de tipo
+                params["requested"] = "ivfpq"
+
+        index.train(vectors)
+        index.add(vectors)
+        return index, params
+
+    def _apply_index_type(self):
+        """Converte o índice flat recém-construído para o tipo ANN configurado"""
+        self.index_params = {"type": "flat"}
+        if not self.vector_store or (self.index_type or "flat") == "flat":
+            return
+
+        flat = self.vector_store.index
+        vectors = flat.reconstruct_n(0, flat.ntotal)
+        started = time.perf_counter()
+        index, self.index_params = self._build_ann_index(vectors)
+        self.vector_store.index = index
+        self._apply_search_params()
+        print(f"✓ Índice {self.index_params['type']} treinado em {time.perf_counter() - started:.1f}s {self.index_params}")
+
+    def _apply_search_params(self):
+        """Aplica nprobe/efSearch ao índice carregado (e prepara o IVF para o MMR)"""
+        if not self.vector_store:
+            return
+
+        index = self.vector_store.index
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = self.ef_search
+        elif isinstance(index, faiss.IndexIVF):
+            index.nprobe = self.nprobe
+            if self.mmr_lambda is not None and index.direct_map.type == faiss.DirectMap.NoMap:
+                # reconstruct() no IVF precisa do mapa id → lista: montado uma vez
+                # aqui, não durante as buscas concorrentes
+                index.make_direct_map()
+
+    def evaluate_index(
+        self, k: int = 10, num_queries: int = 200, sweep: Optional[List[int]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Relatório recall × latência do índice atual contra busca exata (flat).
+        O ground truth usa os embeddings originais dos chunks (vindos do cache),
+        e as queries são chunks amostrados com um pouco de ruído. Para IVF/HNSW
+        varre nprobe/efSearch em `sweep`.
+        """
+        if not self.vector_store:
+            return []
+
+        store = self.vector_store
+        ids = [store.index_to_docstore_id[i] for i in range(store.index.ntotal)]
+        texts = [store.docstore.search(chunk_id).page_content for chunk_id in ids]
+        vectors = np.array(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+        queries = vectors[sample] + rng.normal(0, vectors.std() * 0.1, size=(len(sample), vectors.shape[1])).astype(np.float32)
+        k = min(k, len(vectors))
+
+        def timed_search(index) -> Tuple[np.ndarray, float]:
+            started = time.perf_counter()
+            _, found = index.search(queries, k)
+            return found, (time.perf_counter() - started) * 1000 / len(queries)
+
+        exact = faiss.IndexFlatL2(vectors.shape[1])
+        exact.add(vectors)
+        truth, flat_ms = timed_search(exact)
+        report = [{"index": "flat", "param": None, "recall": 1.0, "ms_per_query": flat_ms}]
+
+        index = store.index
+        if isinstance(index, faiss.IndexHNSW):
+            param_name, values = "efSearch", sweep or [16, 32, 64, 128, 256]
+        elif isinstance(index, faiss.IndexIVF):
+            param_name, values = "nprobe", sweep or [1, 2, 4, 8, 16, 32, 64]
+        else:
+            return report
+
+        for value in values:
+            if param_name == "efSearch":
+                index.hnsw.efSearch = value
+            else:
+                index.nprobe = min(value, index.nlist)
+            found, ms = timed_search(index)
+            hits = sum(len(set(row_found) & set(row_truth)) for row_found, row_truth in zip(found, truth))
+            report.append({
+                "index": self.index_params.get("type", type(index).__name__),
+                "param": f"{param_name}={value}",
+                "recall": hits / truth.size,
+                "ms_per_query": ms,
+            })
+
+        self._apply_search_params()
+        return report
+
+    def update_vector_store(self, path: str = "./vector_store") -> Optional[Dict[str, int]]:
+        """
+        Atualiza o índice salvo de forma incremental: só embeda chunks novos ou
+        alterados e remove do FAISS/docstore os chunks de arquivos editados ou
+        apagados. Retorna None quando é preciso reconstruir tudo.
+        """
+        manifest = self.load_manifest(path)
+        if manifest is None:
+            print(f"ℹ️  Nenhum manifesto válido em {path}, reconstrução completa necessária")
+            return None
+
+        mismatch = self._manifest_mismatch(manifest)
+        if mismatch:
+            print(f"ℹ️  {mismatch}, reconstrução completa necessária")
+            return None
 
+        old_files = manifest.get("files", {})
+        splitter = self._make_splitter()
+        stats = {"files_changed": 0, "files_removed": 0, "chunks_added": 0, "chunks_removed": 0, "chunks_kept": 0}
+        files = {}
+        ids_to_delete = []
+        new_chunks = []
+        new_ids = []
+
+        changed = []
+        for relpath, fingerprint in self._fingerprint_files().items():
+            old = old_files.get(relpath)
+            if old and old.get("size") == fingerprint["size"] and old.get("mtime_ns") == fingerprint["mtime_ns"]:
+                files[relpath] = old
+                stats["chunks_kept"] += len(old.get("chunks", []))
+                continue
+
+            file_path = Path(self.docs_path) / relpath
+            try:
+                sha256 = self._hash_file(file_path)
+            except OSError as e:
+                print(f"✗ Erro ao carregar {file_path.name}: {e}")
+                if old:
+                    files[relpath] = old
+                continue
+
+            if old and old.get("sha256") == sha256:
+                # Só o mtime mudou (touch, checkout): nada a reembedar
+                files[relpath] = {**fingerprint, "sha256": sha256, "chunks": old.get("chunks", [])}
+                stats["chunks_kept"] += len(files[relpath]["chunks"])
+                continue
+
+            changed.append((relpath, file_path, fingerprint))
+
+        loaded = self._load_files([file_path for _, file_path, _ in changed])
+        for (relpath, file_path, fingerprint), (_, docs, sha256, error) in zip(changed, loaded):
+            old = old_files.get(relpath)
+            if error:
+                print(f"✗ Erro ao carregar {file_path.name}: {error}")
+                if old:
+                    files[relpath] = old  # Mantém os vetores antigos; tenta de novo na próxima execução
+                continue
+
+            chunks = splitter.split_documents(docs)
+            chunk_ids = self._chunk_ids(relpath, chunks)
+            old_ids = set(old.get("chunks", [])) if old else set()
+            current_ids = set(chunk_ids)
+
+            ids_to_delete.extend(chunk_id for chunk_id in old_ids if chunk_id not in current_ids)
+            for chunk, chunk_id in zip(chunks, chunk_ids):
+                if chunk_id not in old_ids:
+                    new_chunks.append(chunk)
+                    new_ids.append(chunk_id)
+
+            stats["chunks_kept"] += len(old_ids & current_ids)
+            stats["files_changed"] += 1
+            files[relpath] = {**fingerprint, "sha256": sha256, "chunks": chunk_ids}
+            print(f"✓ Arquivo alterado: {relpath}")
+
+        for relpath in old_files.keys() - files.keys():
+            ids_to_delete.extend(old_files[relpath].get("chunks", []))
+            stats["files_removed"] += 1
+            print(f"✓ Arquivo removido: {relpath}")
+
+        if not stats["files_changed"] and not stats["files_removed"]:
+            # Nada a reindexar: o índice salvo vale como está (mmap, sem nova geração)
+            if not self.load_vector_store(path):
+                return None
+            if files != old_files:
+                # Só mtimes mudaram: o manifesto registra os novos, mesmos arquivos
+                self._write_manifest(path, dict(manifest, files=files))
+            self.file_fingerprints = files
+            print("✓ Nenhum arquivo alterado, índice mantido")
+            return stats
+
+        if not self.load_vector_store(path, writable=True):
+            return None
+
+        if ids_to_delete and self.index_params["type"] != "flat":
+            # IVF/HNSW não removem vetores mantendo as posições do docstore; com o
+            # cache de embeddings a reconstrução não volta ao Ollama
+            print(f"ℹ️  Índice {self.index_params['type']} não suporta remoção, reconstrução completa necessária")
+            return None
+
+        if ids_to_delete:
+            self.vector_store.delete(ids_to_delete)
+        if new_chunks:
+            self._index_chunks(zip(new_ids, new_chunks), total=len(new_chunks))
+
+        stats["chunks_removed"] = len(ids_to_delete)
+        stats["chunks_added"] = len(new_chunks)
+        self.file_fingerprints = files
+        self._bump_index_version()
+        self.save_vector_store(path)
+        return stats
+
+    def iter_documents(self) -> Iterator[Tuple[str, List[Document]]]:
+        """Carrega os documentos arquivo a arquivo, sem acumular o corpus em memória"""
+        os.makedirs(self.docs_path, exist_ok=True)
+
+        # Uma única varredura; fingerprints tirados antes da leitura para que
+        # uma edição durante o build invalide o manifesto
+        paths = self._scan_doc_files()
+        self.file_fingerprints = self._fingerprint_files(paths)
+        self._files_read = 0
+
+        if not paths:
+            print(f"⚠️  Nenhum documento encontrado em {self.docs_path}")
+            return
+
+        for path, docs, sha256, error in self._load_files(paths):
+            self._files_read += 1
+            relpath = self._relpath(str(path))
+            if error:
+                print(f"✗ Erro ao carregar {path.name}: {error}")
+                # Fora do manifesto: o arquivo é tentado de novo na próxima execução
+                self.file_fingerprints.pop(relpath, None)
+                continue
+
+            self.file_fingerprints[relpath]["sha256"] = sha256
+            kind = "PDF" if path.suffix.lower() == ".pdf" else "Arquivo"
+            print(f"✓ {kind} carregado: {path.name}")
+            yield relpath, docs
+
+    def iter_chunks(self) -> Iterator[Tuple[str, Document]]:
+        """Divide os documentos em chunks à medida que são carregados, gerando pares (id, chunk)"""
+        splitter = self._make_splitter()
+        for relpath, docs in self.iter_documents():
+            chunks = splitter.split_documents(docs)
+            chunk_ids = self._chunk_ids(relpath, chunks)
+            self.file_fingerprints[relpath]["chunks"] = chunk_ids
+            yield from zip(chunk_ids, chunks)
+
+    def load_documents(self) -> List[Document]:
+        """Carrega documentos da pasta"""
+        documents = [doc for _, docs in self.iter_documents() for doc in docs]
         self.documents = documents
         return documents
 
-    def chunk_documents(self, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Document]:
+    def build_vector_store(self) -> Optional[FAISS]:
+        """
+        Pipeline streaming carregar → dividir → embedar → indexar. Os arquivos
+        passam pelo splitter e pelo embedder em lotes limitados, então a memória
+        de trabalho não cresce com o corpus e o embedding sobrepõe o parsing.
+        """
+        self.vector_store = None
+        self.read_only = False
+        self.documents = []
+        total = self._index_chunks(self.iter_chunks())
+
+        if not self.vector_store:
+            print("⚠️  Nenhum chunk disponível para indexação")
+            return None
+
+        self._apply_index_type()
+        self._bump_index_version()
+
+        print(f"✓ Vector store criado com {total} documentos")
+        return self.vector_store
+
+    def chunk_documents(self, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None) -> List[Document]:
         """Divide documentos em chunks"""
         if not self.documents:
             self.load_documents()
 
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        # Parâmetros explícitos passam a valer para o manifesto do índice
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+        if chunk_overlap is not None:
+            self.chunk_overlap = chunk_overlap
 
-        chunks = splitter.split_documents(self.documents)
+        chunks = self._make_splitter().split_documents(self.documents)
         print(f"✓ {len(chunks)} chunks criados")
         return chunks
 
     def create_vector_store(self, chunks: Optional[List[Document]] = None) -> FAISS:
-        """Cria índice FAISS"""
+        """Cria índice FAISS (sem chunks, usa o pipeline streaming)"""
         if chunks is None:
-            chunks = self.chunk_documents()
+            return self.build_vector_store()
 
         if not chunks:
             print("⚠️  Nenhum chunk disponível para indexação")
             return None
 
-        self.vector_store = FAISS.from_documents(chunks, self.embeddings)
+        ids = self._assign_chunk_ids(chunks)
+        self.vector_store = None
+        self.read_only = False
+        self._index_chunks(zip(ids, chunks), total=len(chunks))
+        self._apply_index_type()
+        self._bump_index_version()
         print(f"✓ Vector store criado com {len(chunks)} documentos")
         return self.vector_store
 
+    @staticmethod
+    def _store_files(manifest: Dict[str, Any]) -> Tuple[str, str]:
+        """Arquivos do índice e do docstore da geração apontada pelo manifesto"""
+        generation = manifest.get("generation")
+        if not generation:
+            return INDEX_FILE, DOCSTORE_FILE
+        return f"index-{generation}.faiss", f"docstore-{generation}.sqlite"
+
     def save_vector_store(self, path: str = "./vector_store"):
-        """Salva índice FAISS em disco"""
-        if self.vector_store:
-            self.vector_store.save_local(path)
-            print(f"✓ Vector store salvo em {path}")
-        else:
+        """
+        Salva índice FAISS, docstore e manifesto em disco como um conjunto: os
+        arquivos da nova geração são gravados ao lado dos atuais e a troca do
+        manifesto (um os.replace) publica todos de uma vez. Um crash no meio
+        deixa o manifesto antigo apontando para os arquivos antigos, intactos.
+        """
+        if not self.vector_store:
             print("⚠️  Nenhum vector store para salvar")
+            return
+
+        if self.read_only:
+            print("⚠️  Vector store carregado somente leitura (mmap); nada a salvar")
+            return
+
+        os.makedirs(path, exist_ok=True)
+
+        manifest = self.build_manifest()
+        manifest["generation"] = uuid.uuid4().hex[:16]
+        index_file, docstore_file = self._store_files(manifest)
+
+        index_path = os.path.join(path, index_file)
+        docstore_path = os.path.join(path, docstore_file)
+        faiss.write_index(self.vector_store.index, index_path)
+        write_docstore(docstore_path, self.vector_store.index_to_docstore_id, self.vector_store.docstore)
+        # No disco antes do manifesto que os publica
+        for written in (index_path, docstore_path):
+            fd = os.open(written, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        self._write_manifest(path, manifest)
 
-    def load_vector_store(self, path: str = "./vector_store") -> Optional[FAISS]:
-        """Carrega índice FAISS do disco"""
+        # Gerações anteriores (e sobras de saves interrompidos). Processos com o
+        # arquivo antigo mapeado continuam lendo a versão deles até fechá-lo.
+        current = {index_file, docstore_file}
+        for entry in os.listdir(path):
+            stale = entry in (INDEX_FILE, DOCSTORE_FILE) or (
+                entry.startswith(("index-", "docstore-")) and entry.endswith((".faiss", ".sqlite", ".tmp"))
+            )
+            if stale and entry not in current:
+                os.remove(os.path.join(path, entry))
+
+        print(f"✓ Vector store salvo em {path}")
+
+    @staticmethod
+    def _write_manifest(path: str, manifest: Dict[str, Any]):
+        """Troca o manifesto de forma atômica (tmp + fsync + os.replace)"""
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def load_vector_store(self, path: str = "./vector_store", writable: bool = False) -> Optional[FAISS]:
+        """
+        Carrega índice FAISS do disco. Por padrão os vetores são mapeados em
+        memória somente leitura e os chunks lidos do SQLite sob demanda, então
+        o tempo de startup e a RSS não crescem com o corpus. Com writable=True
+        carrega tudo em memória para atualizações incrementais.
+        """
         try:
-            self.vector_store = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+            manifest = self.load_manifest(path) or {}
+            index_params = manifest.get("index", {"type": "flat"})
+            index_file, docstore_file = self._store_files(manifest)
+            index_path = os.path.join(path, index_file)
+            docstore_path = os.path.join(path, docstore_file)
+            for required in (index_path, docstore_path):
+                if not os.path.exists(required):
+                    raise FileNotFoundError(required)
+
+            docstore = SQLiteDocstore(docstore_path)
+            if writable:
+                index = faiss.read_index(index_path)
+                documents, index_to_docstore_id = docstore.load_all()
+                docstore = InMemoryDocstore(documents)
+            else:
+                # IVF mapeia as listas invertidas; flat/HNSW mapeiam o array de códigos
+                mmap_flag = faiss.IO_FLAG_MMAP if index_params["type"] in ("ivf", "ivfpq") else faiss.IO_FLAG_MMAP_IFC
+                index = faiss.read_index(index_path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+                index_to_docstore_id = docstore.index_map()
+
+            self.vector_store = FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+            self.read_only = not writable
+            self.index_params = index_params
+            self._apply_search_params()
+            self._bump_index_version()
             print(f"✓ Vector store carregado de {path}")
             return self.vector_store
         except Exception as e:
             print(f"✗ Erro ao carregar vector store: {e}")
             return None
 
-    def search(self, query: str, k: int = 3) -> List[Document]:
-        """Busca documentos relevantes"""
-        if not self.vector_store:
-            self.create_vector_store()
+    def ensure_vector_store(self) -> bool:
+        """
+        Cria o índice se ainda não existe. As outras threads esperam o build em
+        andamento em vez de começar outro (o vector store fica visível desde o
+        primeiro lote, então só ele não basta para saber que está pronto).
+        """
+        if self.vector_store is not None and not self._building:
+            return True
+        with self._build_lock:
+            if self.vector_store is None:
+                self._building = True
+                try:
+                    self.create_vector_store()
+                finally:
+                    self._building = False
+        return self.vector_store is not None
 
-        if not self.vector_store:
+    def search(self, query: str, k: int = 3) -> List[Document]:
+        """Busca documentos relevantes (com cache por query, k e versão do índice)"""
+        if not self.ensure_vector_store():
             return []
 
-        results = self.vector_store.similarity_search(query, k=k)
-        return results
+        key = (query, k, self.mmr_lambda, self.index_version)
+        results = self.search_cache.get(key)
+        if results is not None:
+            return list(results)
+
+        vector = self.query_embedding_cache.get(query)
+        if vector is None:
+            vector = self.embeddings.embed_query(query)
+            self.query_embedding_cache.put(query, vector)
+
+        if self.mmr_lambda is None:
+            results = self.vector_store.similarity_search_by_vector(vector, k=k)
+        else:
+            results = self._mmr_search(vector, k)
+            if results is None:
+                # Fallback só desta chamada: não fica no cache sob a chave do MMR
+                return self.vector_store.similarity_search_by_vector(vector, k=k)
+        self.search_cache.put(key, results)
+        return list(results)
+
+    def _mmr_search(self, vector: List[float], k: int) -> Optional[List[Document]]:
+        """
+        Maximal Marginal Relevance: dos `mmr_fetch_k` vizinhos mais próximos,
+        escolhe um a um o que maximiza λ·sim(query) − (1−λ)·max sim(escolhidos),
+        evitando gastar o contexto com chunks quase iguais. Os vetores dos
+        candidatos vêm do próprio índice (aproximados no IVF-PQ); retorna None
+        se o índice não permite reconstruí-los. Não altera o índice nem a
+        configuração: é chamado por várias threads ao mesmo tempo.
+        """
+        index = self.vector_store.index
+        query = np.asarray([vector], dtype=np.float32)
+        _, positions = index.search(query, max(k, self.mmr_fetch_k))
+        positions = [int(pos) for pos in positions[0] if pos != -1]
+        if len(positions) <= k:
+            return self._docs_at(positions)
+
+        try:
+            candidates = np.vstack([index.reconstruct(pos) for pos in positions])
+        except RuntimeError as e:
+            print(f"⚠️  MMR indisponível nesta busca ({e}); usando a busca simples")
+            return None
+
+        candidates /= np.linalg.norm(candidates, axis=1, keepdims=True) + 1e-12
+        relevance = candidates @ (query[0] / (np.linalg.norm(query[0]) + 1e-12))
+        similarity = candidates @ candidates.T
+
+        selected = [int(np.argmax(relevance))]
+        redundancy = similarity[selected[0]].copy()
+        while len(selected) < k:
+            scores = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+            scores[selected] = -np.inf
+            best = int(np.argmax(scores))
+            selected.append(best)
+            redundancy = np.maximum(redundancy, similarity[best])
+
+        return self._docs_at([positions[i] for i in selected])
+
+    def _docs_at(self, positions: List[int]) -> List[Document]:
+        """Chunks nas posições do índice FAISS, na ordem dada"""
+        docstore = self.vector_store.docstore
+        mapping = self.vector_store.index_to_docstore_id
+        return [doc for doc in (docstore.search(mapping[pos]) for pos in positions) if isinstance(doc, Document)]
 
     def build_context(self, query: str, k: int = 3) -> str:
         """Constrói contexto a partir dos documentos"""
-        results = self.search(query, k=k)
+        return self.format_context(self.search(query, k=k))
+
+    @staticmethod
+    def _merge_overlapping(results: List[Document]) -> List[Document]:
+        """
+        Junta chunks do mesmo arquivo que se sobrepõem ou se encostam (pelo
+        start_index) em um único trecho, e descarta os repetidos ou contidos em
+        outro. O trecho resultante fica na posição do chunk mais relevante.
+        """
+        by_source: Dict[str, List[Tuple[int, Document]]] = {}
+        unplaced = []  # Chunks sem start_index (índices antigos): só deduplicação
+        for rank, doc in enumerate(results):
+            if doc.metadata.get("start_index") is None:
+                unplaced.append((rank, doc))
+            else:
+                key = f"{doc.metadata.get('source')}\0{doc.metadata.get('page', '')}"
+                by_source.setdefault(key, []).append((rank, doc))
+
+        spans = []  # (melhor rank, início, texto, metadados)
+        for chunks in by_source.values():
+            chunks.sort(key=lambda item: item[1].metadata["start_index"])
+            current = None
+            for rank, doc in chunks:
+                start = doc.metadata["start_index"]
+                text = doc.page_content
+                if current is not None and start <= current[1] + len(current[2]):
+                    end = current[1] + len(current[2])
+                    current[2] += text[end - start:]  # Vazio se o chunk já estava contido
+                    current[0] = min(current[0], rank)
+                    continue
+                if current is not None:
+                    spans.append(current)
+                current = [rank, start, text, doc.metadata]
+            spans.append(current)
+
+        merged = [(rank, Document(page_content=text, metadata=metadata)) for rank, _, text, metadata in spans]
+        for rank, doc in unplaced:
+            if not any(doc.page_content in other.page_content for _, other in merged):
+                merged.append((rank, doc))
+        return [doc for _, doc in sorted(merged, key=lambda item: item[0])]
+
+    @staticmethod
+    def _truncate_to_tokens(text: str, tokens: int) -> str:
+        """Corta o texto no orçamento, preferindo o fim de um parágrafo, frase ou palavra"""
+        if len(text) <= tokens * CHARS_PER_TOKEN:
+            return text
+        limit = tokens * CHARS_PER_TOKEN - len(" …")  # O marcador também entra no orçamento
+        cut = text[:limit]
+        for separator in ("\n\n", ". ", "\n", " "):
+            position = cut.rfind(separator)
+            if position >= limit // 2:
+                return cut[:position + len(separator.rstrip())].rstrip() + " …"
+        return cut + " …"
+
+    def assemble_context(self, results: List[Document], max_tokens: Optional[int] = None) -> List[Document]:
+        """
+        Trechos que cabem no orçamento de tokens (padrão: context_tokens), em
+        ordem de relevância: chunks sobrepostos são unidos, os que cabem
+        inteiros entram primeiro e, se sobrar espaço, o mais relevante dos que
+        ficaram de fora entra truncado.
+        """
+        merged = self._merge_overlapping(results)
+        budget = self.context_tokens if max_tokens is None else max_tokens
+        if budget is None:
+            return merged
+
+        packed = {}  # posição no ranking → trecho
+        left_out = []
+        remaining = budget
+        for rank, doc in enumerate(merged):
+            tokens = -(-len(doc.page_content) // CHARS_PER_TOKEN)
+            if tokens <= remaining:
+                packed[rank] = doc
+                remaining -= tokens
+            else:
+                left_out.append(rank)
+
+        if left_out and remaining >= MIN_TRUNCATED_TOKENS:
+            doc = merged[left_out[0]]
+            text = self._truncate_to_tokens(doc.page_content, remaining)
+            packed[left_out[0]] = Document(page_content=text, metadata=doc.metadata)
+        return [packed[rank] for rank in sorted(packed)]
 
+    def format_context(self, results: List[Document], max_tokens: Optional[int] = None) -> str:
+        """Formata documentos recuperados como contexto para o prompt (dentro do orçamento de tokens)"""
+        results = self.assemble_context(results, max_tokens)
         if not results:
             return "Nenhum documento relevante encontrado."
 
@@ -0,0 +1,229 @@
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, Optional
+from agent import Agent, AgentSession
+from cache import TTLCache
+from telemetry import LatencyStats
+from tools import APITool
+
+class AgentServer(HTTPServer):
+    """
+    Servidor HTTP local com um único Agent (LLM + índice FAISS somente
+    leitura) compartilhado por todas as sessões.
+
+    As requisições rodam em um pool fixo de `workers` threads; até
+    `max_pending` esperam na fila e as demais recebem 503 na hora, em vez de
+    abrir uma thread por conexão e disputar o Ollama sem limite.
+    """
+
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        address,
+        agent: Agent,
+        workers: int = 4,
+        max_pending: int = 32,
+        session_ttl: float = 3600.0,
+        max_sessions: int = 1000
+    ):
+        # Índice pronto antes de escutar: a primeira leva de requisições não
+        # dispara builds concorrentes no DocumentProcessor compartilhado
+        agent.doc_processor.ensure_vector_store()
+        super().__init__(address, AgentRequestHandler)
+        self.agent = agent
+        self.workers = workers
+        self.sessions = TTLCache(max_entries=max_sessions, ttl=session_ttl)
+        self.latency = LatencyStats()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="serve")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        """Entrega a conexão ao pool ou recusa com 503 se a fila estiver cheia"""
+        if not self._slots.acquire(blocking=False):
+            self.latency.record_rejected()
+            try:
+                request.sendall(_busy_response())
+            finally:
+                self.shutdown_request(request)
+            return
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        """Atende a conexão em uma thread do pool"""
+        with self._in_flight_lock:
+            self._in_flight += 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._in_flight_lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
+    def get_session(self, session_id: Optional[str]) -> AgentSession:
+        """Sessão existente (se não expirou) ou uma nova"""
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            session = AgentSession(session_id)
+        # Regrava para renovar o TTL a cada uso
+        self.sessions.put(session.session_id, session)
+        return session
+
+    def metrics(self) -> Dict[str, Any]:
+        """Latência, ocupação do pool, sessões e caches de retrieval"""
+        return {
+            "latency": self.latency.stats(),
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "sessions": self.sessions.stats()["entries"],
+            "retrieval": self.agent.doc_processor.retrieval_cache_stats(),
+            "http_pool": APITool.pool_stats(),
+        }
+
+    def prometheus_metrics(self) -> str:
+        """Métricas do servidor e do agent (etapas, tokens, caches) no formato do Prometheus"""
+        metrics = self.agent.telemetry.metrics
+        metrics.describe("agent_server_latency_seconds", "gauge", "Latência das requisições /chat (janela recente)")
+        latency = self.latency.stats()
+        for field in ("requests", "errors", "rejected"):
+            metrics.set(f"agent_server_{field}", latency[field])
+        for quantile, field in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+            if latency[field] is not None:
+                metrics.set("agent_server_latency_seconds", latency[field] / 1000, quantile=quantile)
+        metrics.set("agent_server_in_flight", self._in_flight)
+        metrics.set("agent_server_sessions", self.sessions.stats()["entries"])
+        return self.agent.prometheus_metrics()
+
+def _busy_response() -> bytes:
+    """Resposta 503 crua (enviada sem passar pelo handler)"""
+    body = json.dumps({"error": "Servidor ocupado, tente novamente"}, ensure_ascii=False).encode("utf-8")
+    head = (
+        "HTTP/1.1 503 Service Unavailable\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Retry-After: 1\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    return head.encode("ascii") + body
+
+class AgentRequestHandler(BaseHTTPRequestHandler):
+    """
+    Endpoints:
+      POST   /chat             {"message": "...", "session_id": "..."(opcional)}
+      DELETE /sessions/<id>    encerra uma sessão
+      GET    /metrics          latência p50/p95/p99, pool e caches
+      GET    /metrics/prometheus  o mesmo + tempo por etapa e tokens, em texto do Prometheus
+      GET    /health
+    """
+
+    # HTTP/1.0: a conexão fecha após a resposta e não prende um worker ocioso
+    server: AgentServer
+
+    def log_message(self, format, *args):
+        pass  # As métricas substituem o log por requisição
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status: int, text: str, content_type: str = "text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw or b"{}")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self._send_json(200, self.server.metrics())
+        elif self.path == "/metrics/prometheus":
+            self._send_text(200, self.server.prometheus_metrics(), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send_json(404, {"error": f"Rota {self.path} não encontrada"})
+
+    def do_DELETE(self):
+        prefix = "/sessions/"
+        if not self.path.startswith(prefix):
+            self._send_json(404, {"error": f"Rota {self.path} não encontrada"})
+            return
+        session_id = self.path[len(prefix):]
+        existed = self.server.sessions.delete(session_id)
+        self._send_json(200 if existed else 404, {"session_id": session_id, "deleted": existed})
+
+    def do_POST(self):
+        if self.path != "/chat":
+            self._send_json(404, {"error": f"Rota {self.path} não encontrada"})
+            return
+
+        started = time.perf_counter()
+        try:
+            payload = self._read_json()
+        except (ValueError, UnicodeDecodeError) as e:
+            self._send_json(400, {"error": f"JSON inválido: {e}"})
+            return
+
+        message = payload.get("message") if isinstance(payload, dict) else None
+        if not isinstance(message, str) or not message.strip():
+            self._send_json(400, {"error": "Campo 'message' é obrigatório"})
+            return
+
+        session = self.server.get_session(payload.get("session_id"))
+        try:
+            # Um turno por vez na mesma sessão; sessões diferentes rodam em paralelo
+            with session.lock:
+                response = self.server.agent.chat(message, session=session)
+                tools = list(session.execution_history)
+                llm_timings = list(session.llm_timings)
+                trace = session.trace.to_dict()
+        except Exception as e:
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.server.latency.record(latency_ms, error=True)
+            self._send_json(500, {"session_id": session.session_id, "error": str(e)})
+            return
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.server.latency.record(latency_ms)
+        self._send_json(200, {
+            "session_id": session.session_id,
+            "response": response,
+            "latency_ms": round(latency_ms, 1),
+            "tools": tools,
+            "llm_timings": llm_timings,
+            "trace": trace,
+        })
+
+def serve(agent: Agent, host: str = "127.0.0.1", port: int = 8000, workers: int = 4, max_pending: int = 32):
+    """Sobe o servidor e atende até Ctrl+C"""
+    server = AgentServer((host, port), agent, workers=workers, max_pending=max_pending)
+    print(f"🌐 Servindo em http://{host}:{port} ({workers} workers, fila de {max_pending})")
+    print("   POST /chat | DELETE /sessions/<id> | GET /metrics[/prometheus] | GET /health")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Encerrando servidor...")
+    finally:
+        server.server_close()
@@ -0,0 +1,280 @@
+import json
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Limites dos buckets (segundos) dos histogramas de duração
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Span:
+    """Trecho cronometrado de um turno, com atributos e filhos (árvore por turno)"""
+
+    __slots__ = ("name", "start", "end", "attributes", "children")
+
+    def __init__(self, name: str, start: Optional[float] = None, **attributes):
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.children: List["Span"] = []
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def child(self, name: str, start: Optional[float] = None, end: Optional[float] = None, **attributes) -> "Span":
+        """Novo filho; com `end`, registra um trecho já medido (ex.: tool em outra thread)"""
+        span = Span(name, start, **attributes)
+        span.end = end
+        self.children.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator["Span"]:
+        """Filho cronometrado pelo bloco with"""
+        span = self.child(name, **attributes)
+        try:
+            yield span
+        finally:
+            span.finish()
+
+    def finish(self, **attributes):
+        if self.end is None:
+            self.end = time.perf_counter()
+        self.attributes.update(attributes)
+
+    def walk(self) -> Iterator["Span"]:
+        """Este span e todos os descendentes"""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        """Árvore em JSON, com início relativo ao span raiz"""
+        origin = self.start if origin is None else origin
+        data = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration_ms, 3),
+        }
+        if self.attributes:
+            data["attributes"] = self.attributes
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+class LatencyStats:
+    """Contadores e percentis de latência das últimas requisições"""
+
+    def __init__(self, window: int = 1000):
+        self.samples = deque(maxlen=window)  # ms das últimas `window` requisições
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms: float, error: bool = False):
+        """Registra uma requisição atendida"""
+        with self._lock:
+            self.samples.append(latency_ms)
+            self.requests += 1
+            self.errors += error
+
+    def record_rejected(self):
+        """Registra uma requisição recusada por falta de worker"""
+        with self._lock:
+            self.rejected += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Totais e p50/p95/p99/max da janela"""
+        with self._lock:
+            samples = sorted(self.samples)
+            stats = {"requests": self.requests, "errors": self.errors, "rejected": self.rejected}
+
+        def percentile(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 1)
+
+        stats.update({
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(samples[-1], 1) if samples else None,
+        })
+        return stats
+
+class Metrics:
+    """Contadores, gauges e histogramas com labels, exportáveis no formato texto do Prometheus"""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Tuple], float] = defaultdict(float)
+        self._gauges: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], List[float]] = {}  # buckets..., soma, contagem
+        self._help: Dict[str, Tuple[str, str]] = {}  # nome → (tipo, descrição)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Tuple:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        with self._lock:
+            self._counters[(name, self._labels(labels))] += value
+
+    def set(self, name: str, value: float, **labels):
+        """Gauge: valor atual (ex.: hits acumulados de um cache, lidos na hora da exportação)"""
+        with self._lock:
+            self._gauges[(name, self._labels(labels))] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, self._labels(labels))
+        with self._lock:
+            values = self._histograms.setdefault(key, [0.0] * (len(DURATION_BUCKETS) + 2))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    values[i] += 1
+            values[-2] += seconds
+            values[-1] += 1
+
+    @staticmethod
+    def _format_labels(labels: Tuple, extra: Tuple = ()) -> str:
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+        return "{" + ",".join(escaped) + "}"
+
+    def render_prometheus(self) -> str:
+        """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+
+        lines = []
+        described = set()
+
+        def header(name: str, default_kind: str):
+            if name not in described:
+                described.add(name)
+                kind, help_text = self._help.get(name, (default_kind, name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{self._format_labels(labels)} {value:g}")
+
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{name}{self._format_labels(labels)} {value:g}")
+
+        for (name, labels), values in sorted(histograms.items()):
+            header(name, "histogram")
+            for bound, count in zip(DURATION_BUCKETS, values):
+                lines.append(f"{name}_bucket{self._format_labels(labels, (('le', f'{bound:g}'),))} {count:g}")
+            lines.append(f"{name}_bucket{self._format_labels(labels, (('le', '+Inf'),))} {values[-1]:g}")
+            lines.append(f"{name}_sum{self._format_labels(labels)} {values[-2]:.6f}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {values[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+class Telemetry:
+    """
+    Destino dos spans de cada turno do Agent: atualiza as métricas (duração
+    por etapa, tokens, status do cache de tools), guarda uma janela de
+    amostras para o resumo do --profile e, com `jsonl_path`, grava a árvore
+    de spans de cada turno em JSON lines.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None, window: int = 10_000):
+        self.jsonl_path = jsonl_path
+        self.metrics = Metrics()
+        self.metrics.describe("agent_turns_total", "counter", "Turnos de chat concluídos")
+        self.metrics.describe("agent_stage_duration_seconds", "histogram", "Duração de cada etapa do turno")
+        self.metrics.describe("agent_llm_tokens_total", "counter", "Tokens reportados pelo Ollama (prompt/completion)")
+        self.metrics.describe("agent_tool_calls_total", "counter", "Chamadas de tool por resultado e status do cache")
+        self.metrics.describe("agent_tool_duration_seconds", "histogram", "Duração de cada chamada de tool")
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))  # etapa → ms
+        self._tokens = defaultdict(int)
+        self._lock = threading.Lock()
+        self._file = open(jsonl_path, "a", encoding="utf-8") if jsonl_path else None
+
+    def record_turn(self, turn: Span, session_id: str):
+        """Consolida um turno encerrado"""
+        turn.finish()
+        metrics = self.metrics
+        metrics.inc("agent_turns_total")
+
+        with self._lock:
+            for span in turn.walk():
+                metrics.observe("agent_stage_duration_seconds", span.duration_ms / 1000, stage=span.name)
+                self._samples[span.name].append(span.duration_ms)
+
+                attrs = span.attributes
+                for kind in ("prompt", "completion"):
+                    tokens = attrs.get(f"{kind}_tokens")
+                    if tokens:
+                        metrics.inc("agent_llm_tokens_total", tokens, kind=kind)
+                        self._tokens[kind] += tokens
+                if span.name == "tool":
+                    # Só o label limitado (tool.action conhecida ou "unknown") vira série
+                    tool = attrs.get("tool", "unknown")
+                    metrics.observe("agent_tool_duration_seconds", span.duration_ms / 1000, tool=tool)
+                    self._samples[f"tool:{tool}"].append(span.duration_ms)
+                    metrics.inc(
+                        "agent_tool_calls_total",
+                        tool=tool,
+                        success=str(attrs.get("success")).lower(),
+                        cache=attrs.get("cache") or "none",
+                    )
+
+        if self._file is not None:
+            record = {
+                "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+                "session_id": session_id,
+                **turn.to_dict(),
+            }
+            line = json.dumps(record, ensure_ascii=False, default=str)
+            with self._lock:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Por etapa: chamadas, total, média, p50, p95 e máximo (ms)"""
+        rows = []
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+        for name, values in samples.items():
+            count = len(values)
+
+            def percentile(p: float) -> float:
+                return values[min(count - 1, int(p * count))]
+
+            rows.append({
+                "stage": name,
+                "count": count,
+                "total_ms": sum(values),
+                "mean_ms": sum(values) / count,
+                "p50_ms": percentile(0.50),
+                "p95_ms": percentile(0.95),
+                "max_ms": values[-1],
+            })
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def tokens(self) -> Dict[str, int]:
+        """Tokens de prompt e completion somados"""
+        with self._lock:
+            return dict(self._tokens)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
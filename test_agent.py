@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Testes do loop do Agent contra o Ollama falso (fake_ollama.py), com
+respostas roteirizadas.
+
+Uso: python -m pytest -q test_agent.py
+"""
+
+import json
+import time
+import socket
+import struct
+import asyncio
+import pytest
+from fake_ollama import FakeOllama
+from rag import DocumentProcessor
+from agent import Agent, AgentSession
+from telemetry import Span, Telemetry
+
+TOOL_CALL = '<tool>{"tool": "system", "action": "get_timestamp"}</tool>'
+
+@pytest.fixture(scope="module")
+def ollama():
+    with FakeOllama(chat_latency=0, embed_latency=0, embed_item_latency=0, chunk_chars=4) as server:
+        yield server
+
+@pytest.fixture(scope="module")
+def processor(ollama, tmp_path_factory):
+    docs = tmp_path_factory.mktemp("docs")
+    (docs / "api.md").write_text("A API de saldo retorna o status da transação.", encoding="utf-8")
+    processor = DocumentProcessor(
+        docs_path=str(docs), ollama_base_url=ollama.url, embedding_cache_path=None, load_workers=1
+    )
+    processor.build_vector_store()
+    return processor
+
+def iterations(agent: Agent, query: str, use_async: bool = False) -> int:
+    session = AgentSession()
+    if use_async:
+        asyncio.run(agent.achat(query, session=session))
+    else:
+        agent.chat(query, session=session)
+    return len(session.llm_timings)
+
+@pytest.mark.parametrize("explanation, expected", [
+    # Conclusão depois da tool: para logo após executá-la
+    ("\nIsso deixa o horário atualizado, pronto.", 1),
+    # Sem conclusão: mais uma iteração com o resultado da tool
+    ("\nVou consultar o horário do servidor.", 2),
+])
+def test_stream_stops_like_non_stream(ollama, processor, explanation, expected):
+    ollama.rules = [
+        ("AÇÃO EXECUTADA COM SUCESSO", "O horário foi consultado."),
+        ("", TOOL_CALL + explanation),
+    ]
+    counts = {}
+    for stream in (False, True):
+        agent = Agent(ollama_base_url=ollama.url, doc_processor=processor, stream=stream)
+        counts[stream] = (iterations(agent, "Que horas são?"), iterations(agent, "Que horas são?", use_async=True))
+
+    assert counts[False] == counts[True] == (expected, expected)
+
+def test_helper_methods_are_not_tool_actions(ollama, processor):
+    ollama.rules = [
+        ("ERRO NA EXECUÇÃO", "A action não existe, encerrando."),
+        ("", '<tool>{"tool": "api", "action": "pool_stats"}</tool>'),
+    ]
+    agent = Agent(ollama_base_url=ollama.url, doc_processor=processor)
+    session = AgentSession()
+    agent.chat("Mostre o pool", session=session)
+
+    entry = session.execution_history[0]
+    assert not entry["success"] and "pool_stats" in entry["error"]
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_write_is_a_barrier_between_parallel_reads(ollama, processor, tmp_path, use_async):
+    first, second = tmp_path / "a.txt", tmp_path / "b.txt"
+    first.write_text("a", encoding="utf-8")
+    second.write_text("antigo", encoding="utf-8")
+    read = lambda path: {"tool": "file", "action": "read_file", "filepath": str(path)}
+    calls = [
+        read(first), read(second),
+        {"tool": "file", "action": "write_file", "filepath": str(second), "content": "novo"},
+        read(second), {"tool": "system", "action": "get_timestamp"}, read(first),
+    ]
+    agent = Agent(ollama_base_url=ollama.url, doc_processor=processor, tool_workers=4)
+    try:
+        if use_async:
+            outcomes = asyncio.run(agent._aexecute_tool_calls(calls))
+        else:
+            outcomes = agent._execute_tool_calls(calls)
+    finally:
+        agent.close()
+
+    assert [outcome["tool_call"] for outcome in outcomes] == calls
+    assert [outcome["parallel"] for outcome in outcomes] == [True, True, False, True, True, True]
+    data = [outcome["result"].data for outcome in outcomes]
+    assert (data[0], data[1], data[3], data[5]) == ("a", "antigo", "novo", "a")
+
+    end = lambda outcome: outcome["started"] + outcome["duration_ms"] / 1000
+    write = outcomes[2]
+    assert all(end(outcome) <= write["started"] for outcome in outcomes[:2])
+    assert all(outcome["started"] >= end(write) for outcome in outcomes[3:])
+
+def test_close_shuts_down_tool_pool(ollama, processor):
+    agent = Agent(ollama_base_url=ollama.url, doc_processor=processor)
+    agent._execute_tool_calls([{"tool": "system", "action": "get_timestamp"}] * 2)
+    threads = list(agent._tool_executor._threads)
+    assert threads
+    agent.close()
+    assert not any(thread.is_alive() for thread in threads)
+
+def test_hallucinated_tool_names_do_not_create_series():
+    telemetry = Telemetry()
+    for i in range(50):
+        turn = Span("turn")
+        tools = turn.child("tools")
+        for call in ({"tool": "system", "action": "get_timestamp"}, {"tool": f"inventada_{i}", "action": "x"},
+                     {"tool": "system", "action": f"acao_{i}"}, {"tool": "system", "action": "_private"}):
+            tools.child("tool", end=tools.start, tool=Agent._tool_label(call), success=True)
+        telemetry.record_turn(turn, "sessao")
+
+    stages = {row["stage"] for row in telemetry.summary()}
+    assert stages == {"turn", "tools", "tool", "tool:system.get_timestamp", "tool:unknown"}
+    text = telemetry.metrics.render_prometheus()
+    assert 'tool="unknown"' in text and "inventada" not in text and "acao_" not in text
+
+def test_fake_ollama_ignores_client_reset(capsys):
+    body = json.dumps({"model": "m", "messages": [{"role": "user", "content": "oi"}], "stream": True}).encode()
+    request = b"POST /api/chat HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n" % len(body) + body
+    with FakeOllama(chat_latency=0, chunk_chars=4, rules=[("", "x" * 20000)]) as server:
+        client = socket.create_connection(server.server_address[:2])
+        client.sendall(request)
+        client.recv(100)
+        time.sleep(0.2)  # Resposta toda escrita: o servidor espera a próxima requisição
+        # Fecha com dados não lidos e SO_LINGER 0: o servidor recebe um reset, como no corte do stream
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        client.close()
+        time.sleep(0.3)
+
+    assert "Traceback" not in capsys.readouterr().err
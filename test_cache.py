@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Testes do CachedEmbeddings (cache SQLite de embeddings com despejo LRU)
+
+Uso: python -m pytest -q test_cache.py
+"""
+
+from typing import List
+from langchain_core.embeddings import Embeddings
+from cache import CachedEmbeddings
+
+class CountingEmbeddings(Embeddings):
+    """Vetor derivado do texto; registra o que chegou a ser embedado"""
+
+    def __init__(self):
+        self.calls: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.extend(texts)
+        return [[float(len(text)), float(sum(map(ord, text)))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def test_hits_misses_and_reads_without_writes(tmp_path):
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner, "modelo", path=str(tmp_path / "emb.sqlite"))
+
+    vectors = cache.embed_documents(["saldo", "ledger", "saldo"])
+    assert inner.calls == ["saldo", "ledger"]
+    assert vectors[0] == vectors[2]
+
+    writes = cache._conn.total_changes
+    assert cache.embed_query("saldo") == vectors[0]
+    assert cache.embed_documents(["ledger"]) == [vectors[1]]
+    assert inner.calls == ["saldo", "ledger"]
+    assert cache._conn.total_changes == writes  # Hit não vira escrita no SQLite
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 3, 2)
+
+def test_evicts_least_recently_used(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    inner = CountingEmbeddings()
+    cache = CachedEmbeddings(inner, "modelo", path=path, max_entries=2)
+    cache.embed_query("a")
+    cache.embed_query("b")
+    cache.embed_query("a")  # "a" passa a ser o mais recente
+    cache.embed_query("c")  # Despeja "b"
+    assert cache.stats()["entries"] == 2
+
+    inner.calls.clear()
+    cache.embed_query("a")
+    cache.embed_query("c")
+    assert inner.calls == []
+    cache.embed_query("b")
+    assert inner.calls == ["b"]
+    cache.close()
+
+    reopened = CachedEmbeddings(inner, "modelo", path=path, max_entries=2)
+    assert reopened.stats()["entries"] == 2
+    inner.calls.clear()
+    reopened.embed_documents(["b", "c"])  # "a" foi o despejado ao regravar "b"
+    assert inner.calls == []
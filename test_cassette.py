@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Testes de gravação e replay (cassette.py): grava uma conversa contra o
+Ollama falso e a reproduz sem Ollama disponível.
+
+Uso: python -m pytest -q test_cassette.py
+"""
+
+import pytest
+from fake_ollama import FakeOllama
+from rag import DocumentProcessor
+from agent import Agent, AgentSession
+from cassette import Cassette, CassetteMiss
+
+UNAVAILABLE_URL = "http://127.0.0.1:9"  # Porta discard: conexão recusada
+
+# Tool determinística: o prompt da segunda iteração é igual no replay
+RULES = [
+    ("AÇÃO EXECUTADA COM SUCESSO", "Pronto, o JSON foi validado e o problema foi resolvido."),
+    ("", '<tool>{"tool": "json", "action": "validate_json", "content": "{\\"saldo\\": 1}"}</tool>'),
+]
+
+def run_turn(docs, cassette: Cassette, url: str, stream: bool) -> AgentSession:
+    processor = DocumentProcessor(
+        docs_path=str(docs), ollama_base_url=url, embedding_cache_path=None, load_workers=1, cassette=cassette
+    )
+    processor.build_vector_store()
+    agent = Agent(ollama_base_url=url, doc_processor=processor, cassette=cassette, stream=stream)
+    session = AgentSession()
+    agent.chat("Corrija o saldo da conta", session=session)
+    return session
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_replay_without_ollama(tmp_path, stream):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "api.md").write_text("A API de saldo retorna o status da transação.", encoding="utf-8")
+    path = str(tmp_path / "conversa.jsonl")
+
+    with FakeOllama(chat_latency=0, embed_latency=0, embed_item_latency=0, rules=RULES) as ollama:
+        recorder = Cassette(path, mode="record")
+        recorded = run_turn(docs, recorder, ollama.url, stream)
+        recorder.close()
+        calls = dict(ollama.counts)
+
+        for mode in ("replay", "replay_timed"):
+            player = Cassette(path, mode=mode)
+            replayed = run_turn(docs, player, UNAVAILABLE_URL, stream)
+
+            assert len(replayed.llm_timings) == len(recorded.llm_timings) == 2
+            assert [entry["success"] for entry in replayed.execution_history] == [True]
+            assert dict(ollama.counts) == calls  # Nenhuma chamada ao modelo
+            stats = recorder.stats()
+            replay_stats = player.stats()
+            assert replay_stats["chat.replayed"] == stats["chat.recorded"] == 2
+            assert replay_stats["embed.replayed"] == stats["embed.recorded"] == 2
+            assert replay_stats["value.replayed"] == stats["value.recorded"] == 1
+            assert replay_stats.get("chat.mismatch", 0) == 0 and replay_stats["chat.unused"] == 0
+
+            # Gravação esgotada: uma requisição a mais não cai no Ollama
+            with pytest.raises(CassetteMiss):
+                player.next_chat("outra")
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Testes do DocumentProcessor contra o Ollama falso (fake_ollama.py):
+sem modelo, embeddings determinísticos.
+
+Uso: python -m pytest -q test_rag.py
+"""
+
+import os
+import random
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from fake_ollama import FakeOllama
+from langchain_core.documents import Document
+from rag import CHARS_PER_TOKEN, DocumentProcessor
+
+@pytest.fixture(scope="module")
+def ollama():
+    with FakeOllama(embed_latency=0, embed_item_latency=0) as server:
+        yield server
+
+def make_processor(ollama, docs_path, **kwargs) -> DocumentProcessor:
+    return DocumentProcessor(
+        docs_path=str(docs_path), ollama_base_url=ollama.url, embedding_cache_path=None, load_workers=1, **kwargs
+    )
+
+def test_rebuild_invalidates_search_cache(ollama, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "api.md").write_text("Versão antiga da documentação da API.", encoding="utf-8")
+    processor = make_processor(ollama, docs)
+    processor.build_vector_store()
+    assert "antiga" in processor.search("documentação", k=1)[0].page_content
+
+    (docs / "api.md").write_text("Versão nova da documentação da API.", encoding="utf-8")
+    version = processor.index_version
+    processor.build_vector_store()
+
+    assert processor.index_version > version
+    assert "nova" in processor.search("documentação", k=1)[0].page_content
+
+def test_ivfpq_fallback_keeps_saved_index_current(ollama, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for i in range(3):
+        (docs / f"doc_{i}.md").write_text(f"Documento {i} sobre saldo e transações.", encoding="utf-8")
+    store = str(tmp_path / "vector_store")
+
+    processor = make_processor(ollama, docs, index_type="ivfpq")
+    processor.build_vector_store()
+    processor.save_vector_store(store)
+    # Poucos vetores para treinar PQ: o índice efetivo é IVF-Flat
+    assert processor.index_params["type"] == "ivf"
+
+    reopened = make_processor(ollama, docs, index_type="ivfpq")
+    assert reopened.is_vector_store_current(store)
+    assert make_processor(ollama, docs).is_vector_store_current(store)
+    assert not make_processor(ollama, docs, index_type="hnsw").is_vector_store_current(store)
+
+def test_concurrent_first_searches_build_once(ollama, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for i in range(20):
+        (docs / f"doc_{i}.md").write_text(f"Documento {i}: status da transação {i}. " * 40, encoding="utf-8")
+    processor = make_processor(ollama, docs, embed_batch_size=4)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda i: processor.search(f"transação {i}", k=2), range(16)))
+
+    assert all(len(docs_found) == 2 for docs_found in results)
+    chunks = sum(len(entry["chunks"]) for entry in processor.file_fingerprints.values())
+    assert processor.vector_store.index.ntotal == chunks
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw"])
+def test_mmr_search_leaves_shared_state_alone(ollama, tmp_path, index_type):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for i in range(40):
+        (docs / f"doc_{i}.md").write_text(f"Documento {i} sobre saldo, ledger e bloqueios.", encoding="utf-8")
+    store = str(tmp_path / "vector_store")
+    builder = make_processor(ollama, docs, index_type=index_type, nlist=2)
+    builder.build_vector_store()
+    builder.save_vector_store(store)
+
+    processor = make_processor(ollama, docs, mmr_lambda=0.5, mmr_fetch_k=10)
+    processor.load_vector_store(store)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda i: processor.search(f"saldo {i}", k=3), range(12)))
+
+    assert all(len(found) == 3 for found in results)
+    assert processor.mmr_lambda == 0.5
+
+def test_save_publishes_index_docstore_and_manifest_together(ollama, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "api.md").write_text("Primeira versão.", encoding="utf-8")
+    store = tmp_path / "vector_store"
+    processor = make_processor(ollama, docs)
+    processor.build_vector_store()
+    processor.save_vector_store(str(store))
+    first = sorted(os.listdir(store))
+
+    # Save interrompido antes de trocar o manifesto: arquivos da nova geração sem manifesto
+    (docs / "api.md").write_text("Segunda versão, com mais texto.", encoding="utf-8")
+    processor.build_vector_store()
+    (store / "index-interrompido.faiss").write_bytes(b"lixo")
+    (store / "docstore-interrompido.sqlite").write_bytes(b"lixo")
+
+    reader = make_processor(ollama, docs)
+    assert reader.load_vector_store(str(store)) is not None
+    assert "Primeira" in reader.search("versão", k=1)[0].page_content
+
+    processor.save_vector_store(str(store))
+    files = sorted(os.listdir(store))
+    assert len(files) == len(first) and not set(files) & (set(first) - {"manifest.json"})
+    reader = make_processor(ollama, docs)
+    reader.load_vector_store(str(store))
+    assert "Segunda" in reader.search("versão", k=1)[0].page_content
+
+def test_update_reindexes_only_changed_files(ollama, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    paragraphs = [f"Parágrafo {i} sobre o saldo da conta e o ledger de bloqueios." for i in range(4)]
+    (docs / "keep.md").write_text("Arquivo que não muda, sobre limites.", encoding="utf-8")
+    (docs / "edit.md").write_text("\n\n".join(paragraphs), encoding="utf-8")
+    (docs / "gone.md").write_text("Arquivo que vai ser apagado, sobre tarifas.", encoding="utf-8")
+    store = tmp_path / "vector_store"
+    options = {"chunk_size": 80, "chunk_overlap": 0}
+    builder = make_processor(ollama, docs, **options)
+    builder.build_vector_store()
+    builder.save_vector_store(str(store))
+    before = {path: set(entry["chunks"]) for path, entry in builder.load_manifest(str(store))["files"].items()}
+
+    (docs / "edit.md").write_text("\n\n".join(paragraphs[:3] + ["Parágrafo novo sobre estornos."]), encoding="utf-8")
+    (docs / "gone.md").unlink()
+    processor = make_processor(ollama, docs, **options)
+    stats = processor.update_vector_store(str(store))
+
+    after = {path: set(entry["chunks"]) for path, entry in processor.load_manifest(str(store))["files"].items()}
+    assert after.keys() == {"keep.md", "edit.md"} and after["keep.md"] == before["keep.md"]
+    assert stats["files_changed"] == 1 and stats["files_removed"] == 1
+    assert stats["chunks_added"] == len(after["edit.md"] - before["edit.md"]) == 1
+    assert stats["chunks_removed"] == len(before["edit.md"] - after["edit.md"]) + len(before["gone.md"]) == 2
+    assert stats["chunks_kept"] == len(before["keep.md"]) + len(before["edit.md"] & after["edit.md"]) == 4
+    assert processor.vector_store.index.ntotal == sum(len(ids) for ids in after.values())
+    assert processor.search("Parágrafo novo sobre estornos.", k=1)[0].page_content == "Parágrafo novo sobre estornos."
+
+def test_update_without_changes_keeps_generation(ollama, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "api.md").write_text("Documentação da API de saldo.", encoding="utf-8")
+    store = tmp_path / "vector_store"
+    builder = make_processor(ollama, docs)
+    builder.build_vector_store()
+    builder.save_vector_store(str(store))
+    manifest = builder.load_manifest(str(store))
+    files = sorted(os.listdir(store))
+
+    # Só o mtime muda (touch): nada a reindexar nem republicar
+    os.utime(docs / "api.md", ns=(0, 10**18))
+    processor = make_processor(ollama, docs)
+    stats = processor.update_vector_store(str(store))
+
+    assert stats == {"files_changed": 0, "files_removed": 0, "chunks_added": 0, "chunks_removed": 0, "chunks_kept": 1}
+    assert sorted(os.listdir(store)) == files
+    saved = processor.load_manifest(str(store))
+    assert saved["generation"] == manifest["generation"]
+    assert saved["files"]["api.md"]["mtime_ns"] == 10**18
+    assert processor.is_vector_store_current(str(store))
+    assert "saldo" in processor.search("saldo", k=1)[0].page_content
+
+def chunk(text: str, source: str, start: int) -> Document:
+    return Document(page_content=text[start:start + 40], metadata={"source": source, "start_index": start})
+
+def test_merge_overlapping_chunks_of_same_source(ollama, tmp_path):
+    text = "".join(chr(65 + i % 26) for i in range(120))
+    results = [
+        chunk(text, "b.md", 30),  # Mesmo trecho, outro arquivo: não junta
+        chunk(text, "a.md", 30),
+        chunk(text, "a.md", 0),   # Sobrepõe o anterior
+        chunk(text, "a.md", 70),  # Encosta no fim (30 + 40)
+        chunk(text, "a.md", 35),  # Contido no trecho já unido
+    ]
+    merged = make_processor(ollama, tmp_path).assemble_context(results, max_tokens=None)
+
+    assert [doc.metadata["source"] for doc in merged] == ["b.md", "a.md"]
+    assert merged[0].page_content == text[30:70]
+    assert merged[1].page_content == text[0:110]
+
+def test_assemble_context_respects_token_budget(ollama, tmp_path):
+    rng = random.Random(3)
+    words = ["saldo", "ledger", "bloqueio.", "transação\n\n", "conta"]
+    results = [
+        Document(page_content=" ".join(rng.choice(words) for _ in range(rng.randrange(5, 400))),
+                 metadata={"source": f"doc_{i}.md", "start_index": 0})
+        for i in range(8)
+    ]
+    results.append(Document(page_content="x" * 3000, metadata={"source": "sem_espaco.md", "start_index": 0}))
+    processor = make_processor(ollama, tmp_path)
+
+    for budget in (0, 10, 64, 65, 100, 333, 1000, 5000):
+        packed = processor.assemble_context(results, max_tokens=budget)
+        used = sum(-(-len(doc.page_content) // CHARS_PER_TOKEN) for doc in packed)
+        assert used <= budget, budget
+        sources = [doc.metadata["source"] for doc in packed]
+        assert sources == sorted(sources, key=lambda source: [doc.metadata["source"] for doc in results].index(source))
+    assert len(processor.assemble_context(results, max_tokens=10**6)) == len(results)
+
+    # Truncado sem separadores: o marcador " …" também cabe no orçamento
+    [truncated] = processor.assemble_context(results[-1:], max_tokens=100)
+    assert truncated.page_content.endswith(" …") and len(truncated.page_content) <= 100 * CHARS_PER_TOKEN
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Testes, fuzz e benchmark do extrator linear de tool calls (tool_parser.py)
+Compara com a cascata de regex antiga usando os casos de test_parser.py
+
+Uso: python -m pytest -q test_tool_parser.py (testes e fuzz)
+     python test_tool_parser.py (benchmark contra a cascata antiga)
+"""
+
+import re
+import json
+import time
+import random
+import pytest
+from typing import Optional, Dict, Any
+from tool_parser import extract_tool_calls, select_tool_calls
+
+def legacy_try_parse_json(json_str: str) -> Optional[Dict[str, Any]]:
+    """Cascata antiga: json.loads + até duas reescritas por regex"""
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        pass
+
+    try:
+        return json.loads(re.sub(r"'([^']*)'", r'"\1"', json_str))
+    except json.JSONDecodeError:
+        pass
+
+    try:
+        fixed_json = re.sub(r',(\s*[}\]])', r'\1', json_str)
+        fixed_json = re.sub(r"'([^']*)'", r'"\1"', fixed_json)
+        return json.loads(fixed_json)
+    except json.JSONDecodeError:
+        pass
+
+    return None
+
+def legacy_parse_tool_call(text: str) -> Optional[Dict[str, Any]]:
+    """Parser antigo do agent: <tool>(.*?)</tool> e depois JSON solto"""
+    match = re.search(r'<tool>(.*?)</tool>', text, re.DOTALL)
+    if match:
+        result = legacy_try_parse_json(match.group(1).strip())
+        if result:
+            return result
+
+    json_match = re.search(r'\{.*?"tool".*?"action".*?\}', text, re.DOTALL)
+    if json_match:
+        result = legacy_try_parse_json(json_match.group(0))
+        if result:
+            return result
+
+    return None
+
+# Casos de test_parser.py e test_improvements.py
+test_cases = [
+    # Caso 1: Tool call correto
+    ('''<tool>{"tool": "api", "action": "call_api", "url": "http://example.com", "method": "GET"}</tool>''',
+     [("api", "call_api")]),
+
+    # Caso 2: Tool call com explicação e cURL antes, headers com single quotes
+    ('''Para corrigir a divergência de saldo da sua conta, precisarei chamar o endpoint do Balance Ledger.
+
+```bash
+curl --location 'http://cb-balance-ledger.dev.contaazul.local/private-api/rest/v1/accounts/jud-block' \\
+--header 'X-TenantId: 36' \\
+--data '{
+    "transactionId": "bfe877fd-1007-4712-be2e-283088e83265",
+    "amount": 0.4
+}'
+```
+
+<tool>{"tool": "api", "action": "call_api", "url": "http://cb-balance-ledger.dev.contaazul.local/private-api/rest/v1/accounts/jud-block", "method": "POST", "headers": {'X-TenantId': '36', 'X-UserId': '12', 'Content-Type': 'application/json'}, "data": {"transactionId": "bfe877fd-1007-4712-be2e-283088e83265", "amount": 0.4}}</tool>''',
+     [("api", "call_api")]),
+
+    # Caso 3: JSON sem tags
+    ('''A API deve ser chamada assim:
+{"tool": "api", "action": "call_api", "url": "https://api.example.com", "method": "GET"}''',
+     [("api", "call_api")]),
+
+    # Caso 4: Single quotes
+    ("{'tool': 'api', 'action': 'call_api', 'url': 'http://example.com', 'method': 'POST', 'data': {'amount': 0.4}}",
+     [("api", "call_api")]),
+
+    # Caso 5: Misto + vírgula final
+    ('{"tool": "api", \'action\': "call_api", "url": "https://api.example.com", "method": "GET",}',
+     [("api", "call_api")]),
+
+    # Caso 6: Várias chamadas na mesma resposta
+    ('<tool>{"tool": "system", "action": "get_timestamp"}</tool>\n'
+     '<tool>{"tool": "file", "action": "read_file", "filepath": "./a.txt"}</tool>',
+     [("system", "get_timestamp"), ("file", "read_file")]),
+
+    # Caso 7: Sem tool call
+    ("Nenhuma ação necessária, {isso} não é JSON.", []),
+]
+
+@pytest.mark.parametrize("text, expected", test_cases)
+def test_extracts_expected_calls(text, expected):
+    assert [(call["tool"], call["action"]) for call in select_tool_calls(text)] == expected
+
+# Fuzz: chamadas aleatórias serializadas em estilos que LLMs costumam gerar
+WORDS = ["api", "call_api", "file", "read_file", "url", "http://x.io/a?b=1", "it's", 'diz "oi"', "{chave}", "a,b", "ç ã é", "\\n"]
+
+def random_value(rng: random.Random, depth: int = 0):
+    kind = rng.randrange(6 if depth < 2 else 4)
+    if kind == 0:
+        return rng.choice(WORDS)
+    if kind == 1:
+        return rng.randint(-1000, 1000)
+    if kind == 2:
+        return rng.choice([True, False, None, 0.4])
+    if kind == 3:
+        return "".join(rng.choice("abc{}[]:,'\" ") for _ in range(rng.randrange(8)))
+    if kind == 4:
+        return [random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+    return {rng.choice(WORDS): random_value(rng, depth + 1) for _ in range(rng.randrange(4))}
+
+def single_quoted(rng: random.Random, value) -> str:
+    """Serializa como um LLM descuidado: aspas simples quando possível, vírgulas finais"""
+    if isinstance(value, dict):
+        items = [f"{single_quoted(rng, k)}: {single_quoted(rng, v)}" for k, v in value.items()]
+        return "{" + ", ".join(items) + (", " if items and rng.random() < 0.3 else "") + "}"
+    if isinstance(value, list):
+        items = [single_quoted(rng, v) for v in value]
+        return "[" + ", ".join(items) + ("," if items and rng.random() < 0.3 else "") + "]"
+    if isinstance(value, str) and "'" not in value and "\\" not in value and rng.random() < 0.5:
+        return "'" + value + "'"
+    return json.dumps(value, ensure_ascii=False)
+
+def test_fuzz_round_trip():
+    rng = random.Random(42)
+    for _ in range(2000):
+        calls = []
+        parts = []
+        for _ in range(rng.randrange(1, 4)):
+            call = {"tool": rng.choice(["api", "file", "json"]), "action": rng.choice(["call_api", "read_file"])}
+            call.update({f"k{j}": random_value(rng) for j in range(rng.randrange(4))})
+            calls.append(call)
+            prose = "".join(rng.choice("abc {}[]'\",.\n") for _ in range(rng.randrange(30)))
+            parts.append(prose + "\n<tool>" + single_quoted(rng, call) + "</tool>\n")
+        text = "".join(parts)
+        assert select_tool_calls(text) == calls, text[:200]
+
+def test_garbage_never_raises():
+    rng = random.Random(42)
+    for _ in range(2000):
+        extract_tool_calls("".join(rng.choice("{}[]<>/tool'\",:a \n\\") for _ in range(200)))
+
+def bench(fn, text: str, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - started) * 1000 / repeat
+
+if __name__ == "__main__":
+    # Benchmark: resposta longa com muitas chaves antes da tool call
+    print("⏱️  Benchmark")
+    print("=" * 80)
+
+    for size in (25, 50, 100):
+        # Explicação longa com trechos de código cheios de chaves e nenhuma tool call:
+        # cada '{' faz o regex antigo varrer até o fim do texto procurando "action"
+        noisy = 'Exemplo de payload: {"tool" "x": [1, {2}]} e mais texto. ' * size
+        legacy_ms = bench(legacy_parse_tool_call, noisy, 1)
+        linear_ms = bench(select_tool_calls, noisy, 1)
+        print(f"[{len(noisy):>7} chars, sem tool] regex: {legacy_ms:9.2f} ms | linear: {linear_ms:7.2f} ms")
+
+    normal = test_cases[1][0]
+    print(f"[{len(normal):>7} chars, caso 2  ] regex: {bench(legacy_parse_tool_call, normal, 200):9.3f} ms | "
+          f"linear: {bench(select_tool_calls, normal, 200):7.3f} ms")
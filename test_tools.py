@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Testes das tools: dispatch das actions, leitura limitada do FileTool e
+do APITool, prévia em JSON, cliente assíncrono do APITool e ToolResultCache (contra um servidor HTTP
+local)
+
+Uso: python -m pytest -q test_tools.py
+"""
+
+import os
+import json
+import random
+import asyncio
+import threading
+import tracemalloc
+import pytest
+import tools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tools import (
+    APITool, FileTool, FILE_MAX_CHUNK_BYTES, IDEMPOTENT_HTTP_METHODS, SAFE_HTTP_METHODS, SUPPORTED_HTTP_METHODS,
+    ToolResult, ToolResultCache, aexecute_tool, execute_tool, json_preview,
+)
+
+def test_tail_edge_cases(tmp_path):
+    path = tmp_path / "log.txt"
+    for content, expected in ((b"", []), (b"\n", [""]), (b"a\n", ["a"]), (b"a\n\n", ["a", ""]), (b"a\nb", ["a", "b"])):
+        path.write_bytes(content)
+        result = FileTool.tail(str(path), lines=10)
+        assert result.success
+        assert [line["text"] for line in result.data["lines"]] == expected, content
+
+def test_read_lines_skips_giant_line_in_bounded_chunks(tmp_path):
+    path = tmp_path / "giant.log"
+    giant = b"x" * (FILE_MAX_CHUNK_BYTES * 512)  # 32 MiB em uma linha
+    path.write_bytes(b"primeira\n" + giant + b"\nterceira\n")
+
+    tracemalloc.start()
+    result = FileTool.read_lines(str(path), start=2, count=2)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert result.success
+    lines = result.data["lines"]
+    assert [line["line"] for line in lines] == [2, 3]
+    assert lines[1] == {"line": 3, "offset": len(b"primeira\n") + len(giant) + 1, "text": "terceira"}
+    assert peak < 4 * 1024 * 1024
+
+def test_grep_match_spanning_file_is_not_copied(tmp_path):
+    path = tmp_path / "big.log"
+    line = b"y" * 1023 + b"\n"
+    path.write_bytes(b"inicio\n" + line * (32 * 1024))  # 32 MiB
+
+    tracemalloc.start()
+    result = FileTool.grep(str(path), r"[\s\S]*", max_matches=1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert result.success
+    first = result.data["matches"][0]
+    assert (first["line"], first["offset"]) == (1, 0) and first["text"].startswith("inicio\nyyy")
+    assert first["match"].startswith("inicio\nyyy") and len(first["match"]) == 200
+    assert peak < 4 * 1024 * 1024
+
+def test_close_async_client_closes_pool_of_current_loop():
+    async def scenario():
+        client = APITool._async_client()
+        assert APITool._async_client() is client
+        await APITool.close_async_client()
+        await APITool.close_async_client()  # Sem cliente aberto: nada a fazer
+        return client
+
+    client = asyncio.run(scenario())
+    assert client.is_closed
+    assert len(APITool._async_clients) == 0
+
+@pytest.mark.parametrize("tool_name, action", [
+    ("api", "session"), ("api", "pool_stats"), ("api", "_async_client"), ("api", "close_async_client"),
+    ("file", "_decode"), ("system", "__init__"), ("inventada", "call_api"),
+])
+def test_execute_tool_rejects_helpers(tool_name, action):
+    result = execute_tool(tool_name, action)
+    assert isinstance(result, ToolResult) and not result.success
+
+    result = asyncio.run(aexecute_tool(tool_name, action))
+    assert isinstance(result, ToolResult) and not result.success
+    assert len(APITool._async_clients) == 0
+
+def test_http_method_sets_stay_within_supported_methods():
+    assert SAFE_HTTP_METHODS <= IDEMPOTENT_HTTP_METHODS <= SUPPORTED_HTTP_METHODS
+
+class CacheHandler(BaseHTTPRequestHandler):
+    """/etag revalida por ETag (POST muda a versão); /fresh vale por max-age"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, headers: dict, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get("If-None-Match")))
+        etag = f'"v{server.version}"'
+        if self.path == "/etag" and self.headers.get("If-None-Match") == etag:
+            self._send(304, {"ETag": etag})
+        elif self.path == "/etag":
+            self._send(200, {"ETag": etag, "Content-Type": "application/json"}, {"version": server.version})
+        else:
+            self._send(200, {"Cache-Control": "max-age=60", "Content-Type": "application/json"}, {"fresh": True})
+
+    def do_POST(self):
+        self.server.version += 1
+        self._send(200, {"Content-Type": "application/json"}, {"version": self.server.version})
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CacheHandler)
+    server.version, server.requests = 1, []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_cache_revalidates_etag_and_invalidates_on_post(http_server):
+    server, url = http_server
+    cache = ToolResultCache()
+
+    first, status = cache.execute("api", "call_api", url=url + "/etag")
+    assert status == "miss" and first.data == {"version": 1}
+    again, status = cache.execute("api", "call_api", url=url + "/etag", method="get")
+    assert status == "revalidated" and again.data == {"version": 1}
+    assert server.requests[-1] == ("/etag", '"v1"')
+
+    _, status = cache.execute("api", "call_api", url=url + "/etag", method="POST", data={})
+    assert status is None
+    after, status = cache.execute("api", "call_api", url=url + "/etag")
+    assert status == "miss" and after.data == {"version": 2}
+    assert server.requests[-1] == ("/etag", None)  # Entrada antiga descartada: sem GET condicional
+    assert cache.stats()["revalidated"] == 1
+
+def test_cache_serves_max_age_without_request(http_server, monkeypatch):
+    server, url = http_server
+    cache = ToolResultCache()
+
+    assert cache.execute("api", "call_api", url=url + "/fresh")[1] == "miss"
+    assert cache.execute("api", "call_api", url=url + "/fresh")[1] == "hit"
+    assert len(server.requests) == 1
+
+    now = tools.time.monotonic()
+    monkeypatch.setattr(tools.time, "monotonic", lambda: now + 61)
+    assert cache.execute("api", "call_api", url=url + "/fresh")[1] == "miss"
+    assert len(server.requests) == 2
+
+def test_cache_validates_file_reads(tmp_path):
+    path = tmp_path / "config.txt"
+    path.write_text("primeira", encoding="utf-8")
+    cache = ToolResultCache()
+
+    assert cache.execute("file", "read_file", filepath=str(path))[1] == "miss"
+    result, status = cache.execute("file", "read_file", filepath=str(tmp_path / "." / "config.txt"))
+    assert status == "hit" and result.data == "primeira"
+
+    # Mudança por fora: tamanho e mtime novos
+    path.write_text("segunda versão", encoding="utf-8")
+    result, status = cache.execute("file", "read_file", filepath=str(path))
+    assert status == "miss" and result.data == "segunda versão"
+
+    # write_file invalida mesmo que mtime e tamanho coincidam com os guardados
+    stat = os.stat(path)
+    assert cache.execute("file", "write_file", filepath=str(path), content="terceira versã")[1] is None
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    result, status = cache.execute("file", "read_file", filepath=str(path))
+    assert status == "miss" and result.data == "terceira versã"
+
+def test_read_capped_stops_at_limit():
+    consumed = []
+
+    def chunks():
+        for i in range(100):
+            consumed.append(i)
+            yield bytes([65 + i % 26]) * 10
+
+    body, truncated = APITool._read_capped(chunks(), 25)
+    assert (body, truncated) == (b"A" * 10 + b"B" * 10 + b"C" * 5, True)
+    assert consumed == [0, 1, 2]  # Não lê o resto do corpo
+
+    assert APITool._read_capped(iter([b"abc", b"de"]), 5) == (b"abcde", False)
+    assert APITool._read_capped(iter([]), 5) == (b"", False)
+
+class Opaque:
+    def __str__(self) -> str:
+        return "<opaco>"
+
+def random_payload(rng: random.Random, depth: int = 0):
+    kind = rng.randrange(7 if depth < 3 else 4)
+    if kind == 0:
+        return rng.choice(["", "ç ã é", 'aspas "e" \\ barra', "\n\t", "x" * rng.randrange(2000)])
+    if kind == 1:
+        return rng.choice([0, -1, 3.25, 10**20, True, None])
+    if kind == 2:
+        return Opaque()  # Não serializável: vira str()
+    if kind == 3:
+        return "😀" * rng.randrange(50)
+    if kind == 4:
+        return [random_payload(rng, depth + 1) for _ in range(rng.randrange(30))]
+    if kind == 5:
+        return tuple(random_payload(rng, depth + 1) for _ in range(rng.randrange(5)))
+    return {f"chave {i} \"": random_payload(rng, depth + 1) for i in range(rng.randrange(30))}
+
+def test_json_preview_is_valid_json_within_limit():
+    rng = random.Random(7)
+    for _ in range(500):
+        value = random_payload(rng)
+        for limit in (20, 64, 200, 500):
+            preview = json_preview(value, limit)
+            assert len(preview) <= limit, (limit, preview)
+            json.loads(preview)
+
+    small = {"status": "ok", "items": [1, 2, {"a": None}]}
+    assert json_preview(small) == json.dumps(small, ensure_ascii=False)
+    huge = {"rows": [{"id": i, "text": "y" * 1000} for i in range(10_000)]}
+    preview = json_preview(huge, 300)
+    assert len(preview) <= 300 and json.loads(preview)["rows"][0]["id"] == 0
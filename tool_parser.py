@@ -0,0 +1,170 @@
+import re
+import json
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+TOOL_OPEN = "<tool>"
+TOOL_CLOSE = "</tool>"
+
+class ToolCall(BaseModel):
+    """Chamada de tool extraída da resposta do LLM"""
+    call: Dict[str, Any]
+    start: int  # Posição do '{' no texto
+    end: int  # Posição logo após o '}'
+    tagged: bool  # Veio dentro de <tool>...</tool>
+
+def _to_call(json_str: str) -> Optional[Dict[str, Any]]:
+    """json.loads do objeto já normalizado; só aceita dicts com tool e action"""
+    try:
+        data = json.loads(json_str)
+    except json.JSONDecodeError:
+        return None
+    if isinstance(data, dict) and "tool" in data and "action" in data:
+        return data
+    return None
+
+# Próximo caractere relevante em cada estado; classes de um caractere, sem backtracking
+_NEXT_OUTSIDE = re.compile(r"[{<]")
+_NEXT_STRUCTURE = re.compile(r"[\"'{}\[\],<\s]")
+_NEXT_IN_STRING = {
+    '"': re.compile(r'["\\\n\t<]'),
+    "'": re.compile(r"['\"\\\n\t<]"),
+}
+
+def extract_tool_calls(text: str) -> List[ToolCall]:
+    """
+    Extrai todas as chamadas de tool do texto em uma única passada.
+
+    O scanner acompanha profundidade de chaves/colchetes e o estado de
+    strings (aspas simples ou duplas, com escapes), e vai montando ao mesmo
+    tempo a versão JSON normalizada do objeto: strings com aspas simples
+    viram aspas duplas, vírgulas finais antes de '}'/']' são descartadas e
+    quebras de linha dentro de strings viram '\\n'. Cada objeto de nível
+    superior é validado com um único json.loads, então o custo é linear no
+    tamanho do texto, sem backtracking de regex nem reescritas repetidas.
+    Trechos sem caracteres relevantes são pulados com buscas de uma classe
+    de caractere, copiados em fatias.
+
+    Um '<tool>' ou '</tool>' (mesmo dentro de uma string aberta) reinicia a
+    varredura, para que uma chave ou aspa solta na explicação não engula a
+    chamada real que vem depois.
+    """
+    calls = []
+    n = len(text)
+    i = 0
+
+    depth = 0
+    out = []  # Objeto atual, já normalizado para JSON
+    start = 0
+    tagged = False
+    inside_tag = False
+    quote = None  # Aspa que abriu a string atual
+    pending_comma = None  # Índice em `out` da última vírgula seguida só de espaços
+
+    while i < n:
+        if depth == 0:
+            match = _NEXT_OUTSIDE.search(text, i)
+            if match is None:
+                break
+            i = match.start()
+        elif quote is not None:
+            match = _NEXT_IN_STRING[quote].search(text, i)
+            if match is None:
+                break
+            if match.start() > i:
+                out.append(text[i:match.start()])
+            i = match.start()
+        else:
+            match = _NEXT_STRUCTURE.search(text, i)
+            if match is None:
+                break
+            if match.start() > i:
+                out.append(text[i:match.start()])
+                pending_comma = None
+            i = match.start()
+
+        ch = text[i]
+
+        if ch == "<":
+            if text.startswith(TOOL_OPEN, i):
+                # Descarta qualquer objeto não fechado e começa dentro da tag
+                depth, out, quote, pending_comma = 0, [], None, None
+                inside_tag = True
+                i += len(TOOL_OPEN)
+                continue
+            if text.startswith(TOOL_CLOSE, i):
+                depth, out, quote, pending_comma = 0, [], None, None
+                inside_tag = False
+                i += len(TOOL_CLOSE)
+                continue
+            if depth > 0:
+                out.append(ch)
+                if quote is None:
+                    pending_comma = None
+            i += 1
+            continue
+
+        if quote is not None:
+            if ch == "\\":
+                nxt = text[i + 1] if i + 1 < n else ""
+                if quote == "'" and nxt == "'":
+                    out.append("'")  # \\' não é escape válido em JSON
+                else:
+                    out.append(ch + nxt)
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')  # Aspa dupla dentro de string com aspas simples
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append("\\t")
+            i += 1
+            continue
+
+        if depth == 0:
+            # Só '{' chega aqui fora de objetos
+            depth = 1
+            out = ["{"]
+            start = i
+            tagged = inside_tag
+            pending_comma = None
+        elif ch == '"' or ch == "'":
+            quote = ch
+            out.append('"')
+            pending_comma = None
+        elif ch == "{" or ch == "[":
+            depth += 1
+            out.append(ch)
+            pending_comma = None
+        elif ch == "}" or ch == "]":
+            if pending_comma is not None:
+                out[pending_comma] = ""  # Vírgula final
+                pending_comma = None
+            depth -= 1
+            out.append(ch)
+            if depth == 0:
+                call = _to_call("".join(out))
+                if call is not None:
+                    calls.append(ToolCall(call=call, start=start, end=i + 1, tagged=tagged))
+                out = []
+        elif ch == ",":
+            pending_comma = len(out)
+            out.append(ch)
+        else:
+            out.append(ch)  # Espaço: não cancela a vírgula pendente
+        i += 1
+
+    return calls
+
+def select_tool_calls(text: str) -> List[Dict[str, Any]]:
+    """
+    Chamadas a executar: as que vieram em <tool>...</tool>; sem nenhuma tag,
+    aceita JSON solto com "tool" e "action" (mesma prioridade do parser antigo).
+    """
+    calls = extract_tool_calls(text)
+    tagged = [call.call for call in calls if call.tagged]
+    return tagged or [call.call for call in calls]
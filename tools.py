@@ -1,9 +1,52 @@
 import os
+import re
 import json
+import mmap
+import time
+import asyncio
+import inspect
+import threading
+import weakref
+import httpx
 import requests
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
+from dotenv import load_dotenv
 from pydantic import BaseModel, Field
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cache import TTLCache
+
+load_dotenv()  # REQUEST_TIMEOUT e demais configurações do .env
+
+# Timeouts (segundos), pool e retries do APITool
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "10"))  # Leitura
+REQUEST_CONNECT_TIMEOUT = float(os.getenv("REQUEST_CONNECT_TIMEOUT", "3.05"))
+API_POOL_CONNECTIONS = int(os.getenv("API_POOL_CONNECTIONS", "10"))  # Hosts com pool mantido
+API_POOL_MAXSIZE = int(os.getenv("API_POOL_MAXSIZE", "10"))  # Conexões simultâneas por host
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
+API_BACKOFF_FACTOR = float(os.getenv("API_BACKOFF_FACTOR", "0.5"))  # 0.5s, 1s, 2s...
+
+SUPPORTED_HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"}
+BODY_HTTP_METHODS = {"POST", "PUT", "PATCH"}
+# Repetir só o que é idempotente: um POST/PATCH repetido pode duplicar o efeito
+IDEMPOTENT_HTTP_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE"})
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+# Limite do corpo lido por chamada: respostas maiores são cortadas
+API_MAX_RESPONSE_BYTES = int(os.getenv("API_MAX_RESPONSE_BYTES", str(1024 * 1024)))
+RESPONSE_CHUNK_BYTES = 64 * 1024
+# Limites das actions de arquivo (mantêm a memória e o prompt pequenos)
+FILE_MAX_READ_BYTES = int(os.getenv("FILE_MAX_READ_BYTES", str(1024 * 1024)))  # read_file
+FILE_MAX_CHUNK_BYTES = 64 * 1024  # read_range e linhas individuais
+FILE_MAX_LINES = 500  # read_lines / tail
+FILE_MAX_LINE_CHARS = 2000
+FILE_MAX_TAIL_BYTES = 1024 * 1024
+FILE_MAX_MATCHES = 200  # grep
+FILE_SCAN_CHUNK_BYTES = 1024 * 1024
+
+# Tipos fora de text/* que ainda são texto legível
+TEXT_CONTENT_TYPES = {"application/xml", "application/javascript", "application/x-www-form-urlencoded"}
 
 # Tools disponíveis que o agent pode chamar
 class ToolResult(BaseModel):
@@ -11,12 +54,271 @@ class ToolResult(BaseModel):
     success: bool
     data: Any
     error: Optional[str] = None
+    meta: Optional[Dict[str, Any]] = None  # Fora do prompt (ex.: status, ETag, Last-Modified)
+
+    def preview(self, limit: int = 500) -> str:
+        """Prévia dos dados em JSON válido com até `limit` caracteres"""
+        return json_preview(self.data, limit)
+
+# Espaço guardado para o marcador de corte (', "…": "…"') e o fechamento
+_PREVIEW_MARKER_ROOM = 12
+
+def json_preview(value: Any, limit: int = 500) -> str:
+    """
+    Serializa só o começo de `value` como JSON válido com até `limit`
+    caracteres. Percorre a estrutura emitindo pedaços enquanto cabem e, ao
+    estourar, fecha as chaves/colchetes abertos com um marcador "…"; strings
+    longas são cortadas antes de serializar. O custo é proporcional ao
+    tamanho da prévia, não ao do objeto (um payload de vários MB não é
+    serializado inteiro só para ficar com os primeiros 500 caracteres).
+    """
+    parts = []
+    size = 0
+    closers = []  # Fechamentos pendentes: "}" / "]"
+
+    def room() -> int:
+        return limit - size - len(closers) - _PREVIEW_MARKER_ROOM
+
+    def emit(text: str) -> bool:
+        nonlocal size
+        if len(text) > room():
+            return False
+        parts.append(text)
+        size += len(text)
+        return True
+
+    def close() -> bool:
+        # O fechamento já estava reservado no orçamento: sempre cabe
+        nonlocal size
+        parts.append(closers.pop())
+        size += 1
+        return True
+
+    def emit_string(text: str) -> bool:
+        available = room() - 3  # Aspas + "…"
+        if len(text) <= available:
+            encoded = json.dumps(text, ensure_ascii=False)
+            if emit(encoded):
+                return True
+        if available <= 0:
+            return False
+        cut = text[:available]
+        encoded = json.dumps(cut + "…", ensure_ascii=False)
+        while len(encoded) > room() and cut:
+            cut = cut[:len(cut) // 2]  # Escapes aumentam o tamanho serializado
+            encoded = json.dumps(cut + "…", ensure_ascii=False)
+        emit(encoded)
+        return False  # Cortada: a prévia termina aqui
+
+    def write(item: Any) -> bool:
+        # Retorna False quando a prévia acabou; quem não conseguiu emitir nada
+        # deixa o marcador para o container em volta
+        if isinstance(item, str):
+            return emit_string(item)
+        if isinstance(item, dict):
+            if not emit("{"):
+                return False
+            closers.append("}")
+            for i, (key, val) in enumerate(item.items()):
+                if i and not emit(", "):
+                    parts.append(', "…": "…"')
+                    return False
+                if not emit(json.dumps(str(key), ensure_ascii=False) + ": "):
+                    parts.append('"…": "…"')
+                    return False
+                emitted = len(parts)
+                if not write(val):
+                    if len(parts) == emitted:
+                        parts.append('"…"')
+                    return False
+            return close()
+        if isinstance(item, (list, tuple)):
+            if not emit("["):
+                return False
+            closers.append("]")
+            for i, val in enumerate(item):
+                if i and not emit(", "):
+                    parts.append(', "…"')
+                    return False
+                emitted = len(parts)
+                if not write(val):
+                    if len(parts) == emitted:
+                        parts.append('"…"')
+                    return False
+            return close()
+        try:
+            return emit(json.dumps(item, ensure_ascii=False))
+        except (TypeError, ValueError):
+            return emit_string(str(item))
+
+    if not write(value) and not parts:
+        return '"…"'
+    return "".join(parts) + "".join(reversed(closers))
 
 class APITool:
-    """Tool para chamar endpoints HTTP"""
+    """
+    Tool para chamar endpoints HTTP.
+
+    Todas as chamadas passam por uma requests.Session compartilhada: as
+    conexões ficam abertas (keep-alive) em um pool por host, então chamadas
+    repetidas ao mesmo serviço não pagam outro handshake TCP/TLS. Métodos
+    idempotentes são repetidos com backoff exponencial em falhas de conexão
+    e em 429/502/503/504.
+    """
+
+    _session: Optional[requests.Session] = None
+    _session_lock = threading.Lock()
+
+    # Um cliente httpx por event loop: as conexões de um AsyncClient ficam
+    # presas ao loop em que foram abertas. Quem roda o loop fecha o cliente
+    # com close_async_client() antes de encerrá-lo
+    _async_clients = weakref.WeakKeyDictionary()
+    # O padrão do httpx (100 conexões) enfileira as chamadas quando centenas
+    # de conversas rodam no mesmo loop
+    async_max_connections = int(os.getenv("API_MAX_CONNECTIONS", "500"))
+
+    @classmethod
+    def session(cls) -> requests.Session:
+        """Sessão HTTP compartilhada (criada na primeira chamada)"""
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    retry = Retry(
+                        total=API_MAX_RETRIES,
+                        backoff_factor=API_BACKOFF_FACTOR,
+                        status_forcelist=RETRY_STATUS_CODES,
+                        allowed_methods=IDEMPOTENT_HTTP_METHODS,
+                        respect_retry_after_header=True,
+                        raise_on_status=False,  # Devolve a última resposta; raise_for_status decide
+                    )
+                    adapter = HTTPAdapter(
+                        pool_connections=API_POOL_CONNECTIONS,
+                        pool_maxsize=API_POOL_MAXSIZE,
+                        pool_block=True,  # Limite real por host: espera uma conexão livre
+                        max_retries=retry,
+                    )
+                    session = requests.Session()
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    cls._session = session
+        return cls._session
+
+    @classmethod
+    def pool_stats(cls) -> Dict[str, Any]:
+        """Conexões abertas, requisições e conexões ociosas por host"""
+        hosts = []
+        if cls._session is not None:
+            seen = set()
+            for adapter in cls._session.adapters.values():
+                if id(adapter) in seen:
+                    continue
+                seen.add(id(adapter))
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    hosts.append({
+                        "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+                        "connections_opened": pool.num_connections,
+                        "requests": pool.num_requests,
+                        "idle": pool.pool.qsize() if pool.pool is not None else 0,
+                    })
+        opened = sum(host["connections_opened"] for host in hosts)
+        total = sum(host["requests"] for host in hosts)
+        return {
+            "hosts": hosts,
+            "requests": total,
+            "connections_opened": opened,
+            "reuse_rate": (total - opened) / total if total else 0.0,
+            "pool_maxsize": API_POOL_MAXSIZE,
+        }
+
+    @staticmethod
+    def _body_kind(resp) -> str:
+        """Como tratar o corpo: 'none' (HEAD), 'json', 'text' ou 'binary' (não lido)"""
+        if resp.request.method == "HEAD":
+            return "none"
+        mime = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if mime == "application/json" or mime.endswith("+json"):
+            return "json"
+        if not mime or mime.startswith("text/") or mime in TEXT_CONTENT_TYPES or mime.endswith("+xml"):
+            return "text"
+        return "binary"
+
+    @staticmethod
+    def _to_result(resp, kind: str, body: bytes, truncated: bool) -> ToolResult:
+        """
+        Converte a resposta (requests ou httpx) já lida até o limite em
+        ToolResult, de acordo com o tipo de conteúdo.
+        """
+        if kind == "none":
+            return ToolResult(success=True, data={"status": resp.status_code, "headers": dict(resp.headers)})
+
+        content_type = resp.headers.get("Content-Type", "")
+        content_length = resp.headers.get("Content-Length")
+        if kind == "binary":
+            # Binário não vai para o prompt: só os metadados
+            return ToolResult(success=True, data={
+                "status": resp.status_code,
+                "content_type": content_type,
+                "content_length": int(content_length) if content_length else None,
+            })
+
+        if not body:
+            return ToolResult(success=True, data=resp.status_code)
+
+        charset = "utf-8"
+        for param in content_type.split(";")[1:]:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "charset" and value.strip():
+                charset = value.strip().strip('"')
+        try:
+            text = body.decode(charset, errors="replace")
+        except LookupError:
+            text = body.decode("utf-8", errors="replace")
+
+        if truncated:
+            # JSON cortado não faz parse: devolve o texto lido e avisa o corte
+            # (o conteúdo vem logo após a flag para aparecer na prévia do prompt)
+            return ToolResult(success=True, data={
+                "truncated": True,
+                "body": text,
+                "bytes_read": len(body),
+                "content_length": int(content_length) if content_length else None,
+                "content_type": content_type,
+            })
+
+        if kind == "json" or text.lstrip()[:1] in ("{", "["):
+            try:
+                return ToolResult(success=True, data=json.loads(text))
+            except json.JSONDecodeError:
+                if kind == "json":
+                    raise
+        return ToolResult(success=True, data=text)
 
     @staticmethod
+    def _http_meta(resp) -> Dict[str, Any]:
+        """Status e headers de cache da resposta (validação do ToolResultCache)"""
+        meta = {"status": resp.status_code}
+        for field, header in (("etag", "ETag"), ("last_modified", "Last-Modified"), ("cache_control", "Cache-Control")):
+            if resp.headers.get(header):
+                meta[field] = resp.headers[header]
+        return meta
+
+    @staticmethod
+    def _read_capped(chunks, limit: int) -> Tuple[bytes, bool]:
+        """Lê os pedaços do corpo até `limit` bytes; retorna (corpo, cortado)"""
+        body = bytearray()
+        for chunk in chunks:
+            body += chunk
+            if len(body) > limit:
+                return bytes(body[:limit]), True
+        return bytes(body), False
+
+    @classmethod
     def call_api(
+        cls,
         url: str,
         method: str = "GET",
         headers: Optional[Dict] = None,
@@ -24,36 +326,308 @@ class APITool:
         params: Optional[Dict] = None
     ) -> ToolResult:
         """Chama um endpoint HTTP"""
+        method = method.upper()
+        if method not in SUPPORTED_HTTP_METHODS:
+            return ToolResult(success=False, data=None, error=f"Método {method} não suportado")
+
         try:
-            if method == "GET":
-                resp = requests.get(url, headers=headers, params=params, timeout=10)
-            elif method == "POST":
-                resp = requests.post(url, headers=headers, json=data, params=params, timeout=10)
-            elif method == "PUT":
-                resp = requests.put(url, headers=headers, json=data, params=params, timeout=10)
-            elif method == "DELETE":
-                resp = requests.delete(url, headers=headers, timeout=10)
-            else:
-                return ToolResult(success=False, data=None, error=f"Método {method} não suportado")
+            # stream=True: o corpo é lido em pedaços só até API_MAX_RESPONSE_BYTES
+            with cls.session().request(
+                method,
+                url,
+                headers=headers,
+                params=params,
+                json=data if method in BODY_HTTP_METHODS else None,
+                timeout=(REQUEST_CONNECT_TIMEOUT, REQUEST_TIMEOUT),
+                stream=True,
+            ) as resp:
+                resp.raise_for_status()
+                kind = cls._body_kind(resp)
+                body, truncated = b"", False
+                if kind in ("json", "text"):
+                    body, truncated = cls._read_capped(resp.iter_content(RESPONSE_CHUNK_BYTES), API_MAX_RESPONSE_BYTES)
+                result = cls._to_result(resp, kind, body, truncated)
+                result.meta = cls._http_meta(resp)
+                return result
+        except Exception as e:
+            return ToolResult(success=False, data=None, error=str(e))
+
+    @classmethod
+    def _async_client(cls) -> httpx.AsyncClient:
+        """Cliente assíncrono (pool de conexões) do event loop atual"""
+        loop = asyncio.get_running_loop()
+        client = cls._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=REQUEST_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=cls.async_max_connections),
+                follow_redirects=True  # Como o requests
+            )
+            cls._async_clients[loop] = client
+        return client
+
+    @classmethod
+    async def close_async_client(cls):
+        """Fecha o cliente assíncrono do event loop atual (chamar antes do loop terminar)"""
+        client = cls._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
 
-            resp.raise_for_status()
-            return ToolResult(success=True, data=resp.json() if resp.text else resp.status_code)
+    @classmethod
+    async def acall_api(
+        cls,
+        url: str,
+        method: str = "GET",
+        headers: Optional[Dict] = None,
+        data: Optional[Dict] = None,
+        params: Optional[Dict] = None
+    ) -> ToolResult:
+        """Versão assíncrona de call_api (httpx), com a mesma política de retry"""
+        method = method.upper()
+        if method not in SUPPORTED_HTTP_METHODS:
+            return ToolResult(success=False, data=None, error=f"Método {method} não suportado")
+
+        attempts = API_MAX_RETRIES + 1 if method in IDEMPOTENT_HTTP_METHODS else 1
+        try:
+            client = cls._async_client()
+            for attempt in range(attempts):
+                last_attempt = attempt == attempts - 1
+                try:
+                    async with client.stream(
+                        method,
+                        url,
+                        headers=headers,
+                        params=params,
+                        json=data if method in BODY_HTTP_METHODS else None,
+                    ) as resp:
+                        if resp.status_code not in RETRY_STATUS_CODES or last_attempt:
+                            if resp.status_code >= 400:  # httpx também levanta em 3xx (ex.: 304)
+                                resp.raise_for_status()
+                            kind = cls._body_kind(resp)
+                            body, truncated = bytearray(), False
+                            if kind in ("json", "text"):
+                                async for chunk in resp.aiter_bytes(RESPONSE_CHUNK_BYTES):
+                                    body += chunk
+                                    if len(body) > API_MAX_RESPONSE_BYTES:
+                                        body, truncated = body[:API_MAX_RESPONSE_BYTES], True
+                                        break
+                            result = cls._to_result(resp, kind, bytes(body), truncated)
+                            result.meta = cls._http_meta(resp)
+                            return result
+                except httpx.TransportError:
+                    if last_attempt:
+                        raise
+                await asyncio.sleep(API_BACKOFF_FACTOR * (2 ** attempt))
         except Exception as e:
             return ToolResult(success=False, data=None, error=str(e))
 
 class FileTool:
-    """Tool para ler/escrever arquivos"""
+    """
+    Tool para ler/escrever arquivos.
+
+    Além de read_file (arquivo inteiro, até FILE_MAX_READ_BYTES), há actions
+    para arquivos grandes (logs) que nunca carregam o arquivo todo: trecho
+    por offset, faixa de linhas, tail e grep sobre mmap.
+    """
+
+    @staticmethod
+    def _decode(raw: bytes) -> str:
+        """Bytes do arquivo → texto (bytes inválidos viram �)"""
+        return raw.decode("utf-8", errors="replace")
+
+    @staticmethod
+    def _line_text(raw: bytes) -> str:
+        """Linha sem o \\n final, cortada em FILE_MAX_LINE_CHARS"""
+        text = FileTool._decode(raw.rstrip(b"\r\n"))
+        if len(text) > FILE_MAX_LINE_CHARS:
+            return text[:FILE_MAX_LINE_CHARS] + "…"
+        return text
 
     @staticmethod
     def read_file(filepath: str) -> ToolResult:
         """Lê um arquivo"""
         try:
+            size = os.path.getsize(filepath)
+            if size > FILE_MAX_READ_BYTES:
+                return ToolResult(success=False, data=None, error=(
+                    f"Arquivo com {size} bytes (limite {FILE_MAX_READ_BYTES}): "
+                    f"use read_range, read_lines, tail ou grep"
+                ))
             with open(filepath, 'r', encoding='utf-8') as f:
                 content = f.read()
             return ToolResult(success=True, data=content)
         except Exception as e:
             return ToolResult(success=False, data=None, error=str(e))
 
+    @staticmethod
+    def read_range(filepath: str, offset: int = 0, length: int = 4096) -> ToolResult:
+        """Lê `length` bytes a partir do byte `offset` (offset negativo conta do fim)"""
+        try:
+            size = os.path.getsize(filepath)
+            offset = int(offset)
+            if offset < 0:
+                offset = max(0, size + offset)
+            length = max(0, min(int(length), FILE_MAX_CHUNK_BYTES))
+            with open(filepath, 'rb') as f:
+                f.seek(offset)
+                raw = f.read(length)
+            return ToolResult(success=True, data={
+                "offset": offset,
+                "bytes_read": len(raw),
+                "file_size": size,
+                "eof": offset + len(raw) >= size,
+                "content": FileTool._decode(raw),
+            })
+        except Exception as e:
+            return ToolResult(success=False, data=None, error=str(e))
+
+    @staticmethod
+    def read_lines(filepath: str, start: int = 1, count: int = 50) -> ToolResult:
+        """
+        Lê `count` linhas a partir da linha `start` (1 = primeira). As linhas
+        anteriores são puladas contando '\\n' em blocos, sem decodificar texto.
+        """
+        try:
+            start = max(1, int(start))
+            count = max(0, min(int(count), FILE_MAX_LINES))
+            with open(filepath, 'rb') as f:
+                # Pular start-1 linhas em blocos de FILE_SCAN_CHUNK_BYTES
+                to_skip = start - 1
+                position = 0
+                while to_skip:
+                    chunk = f.read(FILE_SCAN_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    newlines = chunk.count(b"\n")
+                    if newlines < to_skip:
+                        to_skip -= newlines
+                        position += len(chunk)
+                        continue
+                    cut = -1
+                    for _ in range(to_skip):
+                        cut = chunk.find(b"\n", cut + 1)
+                    position += cut + 1
+                    to_skip = 0
+                f.seek(position)
+
+                lines = []
+                for number in range(start, start + count):
+                    raw = f.readline(FILE_MAX_CHUNK_BYTES)
+                    if not raw:
+                        break
+                    if not raw.endswith(b"\n") and len(raw) == FILE_MAX_CHUNK_BYTES:
+                        # Linha gigante: descarta o resto em blocos limitados
+                        rest = raw
+                        while rest and not rest.endswith(b"\n"):
+                            rest = f.readline(FILE_MAX_CHUNK_BYTES)
+                    lines.append({"line": number, "offset": position, "text": FileTool._line_text(raw)})
+                    position = f.tell()
+                eof = not f.read(1)
+
+            return ToolResult(success=True, data={"start": start, "lines": lines, "eof": eof})
+        except Exception as e:
+            return ToolResult(success=False, data=None, error=str(e))
+
+    @staticmethod
+    def tail(filepath: str, lines: int = 50) -> ToolResult:
+        """Últimas `lines` linhas, lendo o arquivo de trás para frente em blocos"""
+        try:
+            wanted = max(0, min(int(lines), FILE_MAX_LINES))
+            size = os.path.getsize(filepath)
+            with open(filepath, 'rb') as f:
+                end = size
+                # Ignora o \\n final para não contar uma linha vazia
+                if size:
+                    f.seek(size - 1)
+                    if f.read(1) == b"\n":
+                        end -= 1
+
+                start = end
+                buffer = b""
+                while start > 0 and buffer.count(b"\n") < wanted:
+                    step = min(FILE_SCAN_CHUNK_BYTES, start)
+                    start -= step
+                    f.seek(start)
+                    buffer = f.read(step) + buffer
+                    if len(buffer) > FILE_MAX_TAIL_BYTES:
+                        # Linhas enormes: não acumular mais que o limite
+                        start += len(buffer) - FILE_MAX_TAIL_BYTES
+                        buffer = buffer[-FILE_MAX_TAIL_BYTES:]
+                        break
+
+            # Arquivo só com "\n": uma linha vazia (end == 0, mas size > 0)
+            raw_lines = buffer[:end - start].split(b"\n") if wanted and size else []
+            if len(raw_lines) > wanted:
+                skipped = sum(len(raw) + 1 for raw in raw_lines[:-wanted])
+                start += skipped
+                raw_lines = raw_lines[-wanted:]
+
+            tail_lines = []
+            offset = start
+            for raw in raw_lines:
+                tail_lines.append({"offset": offset, "text": FileTool._line_text(raw)})
+                offset += len(raw) + 1
+            return ToolResult(success=True, data={"file_size": size, "lines": tail_lines})
+        except Exception as e:
+            return ToolResult(success=False, data=None, error=str(e))
+
+    @staticmethod
+    def grep(filepath: str, pattern: str, max_matches: int = 50, ignore_case: bool = False) -> ToolResult:
+        """
+        Busca uma regex no arquivo via mmap (o sistema pagina o arquivo sob
+        demanda, nada é lido inteiro para a memória do processo). Retorna a
+        linha, o número da linha e o offset em bytes de cada ocorrência.
+        """
+        try:
+            max_matches = max(1, min(int(max_matches), FILE_MAX_MATCHES))
+            flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+            regex = re.compile(pattern.encode("utf-8"), flags)
+            size = os.path.getsize(filepath)
+            matches = []
+            truncated = False
+
+            if size:
+                with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    line_number = 1
+                    counted_to = 0  # Linhas contadas até este offset
+                    last_line_start = -1
+                    for match in regex.finditer(mm):
+                        line_start = mm.rfind(b"\n", 0, match.start()) + 1
+                        if line_start == last_line_start:
+                            continue  # Uma entrada por linha, como o grep
+                        if len(matches) == max_matches:
+                            truncated = True
+                            break
+                        # Conta as quebras só no trecho novo, em blocos
+                        while counted_to < line_start:
+                            block_end = min(line_start, counted_to + FILE_SCAN_CHUNK_BYTES)
+                            line_number += mm[counted_to:block_end].count(b"\n")
+                            counted_to = block_end
+                        # Fatias direto do mmap, já limitadas: match.group(0) copiaria
+                        # a ocorrência inteira (o arquivo todo com [\s\S]*)
+                        text_end = min(size, line_start + FILE_MAX_CHUNK_BYTES)
+                        line_end = mm.find(b"\n", match.end(), text_end)
+                        line_end = text_end if line_end == -1 else line_end
+                        matches.append({
+                            "line": line_number,
+                            "offset": match.start(),
+                            "column": match.start() - line_start + 1,
+                            "match": FileTool._decode(mm[match.start():min(match.end(), match.start() + 200)]),
+                            "text": FileTool._line_text(mm[line_start:line_end]),
+                        })
+                        last_line_start = line_start
+
+            return ToolResult(success=True, data={
+                "pattern": pattern,
+                "file_size": size,
+                "matches": matches,
+                "truncated": truncated,
+            })
+        except re.error as e:
+            return ToolResult(success=False, data=None, error=f"Regex inválida: {e}")
+        except Exception as e:
+            return ToolResult(success=False, data=None, error=str(e))
+
     @staticmethod
     def write_file(filepath: str, content: str) -> ToolResult:
         """Escreve em um arquivo"""
@@ -142,20 +716,277 @@ TOOLS = {
     "system": SystemTool,
 }
 
+# Actions que o LLM pode chamar. Métodos auxiliares das classes (session,
+# pool_stats, clientes httpx...) ficam de fora: não devolvem ToolResult
+TOOL_ACTIONS = {
+    "api": {"call_api"},
+    "file": {"read_file", "read_range", "read_lines", "tail", "grep", "write_file"},
+    "json": {"parse_json", "validate_json"},
+    "debug": {"analyze_error"},
+    "system": {"get_timestamp", "get_env_var"},
+}
+
+def is_known_action(tool_name: Any, action: Any) -> bool:
+    """Indica se (tool, action) é uma das actions expostas ao LLM"""
+    return isinstance(tool_name, str) and isinstance(action, str) and action in TOOL_ACTIONS.get(tool_name, ())
+
+# Actions sem efeito colateral: podem rodar em paralelo na mesma iteração
+READ_ONLY_ACTIONS = {
+    ("file", "read_file"),
+    ("file", "read_range"),
+    ("file", "read_lines"),
+    ("file", "tail"),
+    ("file", "grep"),
+    ("json", "parse_json"),
+    ("json", "validate_json"),
+    ("debug", "analyze_error"),
+    ("system", "get_timestamp"),
+    ("system", "get_env_var"),
+}
+
+# Métodos HTTP idempotentes e sem efeito colateral (dentre os de SUPPORTED_HTTP_METHODS)
+SAFE_HTTP_METHODS = {"GET", "HEAD"}
+
+def is_read_only_call(tool_name: str, action: str, **kwargs) -> bool:
+    """Indica se a chamada só lê dados (pode rodar em paralelo com outras leituras)"""
+    if (tool_name, action) == ("api", "call_api"):
+        return str(kwargs.get("method", "GET")).upper() in SAFE_HTTP_METHODS
+    return (tool_name, action) in READ_ONLY_ACTIONS
+
 def execute_tool(tool_name: str, action: str, **kwargs) -> ToolResult:
     """Executa uma tool e action específica"""
     if tool_name not in TOOLS:
         return ToolResult(success=False, data=None, error=f"Tool {tool_name} não encontrada")
 
-    tool_class = TOOLS[tool_name]
-    action_method = getattr(tool_class, action, None)
-
-    if not action_method:
+    if not is_known_action(tool_name, action):
         return ToolResult(success=False, data=None, error=f"Action {action} não existe em {tool_name}")
 
+    action_method = getattr(TOOLS[tool_name], action)
+
     try:
         result = action_method(**kwargs)
         return result
     except Exception as e:
         return ToolResult(success=False, data=None, error=str(e))
 
+async def aexecute_tool(tool_name: str, action: str, **kwargs) -> ToolResult:
+    """
+    Versão assíncrona de execute_tool: usa a variante nativa `a<action>` da
+    tool quando existe (ex.: APITool.acall_api); as demais, que fazem I/O
+    bloqueante de arquivo ou sistema, rodam em uma thread.
+    """
+    if not is_known_action(tool_name, action):
+        return execute_tool(tool_name, action, **kwargs)  # Só monta o erro, sem I/O
+
+    async_method = getattr(TOOLS[tool_name], f"a{action}", None)
+    if not asyncio.iscoroutinefunction(async_method):
+        return await asyncio.to_thread(execute_tool, tool_name, action, **kwargs)
+
+    try:
+        return await async_method(**kwargs)
+    except Exception as e:
+        return ToolResult(success=False, data=None, error=str(e))
+
+# Actions que o ToolResultCache pode memoizar (além de GET/HEAD em api.call_api)
+CACHEABLE_FILE_ACTIONS = {"read_file", "read_range", "read_lines", "tail", "grep"}
+
+class ToolResultCache:
+    """
+    Memoização opcional, por sessão, das chamadas sem efeito colateral.
+
+    A chave é (tool, action, argumentos normalizados com os valores padrão).
+    Antes de reutilizar uma entrada ela é validada: leituras de arquivo pelo
+    mtime e tamanho atuais; GET/HEAD pelo max-age do Cache-Control ou, depois
+    dele, por uma requisição condicional (If-None-Match/If-Modified-Since) em
+    que um 304 devolve o resultado guardado sem baixar o corpo de novo.
+    write_file e métodos HTTP com efeito colateral invalidam o recurso.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl: Optional[float] = 300.0):
+        self._entries = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._writes: Dict[str, int] = {}  # recurso → escritas vistas (invalida entradas antigas)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    @staticmethod
+    def _resource(tool_name: str, kwargs: Dict[str, Any]) -> Optional[str]:
+        """Arquivo (caminho real) ou URL afetado pela chamada"""
+        if tool_name == "file" and kwargs.get("filepath"):
+            return "file:" + os.path.realpath(str(kwargs["filepath"]))
+        if tool_name == "api" and kwargs.get("url"):
+            return "api:" + str(kwargs["url"])
+        return None
+
+    def _normalize(self, tool_name: str, action: str, kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Argumentos canônicos da chamada, ou None se ela não é cacheável"""
+        if tool_name == "file":
+            if action not in CACHEABLE_FILE_ACTIONS:
+                return None
+        elif (tool_name, action) != ("api", "call_api") or str(kwargs.get("method", "GET")).upper() not in ("GET", "HEAD"):
+            return None
+
+        try:
+            bound = inspect.signature(getattr(TOOLS[tool_name], action)).bind(**kwargs)
+        except TypeError:
+            return None  # Argumentos inválidos: a tool devolve o erro, nada a guardar
+        bound.apply_defaults()
+        args = dict(bound.arguments)
+
+        if tool_name == "file":
+            args["filepath"] = os.path.realpath(str(args["filepath"]))
+        else:
+            args["method"] = args["method"].upper()
+            if args.get("headers"):
+                args["headers"] = {str(k).lower(): v for k, v in args["headers"].items()}
+        return args
+
+    def _invalidate(self, tool_name: str, action: str, kwargs: Dict[str, Any]):
+        """Escritas tornam obsoletas as entradas do mesmo arquivo/URL"""
+        writes = (tool_name, action) == ("file", "write_file") or (
+            (tool_name, action) == ("api", "call_api")
+            and str(kwargs.get("method", "GET")).upper() not in SAFE_HTTP_METHODS
+        )
+        resource = self._resource(tool_name, kwargs) if writes else None
+        if resource:
+            with self._lock:
+                self._writes[resource] = self._writes.get(resource, 0) + 1
+
+    @staticmethod
+    def _file_validator(filepath: str) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, tamanho) do arquivo, ou None se não existe"""
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _freshness(meta: Dict[str, Any]) -> Optional[float]:
+        """Até quando (monotonic) a resposta vale sem revalidar; None = não guardar"""
+        directives = {}
+        for part in meta.get("cache_control", "").lower().split(","):
+            name, _, value = part.strip().partition("=")
+            directives[name] = value.strip('" ')
+
+        if "no-store" in directives:
+            return None
+        has_validator = bool(meta.get("etag") or meta.get("last_modified"))
+        max_age = directives.get("max-age", "")
+        if max_age.isdigit() and "no-cache" not in directives:
+            return time.monotonic() + int(max_age)
+        return 0.0 if has_validator else None
+
+    def _lookup(self, tool_name: str, action: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Decide o que fazer com a chamada: 'hit' (entrada válida), 'revalidate'
+        (GET condicional), 'miss' ou 'bypass' (não cacheável).
+        """
+        args = self._normalize(tool_name, action, kwargs)
+        if args is None:
+            return {"status": "bypass", "kwargs": kwargs}
+
+        resource = self._resource(tool_name, args)
+        with self._lock:
+            generation = self._writes.get(resource, 0)
+        plan = {
+            "status": "miss",
+            "key": json.dumps([tool_name, action, args], sort_keys=True, default=str),
+            "resource": resource,
+            "generation": generation,
+            "kwargs": kwargs,
+        }
+        if tool_name == "file":
+            # Stat antes da leitura: se o arquivo mudar durante ela, a entrada não valida depois
+            plan["validator"] = self._file_validator(args["filepath"])
+
+        entry = self._entries.get(plan["key"])
+        if entry is None or entry["generation"] != generation:
+            return plan
+
+        plan["entry"] = entry
+        if tool_name == "file":
+            if plan["validator"] is not None and plan["validator"] == entry["validator"]:
+                plan["status"] = "hit"
+        elif time.monotonic() < entry["fresh_until"]:
+            plan["status"] = "hit"
+        elif entry.get("etag") or entry.get("last_modified"):
+            headers = dict(kwargs.get("headers") or {})
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+            plan["status"] = "revalidate"
+            plan["kwargs"] = dict(kwargs, headers=headers)
+        return plan
+
+    def _store(self, plan: Dict[str, Any], result: ToolResult) -> Tuple[ToolResult, str]:
+        """Registra o resultado da execução e devolve (resultado, status do cache)"""
+        if plan["status"] == "revalidate" and result.success and (result.meta or {}).get("status") == 304:
+            entry = plan["entry"]
+            entry.update({field: result.meta[field] for field in ("etag", "last_modified") if result.meta.get(field)})
+            fresh_until = self._freshness(dict(result.meta, etag=entry["etag"], last_modified=entry["last_modified"]))
+            entry["fresh_until"] = fresh_until or 0.0
+            self._entries.put(plan["key"], entry)
+            with self._lock:
+                self.revalidated += 1
+            return entry["result"], "revalidated"
+
+        with self._lock:
+            self.misses += 1
+        if result.success:
+            entry = {"result": result, "generation": plan["generation"]}
+            if "validator" in plan:
+                entry["validator"] = plan["validator"]
+                cacheable = plan["validator"] is not None
+            else:
+                meta = result.meta or {}
+                fresh_until = self._freshness(meta)
+                cacheable = fresh_until is not None
+                entry.update(fresh_until=fresh_until, etag=meta.get("etag"), last_modified=meta.get("last_modified"))
+            if cacheable:
+                self._entries.put(plan["key"], entry)
+        return result, "miss"
+
+    def execute(self, tool_name: str, action: str, **kwargs) -> Tuple[ToolResult, Optional[str]]:
+        """
+        execute_tool com cache. Retorna (resultado, status): 'hit',
+        'revalidated', 'miss' ou None quando a chamada não é cacheável.
+        """
+        plan = self._lookup(tool_name, action, kwargs)
+        if plan["status"] == "hit":
+            with self._lock:
+                self.hits += 1
+            return plan["entry"]["result"], "hit"
+
+        result = execute_tool(tool_name, action, **plan["kwargs"])
+        if plan["status"] == "bypass":
+            self._invalidate(tool_name, action, kwargs)
+            return result, None
+        return self._store(plan, result)
+
+    async def aexecute(self, tool_name: str, action: str, **kwargs) -> Tuple[ToolResult, Optional[str]]:
+        """Versão assíncrona de execute (aexecute_tool)"""
+        plan = self._lookup(tool_name, action, kwargs)
+        if plan["status"] == "hit":
+            with self._lock:
+                self.hits += 1
+            return plan["entry"]["result"], "hit"
+
+        result = await aexecute_tool(tool_name, action, **plan["kwargs"])
+        if plan["status"] == "bypass":
+            self._invalidate(tool_name, action, kwargs)
+            return result, None
+        return self._store(plan, result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hits (inclusive revalidados por 304), misses e entradas"""
+        total = self.hits + self.revalidated + self.misses
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.revalidated) / total if total else 0.0,
+            "entries": self._entries.stats()["entries"],
+        }
@@ -1,57 +1,107 @@
 #!/usr/bin/env python3
 """
 Script para atualizar o Vector Store da RAG
-Uso: python3 update_rag.py
+Uso: python3 update_rag.py           # incremental: só reembeda o que mudou em ./docs
+     python3 update_rag.py --full    # reconstrói o índice do zero
+     python3 update_rag.py --full --index-type hnsw   # flat | ivf | hnsw | ivfpq
+     python3 update_rag.py --report  # recall × latência do índice contra busca exata
 """
 
 import sys
 from rag import DocumentProcessor
+from cache import CachedEmbeddings
+
+def print_cache_stats(processor: DocumentProcessor):
+    """Mostra hits/misses do cache de embeddings"""
+    if isinstance(processor.embeddings, CachedEmbeddings):
+        stats = processor.embeddings.stats()
+        print(f"   - Cache de embeddings: {stats['hits']} hits / {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%}), {stats['entries']} entradas")
+
+def print_index_report(processor: DocumentProcessor):
+    """Mostra recall × latência do índice contra a busca exata"""
+    print("\n📈 Recall × latência (k=10, contra busca exata):")
+    for row in processor.evaluate_index(k=10):
+        param = f" ({row['param']})" if row["param"] else ""
+        print(f"   - {row['index']}{param}: recall {row['recall']:.3f}, {row['ms_per_query']:.3f} ms/query")
+
+def option_value(args: list, name: str):
+    """Valor de uma opção --nome VALOR da linha de comando"""
+    if name in args and args.index(name) + 1 < len(args):
+        return args[args.index(name) + 1]
+    return None
+
+def incremental_update(processor: DocumentProcessor) -> bool:
+    """Atualiza o índice existente; retorna False se for preciso reconstruir do zero"""
+    print("\n🔎 Comparando ./docs com o último build...")
+    stats = processor.update_vector_store("./vector_store")
+
+    if stats is None:
+        return False
+
+    print("\n" + "=" * 60)
+    print("✅ VECTOR STORE ATUALIZADO (INCREMENTAL)!")
+    print("=" * 60)
+    print(f"\n📊 Estatísticas:")
+    print(f"   - Arquivos alterados: {stats['files_changed']}")
+    print(f"   - Arquivos removidos: {stats['files_removed']}")
+    print(f"   - Chunks novos embedados: {stats['chunks_added']}")
+    print(f"   - Chunks removidos: {stats['chunks_removed']}")
+    print(f"   - Chunks reaproveitados: {stats['chunks_kept']}")
+    print(f"   - Localização: ./vector_store/")
+    return True
 
 def main():
     print("=" * 60)
     print("🔄 ATUALIZANDO VECTOR STORE DA RAG")
     print("=" * 60)
 
-    try:
-        # Criar processador
-        processor = DocumentProcessor(docs_path="./docs")
-
-        # Carregar documentos
-        print("\n📚 Passo 1: Carregando documentos da pasta ./docs...")
-        docs = processor.load_documents()
+    args = sys.argv[1:]
+    full_rebuild = "--full" in args
+    report = "--report" in args
 
-        if not docs:
-            print("❌ Nenhum documento encontrado!")
-            print("   Adicione arquivos .txt, .md ou .pdf na pasta ./docs")
-            return 1
-
-        print(f"   ✅ {len(docs)} documento(s) carregado(s)")
+    try:
+        # Criar processador (sem --index-type, mantém o tipo de índice já salvo)
+        processor = DocumentProcessor(
+            docs_path="./docs",
+            chunk_size=1000,
+            chunk_overlap=200,
+            index_type=option_value(args, "--index-type")
+        )
 
-        # Criar chunks
-        print("\n✂️  Passo 2: Dividindo documentos em chunks...")
-        chunks = processor.chunk_documents(chunk_size=1000, chunk_overlap=200)
-        print(f"   ✅ {len(chunks)} chunks criados")
+        if not full_rebuild and incremental_update(processor):
+            print_cache_stats(processor)
+            if report:
+                print_index_report(processor)
+            return 0
 
-        # Criar vector store
-        print("\n🔍 Passo 3: Criando embeddings e vector store...")
+        # Carregar, dividir e embedar em streaming (lotes limitados em memória)
+        print("\n📚 Passo 1: Carregando, dividindo e embedando documentos de ./docs...")
         print("   (isso pode demorar alguns segundos...)")
-        vector_store = processor.create_vector_store(chunks)
+        vector_store = processor.build_vector_store()
 
         if not vector_store:
-            print("❌ Erro ao criar vector store!")
+            print("❌ Nenhum documento encontrado!")
+            print("   Adicione arquivos .txt, .md ou .pdf na pasta ./docs")
             return 1
 
+        print(f"   ✅ {len(processor.file_fingerprints)} arquivo(s) processado(s)")
+
         # Salvar vector store
-        print("\n💾 Passo 4: Salvando vector store em disco...")
+        print("\n💾 Passo 2: Salvando vector store em disco...")
         processor.save_vector_store("./vector_store")
 
         print("\n" + "=" * 60)
         print("✅ VECTOR STORE ATUALIZADO COM SUCESSO!")
         print("=" * 60)
         print(f"\n📊 Estatísticas:")
-        print(f"   - Documentos processados: {len(docs)}")
-        print(f"   - Chunks indexados: {len(chunks)}")
+        print(f"   - Arquivos processados: {len(processor.file_fingerprints)}")
+        print(f"   - Chunks indexados: {vector_store.index.ntotal}")
+        print(f"   - Índice: {processor.index_params}")
         print(f"   - Localização: ./vector_store/")
+        print_cache_stats(processor)
+        if report:
+            print_index_report(processor)
         print(f"\n💡 Agora sua RAG está atualizada com a documentação mais recente!")
 
         return 0